@@ -0,0 +1,79 @@
+"""
+Server-Sent Events consumer for the friend feed.
+Keeps DrinkmonState friends in sync from /api/friend_events deltas.
+"""
+import uasyncio as asyncio
+import ujson as json
+from drinkmon.app.state import DrinkmonState
+from drinkmon.app.session import BASE_URL, to_rgb
+from drinkmon.network.http_client import open_connection, split_url
+
+CONNECT_TIMEOUT = 10
+# The server sends a heartbeat every 15s; three missed heartbeats means the stream is dead.
+STREAM_IDLE_TIMEOUT = 45
+
+def get_friend_stream_url() -> str:
+    return f"{BASE_URL}/friend_events"
+
+def apply_friend_event(state: DrinkmonState, event, data):
+    """
+    Apply one decoded stream event to state.
+    """
+    if event == "snapshot":
+        friends = {}
+        for f in data.get("friends", []):
+            friends[f["id"]] = to_rgb(f.get("color", {}))
+        state.set_friends(friends)
+    elif event == "add":
+        state.add_friend(data["id"], to_rgb(data.get("color", {})))
+    elif event == "remove":
+        state.remove_friend(data["id"])
+
+async def friend_stream(state: DrinkmonState):
+    """
+    Connect to the friend event stream and apply deltas until it drops.
+    Returns when the connection closes, errors, or goes quiet for STREAM_IDLE_TIMEOUT.
+    """
+    url = get_friend_stream_url()
+    host, port, path, use_ssl = split_url(url)
+    print(f"Streaming friends from {url}")
+    writer = None
+    try:
+        reader, writer = await open_connection(host, port, use_ssl, CONNECT_TIMEOUT)
+        # HTTP/1.0 makes the server close-delimit the stream instead of chunking it.
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), STREAM_IDLE_TIMEOUT)
+        if b" 200 " not in status:
+            print(f"Friend stream HTTP error: {status}")
+            return
+        while True:
+            line = await asyncio.wait_for(reader.readline(), STREAM_IDLE_TIMEOUT)
+            if not line or line == b"\r\n":
+                break
+        event = None
+        data = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), STREAM_IDLE_TIMEOUT)
+            if not line:
+                print("Friend stream closed by server")
+                return
+            line = line.rstrip(b"\r\n")
+            if not line:
+                if event and data:
+                    apply_friend_event(state, event, json.loads(data))
+                event = None
+                data = None
+            elif line.startswith(b"event:"):
+                event = line[6:].strip().decode()
+            elif line.startswith(b"data:"):
+                data = line[5:].strip()
+    except Exception as e:
+        print(f"Friend stream error: {e}")
+    finally:
+        if writer:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
@@ -0,0 +1,55 @@
+"""
+Decoder for the binary friend feed (application/vnd.drinkmon.friends).
+Reads records straight out of the response body into preallocated buffers,
+without building a dict or tuple per friend like the JSON feed does.
+"""
+import ustruct as struct
+
+MEDIA_TYPE = "application/vnd.drinkmon.friends"
+# Ask for session ids with every colour so deltas can be applied
+ACCEPT = MEDIA_TYPE + "; ids=1"
+WIRE_VERSION = 1
+FLAG_IDS = 0x01
+FLAG_FULL = 0x02
+HEADER = "!BBII"
+HEADER_SIZE = 10
+
+def decode_header(buf):
+    """
+    Return (flags, record count, removed count) of a binary feed body.
+    """
+    version, flags, count, n_removed = struct.unpack_from(HEADER, buf, 0)
+    if version != WIRE_VERSION:
+        raise ValueError("Unsupported friend feed version %d" % version)
+    return flags, count, n_removed
+
+def _u32(buf, o):
+    return (buf[o] << 24) | (buf[o + 1] << 16) | (buf[o + 2] << 8) | buf[o + 3]
+
+def decode_into(buf, ids, rgb):
+    """
+    Decode a body into preallocated buffers: ids (an array('I')) receives the
+    record ids followed by the removed ids, rgb (a bytearray) three bytes per
+    record. Both must hold at least count + removed ids and 3 * count bytes.
+    Records without ids (FLAG_IDS clear) leave ids untouched.
+    Returns (flags, record count, removed count).
+    """
+    flags, count, n_removed = decode_header(buf)
+    if count + n_removed > len(ids) or 3 * count > len(rgb):
+        raise ValueError("Friend buffers too small")
+    has_ids = flags & FLAG_IDS
+    o = HEADER_SIZE
+    j = 0
+    for i in range(count):
+        if has_ids:
+            ids[i] = _u32(buf, o)
+            o += 4
+        rgb[j] = buf[o]
+        rgb[j + 1] = buf[o + 1]
+        rgb[j + 2] = buf[o + 2]
+        j += 3
+        o += 3
+    for i in range(count, count + n_removed):
+        ids[i] = _u32(buf, o)
+        o += 4
+    return flags, count, n_removed
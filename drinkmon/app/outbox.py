@@ -0,0 +1,192 @@
+"""
+Persistent outbox for session start/close events.
+Events are queued here instead of being sent inline, and a drain task sends
+them in order, so the sensor loop never waits on the network and a close
+that fails is retried instead of lost. The queue is a ring of fixed-size
+slots in a flash file (header, then OUTBOX_SLOTS records); queueing or
+sending an event rewrites one slot and the header.
+
+Each session gets a local id when it starts. A close queued while its start
+is still waiting cancels both, since the server never needs to hear of that
+session. The guid the server returns for a start is copied into the
+session's queued close. When the ring is full the oldest event not being
+sent is dropped to make room.
+"""
+import uasyncio as asyncio
+import ustruct as struct
+
+OUTBOX_FILE = "outbox.bin"
+OUTBOX_SLOTS = 16
+# head slot, record count, next local id
+HEADER = "<HHI"
+HEADER_SIZE = 8
+# kind, local id, r, g, b, timestamp, guid (NUL padded)
+RECORD = "<BIBBBI36s"
+RECORD_SIZE = 48
+
+KIND_NONE = 0  # slot freed by coalescing; skipped when draining
+KIND_START = 1
+KIND_CLOSE = 2
+
+class Outbox:
+    def __init__(self, path=OUTBOX_FILE, slots=OUTBOX_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.head = 0
+        self.count = 0
+        self.next_id = 1
+        # In-memory copy of the slots: [kind, local id, (r, g, b), ts, guid or None]
+        self._records = [[KIND_NONE, 0, (0, 0, 0), 0, None] for _ in range(slots)]
+        # Set while there may be something to send
+        self.ready = asyncio.Event()
+        # True while the head event is being sent; it cannot be cancelled then
+        self.in_flight = False
+        self._load()
+
+    def __len__(self):
+        return self.count
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._write_all()
+            return
+        if len(data) != HEADER_SIZE + self.slots * RECORD_SIZE:
+            print("Outbox file has the wrong size; starting empty")
+            self._write_all()
+            return
+        self.head, self.count, self.next_id = struct.unpack_from(HEADER, data, 0)
+        for i in range(self.slots):
+            kind, local_id, r, g, b, ts, guid = struct.unpack_from(RECORD, data, HEADER_SIZE + i * RECORD_SIZE)
+            guid = guid.rstrip(b"\0").decode() or None
+            self._records[i] = [kind, local_id, (r, g, b), ts, guid]
+        # A start without a close belongs to a session the reboot ended; the
+        # server never heard of it, so drop it rather than open it now.
+        closing = set(rec[1] for rec in self._pending() if rec[0] == KIND_CLOSE)
+        for i, rec in self._pending_slots():
+            if rec[0] == KIND_START and rec[1] not in closing:
+                rec[0] = KIND_NONE
+                self._write_slot(i)
+        self._trim()
+        if self.count:
+            self.ready.set()
+
+    def _pack(self, i):
+        kind, local_id, rgb, ts, guid = self._records[i]
+        return struct.pack(RECORD, kind, local_id, rgb[0], rgb[1], rgb[2], ts, (guid or "").encode())
+
+    def _write_all(self):
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(HEADER, self.head, self.count, self.next_id))
+            for i in range(self.slots):
+                f.write(self._pack(i))
+
+    def _write_slot(self, i, header=False):
+        with open(self.path, "r+b") as f:
+            if header:
+                f.write(struct.pack(HEADER, self.head, self.count, self.next_id))
+            f.seek(HEADER_SIZE + i * RECORD_SIZE)
+            f.write(self._pack(i))
+
+    def _write_header(self):
+        with open(self.path, "r+b") as f:
+            f.write(struct.pack(HEADER, self.head, self.count, self.next_id))
+
+    def _pending_slots(self):
+        for n in range(self.count):
+            i = (self.head + n) % self.slots
+            yield i, self._records[i]
+
+    def _pending(self):
+        for _, rec in self._pending_slots():
+            yield rec
+
+    def _trim(self):
+        # Drop freed slots from both ends of the ring
+        moved = False
+        while self.count and self._records[self.head][0] == KIND_NONE:
+            self.head = (self.head + 1) % self.slots
+            self.count -= 1
+            moved = True
+        while self.count and self._records[(self.head + self.count - 1) % self.slots][0] == KIND_NONE:
+            self.count -= 1
+            moved = True
+        if moved:
+            self._write_header()
+
+    def _drop_oldest(self):
+        # Make room by dropping the oldest event that is not being sent. An
+        # event in flight moves into the dropped one's slot, which becomes
+        # the head, so peek and pop still see it.
+        nxt = (self.head + 1) % self.slots
+        if self.in_flight:
+            print("Outbox full; dropping event for session", self._records[nxt][1])
+            self._records[nxt] = self._records[self.head]
+        else:
+            print("Outbox full; dropping event for session", self._records[self.head][1])
+        self._records[self.head] = [KIND_NONE, 0, (0, 0, 0), 0, None]
+        self.head = nxt
+        self.count -= 1
+        if self.in_flight:
+            self._write_slot(nxt, header=True)
+        else:
+            # The new head may be a slot freed by coalescing
+            self._trim()
+
+    def _append(self, kind, local_id, rgb, ts, guid):
+        if self.count == self.slots:
+            self._drop_oldest()
+        i = (self.head + self.count) % self.slots
+        self._records[i] = [kind, local_id, rgb, ts, guid]
+        self.count += 1
+        self._write_slot(i, header=True)
+        self.ready.set()
+
+    def queue_start(self, rgb, ts):
+        """
+        Queue a session start; returns the session's local id.
+        """
+        local_id = self.next_id
+        self.next_id += 1
+        self._append(KIND_START, local_id, tuple(rgb), int(ts), None)
+        return local_id
+
+    def queue_close(self, local_id, guid, ts):
+        """
+        Queue the close of a session, or cancel its start if that is still queued.
+        """
+        for i, rec in self._pending_slots():
+            if rec[0] == KIND_START and rec[1] == local_id and not (self.in_flight and i == self.head):
+                rec[0] = KIND_NONE
+                self._write_slot(i)
+                self._trim()
+                return
+        self._append(KIND_CLOSE, local_id, (0, 0, 0), int(ts), guid)
+
+    def peek(self):
+        """
+        The next event to send as (kind, local id, (r, g, b), ts, guid), or None.
+        """
+        if not self.count:
+            return None
+        return tuple(self._records[self.head])
+
+    def pop(self):
+        """
+        Remove the event returned by peek once it has been sent.
+        """
+        if self.count:
+            self._records[self.head][0] = KIND_NONE
+            self._write_slot(self.head)
+            self._trim()
+
+    def resolve(self, local_id, guid):
+        """
+        Fill in the guid the server gave a session on its queued close.
+        """
+        for i, rec in self._pending_slots():
+            if rec[0] == KIND_CLOSE and rec[1] == local_id:
+                rec[4] = guid
+                self._write_slot(i)
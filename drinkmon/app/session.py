@@ -1,19 +1,21 @@
 """
 Session state management, start/end session logic, GUID handling, and API endpoint management.
+All server calls are coroutines on one drinkmon.network.http_client
+keep-alive connection, so the event loop keeps running while they wait on the
+network and the TLS handshake is not repeated for every call. Session starts
+and closes go through the persistent outbox and are sent by send_outbox.
 """
+import utime as time
 from drinkmon.app.state import DrinkmonState
-
-# HTTP client import with fallback
-try:
-    import urequests as requests
-except ImportError:
-    try:
-        import mrequests as requests
-    except ImportError:
-        requests = None
-        print("No HTTP request library found. Please add urequests.py or mrequests.py to your project.")
+from drinkmon.app import friend_wire
+from drinkmon.app.outbox import Outbox, KIND_START
+from drinkmon.network import http_client
 
 BASE_URL = "https://drinkmon.chrispatten.dev/api"
+# Shared by every call below; its stats() count handshakes, reuses and failures
+api = http_client.Connection(BASE_URL)
+# Session starts and closes waiting to be sent
+outbox = Outbox()
 
 def get_start_session_url() -> str:
     return f"{BASE_URL}/start_session"
@@ -22,65 +24,240 @@ def get_end_session_url() -> str:
     return f"{BASE_URL}/close_session"
 
 def get_friend_poll_url() -> str:
-    return f"{BASE_URL}/friend_sessions"
+    return f"{BASE_URL}/friend_changes"
+
+def get_friend_changes_url(cursor) -> str:
+    url = get_friend_poll_url()
+    return f"{url}?since={cursor}" if cursor else url
+
+def get_renew_url() -> str:
+    return f"{BASE_URL}/renew"
+
+def renew_due(state: DrinkmonState, now) -> bool:
+    """
+    True when there is an open session whose lease should be renewed.
+    """
+    return bool(state.session_guid) and (now - state.last_renew_ts) >= state.renew_interval
+
+# Seconds to hold off when a 429 carries no usable Retry-After
+DEFAULT_RETRY_AFTER = 30
+
+def rate_limited(state: DrinkmonState, url, now) -> bool:
+    """
+    True while the server's last 429 for url asked us to wait.
+    """
+    until = state.retry_after.get(url)
+    if until is None:
+        return False
+    if now >= until:
+        del state.retry_after[url]
+        return False
+    return True
+
+def _check_rate_limit(state: DrinkmonState, url, resp, now) -> bool:
+    """
+    Record the Retry-After of a 429 response for url. Returns True if resp was a 429.
+    """
+    if resp.status_code != 429:
+        return False
+    try:
+        delay = int(_get_header(resp, "retry-after"))
+    except (TypeError, ValueError):
+        delay = DEFAULT_RETRY_AFTER
+    state.retry_after[url] = now + delay
+    print(f"Rate limited by {url}; retrying in {delay}s")
+    return True
+
+def _apply_renew_result(state: DrinkmonState, guid, renewed, now):
+    # guid is the session the renewal was sent for. It may have ended, or a
+    # new one started, while the request was in flight; the result is not
+    # about that one.
+    if state.session_guid != guid:
+        return
+    if renewed:
+        state.last_renew_ts = now
+    else:
+        # The server already expired this session; drop it so the sensor loop starts a new one.
+        print(f"Session lease lost: {state.session_guid}")
+        state.end_session()
 
 def start_session(state: DrinkmonState, MY_COLOR, ts):
     """
-    Start a session by POSTing to the server.
-    Updates state if successful.
+    Start a session: mark it active right away and queue the start for the
+    server. The guid is filled in once the outbox task has sent it.
+    Returns the session's local id.
     """
-    url = get_start_session_url()
-    if requests:
-        try:
-            payload = {"color": {"r": MY_COLOR[0], "g": MY_COLOR[1], "b": MY_COLOR[2]}}
-            resp = requests.post(url, json=payload)
-            if resp.status_code == 200:
-                resp_json = resp.json()
-                guid = resp_json.get("guid")
-                resp.close()
-                state.start_session(guid, ts)
-                return guid
-            resp.close()
-        except Exception as e:
-            print(f"Session start POST error: {e}")
-    return None
+    local_id = outbox.queue_start(MY_COLOR, ts)
+    state.start_session(None, ts, local_id)
+    return local_id
 
 def end_session(state: DrinkmonState):
     """
-    End a session by POSTing to the server and updating state.
+    End the current session and queue its close for the server (cancelling
+    the start instead if that has not gone out yet).
     """
-    url = get_end_session_url()
-    if state.session_guid and requests:
-        try:
-            payload = {"guid": state.session_guid}
-            resp = requests.post(url, json=payload)
-            resp.close()
-        except Exception as e:
-            print(f"Session close POST error: {e}")
+    if state.session_local_id:
+        outbox.queue_close(state.session_local_id, state.session_guid, time.time())
     state.end_session()
 
-def friend_poll(state: DrinkmonState):
+async def _send_start(state: DrinkmonState, local_id, rgb, now):
+    url = get_start_session_url()
+    if rate_limited(state, url, now):
+        return False
+    try:
+        resp = await api.post(url, json={"color": {"r": rgb[0], "g": rgb[1], "b": rgb[2]}})
+    except Exception as e:
+        print(f"Session start POST error: {e}")
+        return False
+    if _check_rate_limit(state, url, resp, now):
+        return False
+    if resp.status_code == 200:
+        guid = resp.json().get("guid")
+        outbox.resolve(local_id, guid)
+        state.session_started(local_id, guid, now)
+    elif resp.status_code >= 500:
+        print(f"Session start HTTP error: {resp.status_code}")
+        return False
+    else:
+        print(f"Session start rejected: {resp.status_code}")
+    return True
+
+async def _send_close(state: DrinkmonState, guid, now):
+    if not guid:
+        # The start was rejected, so the server has nothing to close
+        return True
+    url = get_end_session_url()
+    if rate_limited(state, url, now):
+        return False
+    try:
+        resp = await api.post(url, json={"guid": guid})
+    except Exception as e:
+        print(f"Session close POST error: {e}")
+        return False
+    if _check_rate_limit(state, url, resp, now):
+        return False
+    if resp.status_code >= 500:
+        print(f"Session close HTTP error: {resp.status_code}")
+        return False
+    # 404/400: the lease already expired or the session was closed
+    return True
+
+async def send_outbox(state: DrinkmonState):
     """
-    Poll the friend session API and update state.friend_colors.
-    Returns an empty list if polling fails or no data is available.
+    Send the oldest queued start or close. Returns None if the outbox is
+    empty, True once the event is done with (delivered, or rejected by the
+    server for good) and False if it should be retried later.
     """
-    url = get_friend_poll_url()
+    event = outbox.peek()
+    if event is None:
+        return None
+    kind, local_id, rgb, _, guid = event
+    now = time.time()
+    outbox.in_flight = True
+    try:
+        if kind == KIND_START:
+            done = await _send_start(state, local_id, rgb, now)
+        else:
+            done = await _send_close(state, guid, now)
+    finally:
+        outbox.in_flight = False
+    if done:
+        outbox.pop()
+    return done
+
+async def renew_session(state: DrinkmonState):
+    """
+    Renew the current session's lease with a standalone POST.
+    Used when no friend poll has carried the renewal within renew_interval.
+    """
+    url = get_renew_url()
+    now = time.time()
+    guid = state.session_guid
+    if not guid or rate_limited(state, url, now):
+        return
+    try:
+        resp = await api.post(url, json={"guids": [guid]})
+        if resp.status_code == 200:
+            _apply_renew_result(state, guid, resp.json().get("renewed", 0), now)
+        elif _check_rate_limit(state, url, resp, now):
+            pass
+        else:
+            print(f"Session renew HTTP error: {resp.status_code}")
+        resp.close()
+    except Exception as e:
+        print(f"Session renew POST error: {e}")
+
+def to_rgb(c):
+    return (c.get("r", 0), c.get("g", 0), c.get("b", 0))
+
+def apply_friend_changes(state: DrinkmonState, data):
+    """
+    Apply a /friend_changes response to state: a full list replaces the friends,
+    a delta adds and removes individual friends by public session id.
+    """
+    cursor = data.get("cursor")
+    if data.get("full"):
+        friends = {}
+        for f in data.get("friends", ()):
+            friends[f["id"]] = to_rgb(f.get("color", {}))
+        state.set_friends(friends, cursor)
+        return
+    added = {}
+    for f in data.get("added", ()):
+        added[f["id"]] = to_rgb(f.get("color", {}))
+    state.apply_friend_changes(added, data.get("removed", ()), cursor)
+
+def apply_friend_wire(state: DrinkmonState, body, cursor):
+    """
+    Apply a binary /friend_changes response to state, decoding it through the
+    state's preallocated buffers.
+    """
+    _, count, n_removed = friend_wire.decode_header(body)
+    state.reserve_friends(count + n_removed)
+    flags, count, n_removed = friend_wire.decode_into(body, state.friend_ids, state.friend_rgb)
+    state.apply_decoded_friends(flags & friend_wire.FLAG_FULL, count, n_removed, cursor)
+
+async def friend_poll(state: DrinkmonState):
+    """
+    Poll the friend changes API and update state.friend_colors.
+    Sends the cursor from the previous poll so only added/removed friends come
+    back (the server falls back to the full list when the cursor is too old),
+    asks for the binary encoding (JSON still works against older servers),
+    and piggy-backs a lease renewal for the open session when one is due.
+    Returns the current friend colours, or an empty list if polling fails.
+    While rate limited the poll is skipped and the current friends are kept.
+    """
+    url = get_friend_changes_url(state.friend_cursor)
     print(f"Polling friends from {url}")
-    if not requests:
-        print("HTTP request library not available; cannot poll friend sessions.")
-        state.update_friend_colors([])
-        return []
+    now = time.time()
+    if rate_limited(state, get_friend_poll_url(), now):
+        return state.friend_colors
+    headers = {"Accept": friend_wire.ACCEPT}
+    renewing = renew_due(state, now)
+    guid = state.session_guid
+    if renewing:
+        headers["X-Drinkmon-Renew"] = guid
     try:
-        resp = requests.get(url)
+        resp = await api.get(url, headers=headers)
+        if renewing and resp.status_code == 200:
+            renewed = _get_header(resp, "x-drinkmon-renewed")
+            if renewed is not None:
+                _apply_renew_result(state, guid, int(renewed), now)
         if resp.status_code == 200:
-            data = resp.json()
+            content_type = _get_header(resp, "content-type") or ""
+            if content_type.startswith(friend_wire.MEDIA_TYPE):
+                cursor = _get_header(resp, "x-drinkmon-cursor")
+                body = resp.content
+                resp.close()
+                apply_friend_wire(state, body, cursor)
+            else:
+                data = resp.json()
+                resp.close()
+                apply_friend_changes(state, data)
+            return state.friend_colors
+        elif _check_rate_limit(state, get_friend_poll_url(), resp, now):
             resp.close()
-            cols = []
-            for obj in data:
-                c = obj.get("color", {})
-                cols.append((c.get("r",0), c.get("g",0), c.get("b",0)))
-            state.update_friend_colors(cols)
-            return cols
+            return state.friend_colors
         else:
             print(f"Friend poll HTTP error: {resp.status_code}")
             print(resp)
@@ -91,3 +268,15 @@ def friend_poll(state: DrinkmonState):
         print(f"Friend poll HTTP error: {e}")
         state.update_friend_colors([])
         return []
+
+def _get_header(resp, name):
+    """
+    Case-insensitive response header lookup; returns None if headers are unavailable.
+    """
+    headers = getattr(resp, "headers", None)
+    if not headers:
+        return None
+    for k, v in headers.items():
+        if k.lower() == name:
+            return v
+    return None
@@ -2,29 +2,104 @@
 Centralized state management for the drinkmon application.
 Encapsulates session, friend, config, and runtime state.
 """
+from array import array
+
+# Initial capacity of the binary friend feed decode buffers; grown on demand.
+FRIEND_BUFFER_SIZE = 32
 
 class DrinkmonState:
     def __init__(self):
         self.user_active = False
         self.session_guid = None
+        # Outbox id of the open session; its guid arrives once the start is sent
+        self.session_local_id = None
         self.start_ts = 0
         self.friend_colors = []
+        self.friends = {}
+        # Opaque cursor from the last /friend_changes response
+        self.friend_cursor = None
+        # Decode buffers for the binary friend feed, reused across polls
+        self.friend_ids = array('I', bytes(4 * FRIEND_BUFFER_SIZE))
+        self.friend_rgb = bytearray(3 * FRIEND_BUFFER_SIZE)
         self.config = None
         self.MY_COLOR = None
+        self.renew_interval = 60
+        self.last_renew_ts = 0
+        # API url -> time before which the server asked us not to call it (429 Retry-After)
+        self.retry_after = {}
 
     def set_config(self, config):
         self.config = config
         self.MY_COLOR = tuple(config.get('color', (0,0,0)))
+        self.renew_interval = config.get('renew_interval', 60)
 
-    def start_session(self, guid, ts):
+    def start_session(self, guid, ts, local_id=None):
         self.user_active = True
         self.session_guid = guid
+        self.session_local_id = local_id
         self.start_ts = ts
+        self.last_renew_ts = ts
+
+    def session_started(self, local_id, guid, ts):
+        # The server accepted the queued start of session local_id
+        if self.user_active and self.session_local_id == local_id:
+            self.session_guid = guid
+            self.last_renew_ts = ts
 
     def end_session(self):
         self.user_active = False
         self.session_guid = None
+        self.session_local_id = None
         self.start_ts = 0
 
     def update_friend_colors(self, colors):
+        self.friends = {}
         self.friend_colors = colors
+        self.friend_cursor = None
+
+    def set_friends(self, friends, cursor=None):
+        # friends: dict of public session id -> (r, g, b), from a snapshot
+        self.friends = friends
+        self.friend_colors = list(friends.values())
+        self.friend_cursor = cursor
+
+    def apply_friend_changes(self, added, removed, cursor):
+        # added: dict of id -> (r, g, b); removed: list of ids. Rebuilds the colour list once.
+        friends = self.friends
+        for friend_id in removed:
+            friends.pop(friend_id, None)
+        for friend_id, color in added.items():
+            friends[friend_id] = color
+        if added or removed:
+            self.friend_colors = list(friends.values())
+        self.friend_cursor = cursor
+
+    def reserve_friends(self, n):
+        # Make the binary decode buffers hold at least n entries
+        if n > len(self.friend_ids):
+            self.friend_ids = array('I', bytes(4 * n))
+            self.friend_rgb = bytearray(3 * n)
+
+    def apply_decoded_friends(self, full, count, n_removed, cursor):
+        # Apply what friend_wire.decode_into left in friend_ids/friend_rgb:
+        # count (id, colour) records, then n_removed removed ids.
+        ids, rgb = self.friend_ids, self.friend_rgb
+        friends = {} if full else self.friends
+        for i in range(count, count + n_removed):
+            friends.pop(ids[i], None)
+        j = 0
+        for i in range(count):
+            friends[ids[i]] = (rgb[j], rgb[j + 1], rgb[j + 2])
+            j += 3
+        self.friends = friends
+        if full or count or n_removed:
+            self.friend_colors = list(friends.values())
+        self.friend_cursor = cursor
+
+    def add_friend(self, friend_id, color):
+        self.friends[friend_id] = color
+        self.friend_colors = list(self.friends.values())
+
+    def remove_friend(self, friend_id):
+        if self.friends.pop(friend_id, None) is not None:
+            self.friend_colors = list(self.friends.values())
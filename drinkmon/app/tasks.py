@@ -6,9 +6,11 @@ import uasyncio as asyncio
 import utime as time
 import math
 from drinkmon.hardware.led import set_color, hsv_to_rgb
-from drinkmon.hardware.sensor import get_distance
-from drinkmon.app.session import start_session, end_session, friend_poll
+from drinkmon.hardware.sensor import read_async
+from drinkmon.app.session import start_session, end_session, friend_poll, renew_due, renew_session
+from drinkmon.app.session import outbox, send_outbox
 from drinkmon.app.session import get_start_session_url, get_end_session_url, get_friend_poll_url
+from drinkmon.app.friend_stream import friend_stream
 from drinkmon.app.state import DrinkmonState
 
 END_TIMEOUT = 60
@@ -16,15 +18,61 @@ THRESH_MM = 100
 SENSOR_PERIOD = 1.0
 BREATH_PERIOD_MS = 2000
 POLL_INTERVAL = 30
+STREAM_ENABLED = True
+RENEW_CHECK_PERIOD = 5
+# Seconds between attempts to send a queued start/close, doubling per failure
+OUTBOX_BACKOFF_MIN = 2
+OUTBOX_BACKOFF_MAX = 300
 
 async def friend_poll_task(state: DrinkmonState):
     while True:
-        friend_poll(state)
+        await friend_poll(state)
         await asyncio.sleep(POLL_INTERVAL)
 
+async def friend_feed_task(state: DrinkmonState):
+    """
+    Keep friend colours current from the push stream, falling back to a poll
+    whenever the stream drops, then retrying the stream after POLL_INTERVAL.
+    """
+    if not STREAM_ENABLED:
+        await friend_poll_task(state)
+        return
+    while True:
+        await friend_stream(state)
+        await friend_poll(state)
+        await asyncio.sleep(POLL_INTERVAL)
+
+async def renew_task(state: DrinkmonState):
+    """
+    Renew the open session's lease when no friend poll has done it in time,
+    e.g. while friend updates arrive over the stream instead of polling.
+    """
+    while True:
+        await asyncio.sleep(RENEW_CHECK_PERIOD)
+        if renew_due(state, time.time()):
+            await renew_session(state)
+
+async def outbox_task(state: DrinkmonState):
+    """
+    Send queued session starts and closes in order, backing off while the
+    server cannot be reached.
+    """
+    backoff = 0
+    while True:
+        await outbox.ready.wait()
+        sent = await send_outbox(state)
+        if sent is None:
+            outbox.ready.clear()
+        elif sent:
+            backoff = 0
+        else:
+            backoff = min(OUTBOX_BACKOFF_MAX, backoff * 2) if backoff else OUTBOX_BACKOFF_MIN
+            print(f"Outbox: {len(outbox)} queued, retrying in {backoff}s")
+            await asyncio.sleep(backoff)
+
 async def sensor_task(state: DrinkmonState):
     while True:
-        d = get_distance()
+        d = await read_async()
         now = time.time()
         if state.user_active:
             set_color(state.MY_COLOR, 1.0)
@@ -32,9 +80,7 @@ async def sensor_task(state: DrinkmonState):
             set_color((0,0,0), 0)
         if d is not None and d > THRESH_MM:
             if not state.user_active:
-                guid = start_session(state, state.MY_COLOR, now)
-                if guid:
-                    state.start_ts = now
+                start_session(state, state.MY_COLOR, now)
             else:
                 state.start_ts = now
         elif state.user_active and (now - state.start_ts) > END_TIMEOUT:
@@ -57,7 +103,9 @@ async def breath_task(state: DrinkmonState):
 
 async def app_main(state: DrinkmonState):
     await asyncio.gather(
-        friend_poll_task(state),
+        friend_feed_task(state),
         sensor_task(state),
+        renew_task(state),
+        outbox_task(state),
         breath_task(state)
     )
@@ -0,0 +1,97 @@
+"""
+I2C traffic of the VL53L0X driver, counted on a simulated sensor:
+    from drinkmon.hardware import i2c_bench; i2c_bench.main()
+Needs no sensor, so it runs on any board. Reports bus transactions, bytes and
+the time they take on a 400kHz bus for sensor init, a single-shot reading and
+a continuous-mode reading.
+"""
+from drinkmon.hardware.vl53l0x import VL53L0X
+
+BUS_HZ = 400000
+
+class FakeSensorBus:
+    """
+    Just enough of a VL53L0X's registers behind an machine.I2C-like interface
+    for the driver to initialize and range. Every measurement is ready as
+    soon as it is asked for. Counts transactions (a write, a read, or a
+    register write plus repeated-start read), bytes and bus bits.
+    """
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        # Identification, SPAD info, VCSEL periods and timeouts
+        for reg, val in ((0xC0, 0xEE), (0xC1, 0xAA), (0xC2, 0x10), (0x92, 0x85),
+                         (0x50, 0x06), (0x70, 0x04), (0x46, 0x25), (0x52, 0x96),
+                         (0x71, 0x01), (0x72, 0xFE), (0x1E, 0x00), (0x1F, 0xC8)):
+            self.regs[reg] = val
+        self._index = 0
+        self._measuring = False
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.bits = 0
+
+    def _count(self, nbytes, restarts=0):
+        self.transactions += 1
+        self.bytes += nbytes
+        # 9 clocks per byte (with ACK), plus start/stop and any repeated start
+        self.bits += 9 * nbytes + 2 + restarts
+
+    def _write(self, data):
+        reg = data[0]
+        for i in range(1, len(data)):
+            r = (reg + i - 1) & 0xFF
+            self.regs[r] = data[i]
+            if r == 0x00 and data[i] & 0x07:
+                self._measuring = True
+            elif r == 0x0B:
+                # Interrupt clear; in continuous mode the next sample is ready at once
+                self._measuring = self.regs[0x00] & 0x06 != 0
+        self._index = (reg + len(data) - 1) & 0xFF
+
+    def _read(self, buf):
+        for i in range(len(buf)):
+            r = (self._index + i) & 0xFF
+            if r == 0x13:
+                buf[i] = 0x07 if self._measuring else 0x00
+            elif r == 0x00:
+                # The single-shot start bit clears as the measurement starts
+                buf[i] = self.regs[0x00] & 0xFE
+            elif r == 0x83:
+                buf[i] = self.regs[0x83] or 0x01
+            else:
+                buf[i] = self.regs[r]
+        self._index = (self._index + len(buf)) & 0xFF
+
+    def writeto(self, addr, buf):
+        self._count(1 + len(buf))
+        self._write(buf)
+
+    def readfrom_into(self, addr, buf):
+        self._count(1 + len(buf))
+        self._read(buf)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        self._count(3 + len(buf), restarts=1)
+        self._index = memaddr & 0xFF
+        self._read(buf)
+
+def _report(name, bus, n=1):
+    print("%-22s %6.1f transactions %7.1f bytes %8.2f ms at 400kHz" % (
+        name, bus.transactions / n, bus.bytes / n, bus.bits * 1000 / BUS_HZ / n))
+
+def main(samples=20):
+    bus = FakeSensorBus()
+    tof = VL53L0X(bus)
+    _report("init", bus)
+    bus.reset()
+    for _ in range(samples):
+        tof.read_range_single_millimeters()
+    _report("single-shot reading", bus, samples)
+    tof.start_continuous(100)
+    bus.reset()
+    for _ in range(samples):
+        tof.read_range_continuous_millimeters()
+    _report("continuous reading", bus, samples)
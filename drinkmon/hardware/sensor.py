@@ -1,21 +1,75 @@
 """
 VL53L0X sensor setup and distance reading.
-Implements sensor initialization and get_distance function.
+Implements sensor initialization, the awaitable read_async and get_distance.
+
+The sensor ranges continuously on its own timer, so reading it never waits
+for a measurement inside an I2C busy loop. read_async waits for the sensor's
+data-ready signal on the GPIO1 interrupt pin when one is wired
+(TOF_INT_PIN), otherwise it checks the interrupt status register and sleeps
+between checks, so the event loop keeps running either way.
 """
 import machine
+import uasyncio as asyncio
 from drinkmon.hardware.vl53l0x import VL53L0X
 
 I2C_SCL_PIN, I2C_SDA_PIN = 22, 21
+# Pin wired to the sensor's GPIO1 (active-low data ready); None to poll over I2C
+TOF_INT_PIN = None
+# Time between measurements in continuous timed mode; longer than the 33ms timing budget
+MEASURE_PERIOD_MS = 100
+# Sleep between data-ready checks when polling
+POLL_MS = 5
+# Give up on a reading after a few missed measurement periods
+READ_TIMEOUT_MS = 5 * MEASURE_PERIOD_MS
 
 try:
     i2c = machine.I2C(0, scl=machine.Pin(I2C_SCL_PIN), sda=machine.Pin(I2C_SDA_PIN))
     tof = VL53L0X(i2c)
+    tof.start_continuous(MEASURE_PERIOD_MS)
 except Exception:
     tof = None
 
+# Set from the GPIO1 interrupt handler
+data_ready = None
+if tof and TOF_INT_PIN is not None:
+    data_ready = asyncio.ThreadSafeFlag()
+    _int_pin = machine.Pin(TOF_INT_PIN, machine.Pin.IN, machine.Pin.PULL_UP)
+    _int_pin.irq(trigger=machine.Pin.IRQ_FALLING, handler=lambda pin: data_ready.set())
+
+async def read_range(sensor, ready=None, poll_ms=POLL_MS):
+    """
+    Wait for sensor's next continuous-mode measurement and return it in mm.
+    Waits on ready (a ThreadSafeFlag set by the data-ready interrupt) if
+    given, otherwise sleeps poll_ms between status checks.
+    """
+    # A flag left set by an interrupt whose sample was already read does not
+    # mean there is a new one, so always confirm with the status register.
+    while True:
+        range_mm = sensor.poll_range()
+        if range_mm is not None:
+            return range_mm
+        if ready:
+            await ready.wait()
+        else:
+            await asyncio.sleep_ms(poll_ms)
+
+async def read_async():
+    """
+    Read distance from VL53L0X sensor without blocking the event loop.
+    Returns:
+        int or None: Distance in mm, or None if error.
+    """
+    if tof:
+        try:
+            return await asyncio.wait_for_ms(read_range(tof, data_ready), READ_TIMEOUT_MS)
+        except Exception:
+            return None
+    return None
+
 def get_distance():
     """
     Read distance from VL53L0X sensor.
+    Blocks until the next measurement; prefer read_async in tasks.
     Returns:
         int or None: Distance in mm, or None if error.
     """
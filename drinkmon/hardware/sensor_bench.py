@@ -0,0 +1,50 @@
+"""
+How long sensor reads block the event loop, for running on the device:
+    import uasyncio; from drinkmon.hardware import sensor_bench; uasyncio.run(sensor_bench.main())
+A 1ms ticker runs next to the reads and records how late each tick wakes up;
+the worst lateness is the longest the loop was blocked. Compares single-shot
+reads (what get_distance did before continuous mode) with read_async.
+"""
+import uasyncio as asyncio
+import utime as time
+from drinkmon.hardware import sensor
+
+TICK_MS = 1
+# Gap between reads, as sensor_task leaves between samples (shortened)
+READ_GAP_MS = 150
+
+async def _ticker(lateness, running):
+    while running[0]:
+        t = time.ticks_us()
+        await asyncio.sleep_ms(TICK_MS)
+        lateness.append(time.ticks_diff(time.ticks_us(), t) - TICK_MS * 1000)
+
+async def measure(read, samples):
+    """
+    Await read() samples times. Returns (worst, mean) tick lateness in us.
+    """
+    lateness = []
+    running = [True]
+    ticker = asyncio.create_task(_ticker(lateness, running))
+    for _ in range(samples):
+        await read()
+        await asyncio.sleep_ms(READ_GAP_MS)
+    running[0] = False
+    await ticker
+    return max(lateness), sum(lateness) // len(lateness)
+
+async def main(samples=20):
+    tof = sensor.tof
+    if not tof:
+        print("No VL53L0X found")
+        return
+    tof.stop_continuous()
+
+    async def single():
+        tof.read_range_single_millimeters()
+
+    worst, mean = await measure(single, samples)
+    print("single-shot: worst %dus, mean %dus loop lateness" % (worst, mean))
+    tof.start_continuous(sensor.MEASURE_PERIOD_MS)
+    worst, mean = await measure(sensor.read_async, samples)
+    print("read_async:  worst %dus, mean %dus loop lateness" % (worst, mean))
@@ -138,6 +138,141 @@ def _timeout_microseconds_to_mclks(timeout_period_us, vcsel_period_pclks):
     return ((timeout_period_us * 1000) + (macro_period_ns // 2)) // macro_period_ns
 
 
+_CONTROL_REGISTERS = (0x00, 0x80, 0xFF)
+
+
+def _compile(pairs):
+    # Turn a sequence of (register, value) writes into the I2C writes to
+    # send: runs of consecutive registers become one auto-increment write.
+    # Runs never include the page select (0xFF) or the 0x00/0x80 control
+    # registers, whose writes change what later registers mean.
+    blobs = []
+    run = None
+    for reg, val in pairs:
+        last = run[0] + len(run) - 2 if run else -2
+        if reg == last + 1 and reg not in _CONTROL_REGISTERS and last not in _CONTROL_REGISTERS:
+            run.append(val)
+        else:
+            run = bytearray((reg, val))
+            blobs.append(run)
+    return tuple(bytes(b) for b in blobs)
+
+
+# Static register sequences, compiled once when the module is imported.
+_STANDARD_MODE = _compile(((0x88, 0x00), (0x80, 0x01), (0xFF, 0x01), (0x00, 0x00)))
+_STANDARD_MODE_END = _compile(((0x00, 0x01), (0xFF, 0x00), (0x80, 0x00)))
+_SPAD_INFO_BEGIN = _compile(((0x80, 0x01), (0xFF, 0x01), (0x00, 0x00), (0xFF, 0x06)))
+_SPAD_INFO_ENABLE = _compile(
+    ((0xFF, 0x07), (0x81, 0x01), (0x80, 0x01), (0x94, 0x6B), (0x83, 0x00))
+)
+_SPAD_INFO_DISABLE = _compile(((0x81, 0x00), (0xFF, 0x06)))
+_SPAD_INFO_END = _compile(((0xFF, 0x01), (0x00, 0x01), (0xFF, 0x00), (0x80, 0x00)))
+_REF_SPAD_SETUP = _compile(
+    (
+        (0xFF, 0x01),
+        (_DYNAMIC_SPAD_REF_EN_START_OFFSET, 0x00),
+        (_DYNAMIC_SPAD_NUM_REQUESTED_REF_SPAD, 0x2C),
+        (0xFF, 0x00),
+        (_GLOBAL_CONFIG_REF_EN_START_SELECT, 0xB4),
+    )
+)
+# "Load tuning settings", the defaults from the ST API
+_TUNING_SETTINGS = _compile(
+    (
+        (0xFF, 0x01),
+        (0x00, 0x00),
+        (0xFF, 0x00),
+        (0x09, 0x00),
+        (0x10, 0x00),
+        (0x11, 0x00),
+        (0x24, 0x01),
+        (0x25, 0xFF),
+        (0x75, 0x00),
+        (0xFF, 0x01),
+        (0x4E, 0x2C),
+        (0x48, 0x00),
+        (0x30, 0x20),
+        (0xFF, 0x00),
+        (0x30, 0x09),
+        (0x54, 0x00),
+        (0x31, 0x04),
+        (0x32, 0x03),
+        (0x40, 0x83),
+        (0x46, 0x25),
+        (0x60, 0x00),
+        (0x27, 0x00),
+        (0x50, 0x06),
+        (0x51, 0x00),
+        (0x52, 0x96),
+        (0x56, 0x08),
+        (0x57, 0x30),
+        (0x61, 0x00),
+        (0x62, 0x00),
+        (0x64, 0x00),
+        (0x65, 0x00),
+        (0x66, 0xA0),
+        (0xFF, 0x01),
+        (0x22, 0x32),
+        (0x47, 0x14),
+        (0x49, 0xFF),
+        (0x4A, 0x00),
+        (0xFF, 0x00),
+        (0x7A, 0x0A),
+        (0x7B, 0x00),
+        (0x78, 0x21),
+        (0xFF, 0x01),
+        (0x23, 0x34),
+        (0x42, 0x00),
+        (0x44, 0xFF),
+        (0x45, 0x26),
+        (0x46, 0x05),
+        (0x40, 0x40),
+        (0x0E, 0x06),
+        (0x20, 0x1A),
+        (0x43, 0x40),
+        (0xFF, 0x00),
+        (0x34, 0x03),
+        (0x35, 0x44),
+        (0xFF, 0x01),
+        (0x31, 0x04),
+        (0x4B, 0x09),
+        (0x4C, 0x05),
+        (0x4D, 0x04),
+        (0xFF, 0x00),
+        (0x44, 0x00),
+        (0x45, 0x20),
+        (0x47, 0x08),
+        (0x48, 0x28),
+        (0x67, 0x00),
+        (0x70, 0x04),
+        (0x71, 0x01),
+        (0x72, 0xFE),
+        (0x76, 0x00),
+        (0x77, 0x00),
+        (0xFF, 0x01),
+        (0x0D, 0x01),
+        (0xFF, 0x00),
+        (0x80, 0x01),
+        (0x01, 0xF8),
+        (0xFF, 0x01),
+        (0x8E, 0x01),
+        (0x00, 0x01),
+        (0xFF, 0x00),
+        (0x80, 0x00),
+    )
+)
+_STOP_CONTINUOUS = _compile(
+    (
+        (_SYSRANGE_START, 0x01),
+        (0xFF, 0x01),
+        (0x00, 0x00),
+        (0x91, 0x00),
+        (0x00, 0x01),
+        (0xFF, 0x00),
+    )
+)
+
+
 class VL53L0X:
     """Driver for the VL53L0X distance sensor."""
 
@@ -167,11 +302,22 @@ class VL53L0X:
         # Initialize access to the sensor.  This is based on the logic from:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
         # Set I2C standard mode.
-        for pair in ((0x88, 0x00), (0x80, 0x01), (0xFF, 0x01), (0x00, 0x00)):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_STANDARD_MODE)
         self._stop_variable = self._read_u8(0x91)
-        for pair in ((0x00, 0x01), (0xFF, 0x00), (0x80, 0x00)):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_STANDARD_MODE_END)
+        # Writes that precede every measurement start; they carry the stop
+        # variable read above, so are compiled per sensor.
+        self._start_sequence = _compile(
+            (
+                (0x80, 0x01),
+                (0xFF, 0x01),
+                (0x00, 0x00),
+                (0x91, self._stop_variable),
+                (0x00, 0x01),
+                (0xFF, 0x00),
+                (0x80, 0x00),
+            )
+        )
         # disable SIGNAL_RATE_MSRC (bit 1) and SIGNAL_RATE_PRE_RANGE (bit 4)
         # limit checks
         config_control = self._read_u8(_MSRC_CONFIG_CONTROL) | 0x12
@@ -187,20 +333,13 @@ class VL53L0X:
         # _6, so read it from there.
         ref_spad_map = bytearray(6)
 
-        self._BUFFER_8[0] = _GLOBAL_CONFIG_SPAD_ENABLES_REF_0
-        self._i2c.writeto(self._address, self._BUFFER_8)
-        self._i2c.readfrom_into(self._address, ref_spad_map)
+        self._i2c.readfrom_mem_into(
+            self._address, _GLOBAL_CONFIG_SPAD_ENABLES_REF_0, ref_spad_map
+        )
 
-        ref_spad_map = self._BUFFER_8 + ref_spad_map
+        ref_spad_map = bytearray((_GLOBAL_CONFIG_SPAD_ENABLES_REF_0,)) + ref_spad_map
 
-        for pair in (
-            (0xFF, 0x01),
-            (_DYNAMIC_SPAD_REF_EN_START_OFFSET, 0x00),
-            (_DYNAMIC_SPAD_NUM_REQUESTED_REF_SPAD, 0x2C),
-            (0xFF, 0x00),
-            (_GLOBAL_CONFIG_REF_EN_START_SELECT, 0xB4),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_REF_SPAD_SETUP)
 
         first_spad_to_enable = 12 if spad_is_aperture else 0
         spads_enabled = 0
@@ -215,89 +354,7 @@ class VL53L0X:
 
         self._i2c.writeto(self._address, ref_spad_map)
 
-        for pair in (
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0xFF, 0x00),
-            (0x09, 0x00),
-            (0x10, 0x00),
-            (0x11, 0x00),
-            (0x24, 0x01),
-            (0x25, 0xFF),
-            (0x75, 0x00),
-            (0xFF, 0x01),
-            (0x4E, 0x2C),
-            (0x48, 0x00),
-            (0x30, 0x20),
-            (0xFF, 0x00),
-            (0x30, 0x09),
-            (0x54, 0x00),
-            (0x31, 0x04),
-            (0x32, 0x03),
-            (0x40, 0x83),
-            (0x46, 0x25),
-            (0x60, 0x00),
-            (0x27, 0x00),
-            (0x50, 0x06),
-            (0x51, 0x00),
-            (0x52, 0x96),
-            (0x56, 0x08),
-            (0x57, 0x30),
-            (0x61, 0x00),
-            (0x62, 0x00),
-            (0x64, 0x00),
-            (0x65, 0x00),
-            (0x66, 0xA0),
-            (0xFF, 0x01),
-            (0x22, 0x32),
-            (0x47, 0x14),
-            (0x49, 0xFF),
-            (0x4A, 0x00),
-            (0xFF, 0x00),
-            (0x7A, 0x0A),
-            (0x7B, 0x00),
-            (0x78, 0x21),
-            (0xFF, 0x01),
-            (0x23, 0x34),
-            (0x42, 0x00),
-            (0x44, 0xFF),
-            (0x45, 0x26),
-            (0x46, 0x05),
-            (0x40, 0x40),
-            (0x0E, 0x06),
-            (0x20, 0x1A),
-            (0x43, 0x40),
-            (0xFF, 0x00),
-            (0x34, 0x03),
-            (0x35, 0x44),
-            (0xFF, 0x01),
-            (0x31, 0x04),
-            (0x4B, 0x09),
-            (0x4C, 0x05),
-            (0x4D, 0x04),
-            (0xFF, 0x00),
-            (0x44, 0x00),
-            (0x45, 0x20),
-            (0x47, 0x08),
-            (0x48, 0x28),
-            (0x67, 0x00),
-            (0x70, 0x04),
-            (0x71, 0x01),
-            (0x72, 0xFE),
-            (0x76, 0x00),
-            (0x77, 0x00),
-            (0xFF, 0x01),
-            (0x0D, 0x01),
-            (0xFF, 0x00),
-            (0x80, 0x01),
-            (0x01, 0xF8),
-            (0xFF, 0x01),
-            (0x8E, 0x01),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-            (0x80, 0x00),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_TUNING_SETTINGS)
 
         self._write_u8(_SYSTEM_INTERRUPT_CONFIG_GPIO, 0x04)
         gpio_hv_mux_active_high = self._read_u8(_GPIO_HV_MUX_ACTIVE_HIGH)
@@ -317,16 +374,13 @@ class VL53L0X:
 
     def _read_u8(self, address):
         # Read an 8-bit unsigned value from the specified 8-bit address.
-        self._BUFFER_8[0] = address & 0xFF
-        self._i2c.writeto(self._address, self._BUFFER_8)
-        self._i2c.readfrom_into(self._address, self._BUFFER_8)
+        # One transaction: register address, repeated start, read.
+        self._i2c.readfrom_mem_into(self._address, address & 0xFF, self._BUFFER_8)
         return self._BUFFER_8[0]
 
     def _read_u16(self, address):
         # Read a 16-bit BE unsigned value from the specified 8-bit address.
-        self._BUFFER_8[0] = address & 0xFF
-        self._i2c.writeto(self._address, self._BUFFER_8)
-        self._i2c.readfrom_into(self._address, self._BUFFER_16)
+        self._i2c.readfrom_mem_into(self._address, address & 0xFF, self._BUFFER_16)
         return (self._BUFFER_16[0] << 8) | self._BUFFER_16[1]
 
     def _write_u8(self, address, val):
@@ -342,6 +396,11 @@ class VL53L0X:
         self._BUFFER_24[2] = val & 0xFF
         self._i2c.writeto(self._address, self._BUFFER_24)
 
+    def _write_seq(self, blobs):
+        # Send a register sequence compiled by _compile.
+        for blob in blobs:
+            self._i2c.writeto(self._address, blob)
+
     def _write_u32(self, address, val):
         # Write a 32-bit BE unsigned value to the specified 8-bit address.
         self._BUFFER_40[0] = address & 0xFF
@@ -355,17 +414,9 @@ class VL53L0X:
         # Get reference SPAD count and type, returned as a 2-tuple of
         # count and boolean is_aperture.  Based on code from:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
-        for pair in ((0x80, 0x01), (0xFF, 0x01), (0x00, 0x00), (0xFF, 0x06)):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_SPAD_INFO_BEGIN)
         self._write_u8(0x83, self._read_u8(0x83) | 0x04)
-        for pair in (
-            (0xFF, 0x07),
-            (0x81, 0x01),
-            (0x80, 0x01),
-            (0x94, 0x6B),
-            (0x83, 0x00),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_SPAD_INFO_ENABLE)
         start = time.ticks_ms()
         while self._read_u8(0x83) == 0x00:
             if (
@@ -377,11 +428,9 @@ class VL53L0X:
         tmp = self._read_u8(0x92)
         count = tmp & 0x7F
         is_aperture = ((tmp >> 7) & 0x01) == 1
-        for pair in ((0x81, 0x00), (0xFF, 0x06)):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_SPAD_INFO_DISABLE)
         self._write_u8(0x83, self._read_u8(0x83) & ~0x04)
-        for pair in ((0xFF, 0x01), (0x00, 0x01), (0xFF, 0x00), (0x80, 0x00)):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_SPAD_INFO_END)
         return (count, is_aperture)
 
     def _perform_single_ref_calibration(self, vhv_init_byte):
@@ -420,25 +469,22 @@ class VL53L0X:
         # based on get_sequence_step_timeout() from ST API but modified by
         # pololu here:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
-        pre_range_vcsel_period_pclks = self._get_vcsel_pulse_period(
-            _VCSEL_PERIOD_PRE_RANGE
-        )
+        # The VCSEL period and timeout registers of each range are adjacent,
+        # so each range takes one 3-byte read.
+        buf = self._BUFFER_24
+        self._i2c.readfrom_mem_into(self._address, _PRE_RANGE_CONFIG_VCSEL_PERIOD, buf)
+        pre_range_vcsel_period_pclks = ((buf[0] + 1) & 0xFF) << 1
+        pre_range_mclks = _decode_timeout((buf[1] << 8) | buf[2])
         msrc_dss_tcc_mclks = (self._read_u8(_MSRC_CONFIG_TIMEOUT_MACROP) + 1) & 0xFF
         msrc_dss_tcc_us = _timeout_mclks_to_microseconds(
             msrc_dss_tcc_mclks, pre_range_vcsel_period_pclks
         )
-        pre_range_mclks = _decode_timeout(
-            self._read_u16(_PRE_RANGE_CONFIG_TIMEOUT_MACROP_HI)
-        )
         pre_range_us = _timeout_mclks_to_microseconds(
             pre_range_mclks, pre_range_vcsel_period_pclks
         )
-        final_range_vcsel_period_pclks = self._get_vcsel_pulse_period(
-            _VCSEL_PERIOD_FINAL_RANGE
-        )
-        final_range_mclks = _decode_timeout(
-            self._read_u16(_FINAL_RANGE_CONFIG_TIMEOUT_MACROP_HI)
-        )
+        self._i2c.readfrom_mem_into(self._address, _FINAL_RANGE_CONFIG_VCSEL_PERIOD, buf)
+        final_range_vcsel_period_pclks = ((buf[0] + 1) & 0xFF) << 1
+        final_range_mclks = _decode_timeout((buf[1] << 8) | buf[2])
         if pre_range:
             final_range_mclks -= pre_range_mclks
         final_range_us = _timeout_mclks_to_microseconds(
@@ -539,12 +585,28 @@ class VL53L0X:
         # Adapted from readRangeContinuousMillimeters in pololu code at:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
         start = time.ticks_ms()
-        while (self._read_u8(_RESULT_INTERRUPT_STATUS) & 0x07) == 0:
+        while True:
+            range_mm = self.poll_range()
+            if range_mm is not None:
+                return range_mm
             if (
                 self.io_timeout_ms > 0
                 and time.ticks_diff(time.ticks_ms(), start) >= self.io_timeout_ms
             ):
                 raise RuntimeError("Timeout waiting for VL53L0X!")
+
+    def data_ready(self):
+        """True when a measurement is waiting to be read (the condition that
+        also drives the GPIO1 interrupt output).
+        """
+        return (self._read_u8(_RESULT_INTERRUPT_STATUS) & 0x07) != 0
+
+    def poll_range(self):
+        """Return the waiting measurement in millimeters and clear the
+        interrupt, or None if no measurement is ready. Does not wait.
+        """
+        if not self.data_ready():
+            return None
         # assumptions: Linearity Corrective Gain is 1000 (default)
         # fractional ranging is not enabled
         range_mm = self._read_u16(_RESULT_RANGE_STATUS + 10)
@@ -557,17 +619,8 @@ class VL53L0X:
         """
         # Adapted from readRangeSingleMillimeters in pololu code at:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
-        for pair in (
-            (0x80, 0x01),
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0x91, self._stop_variable),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-            (0x80, 0x00),
-            (_SYSRANGE_START, 0x01),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(self._start_sequence)
+        self._write_u8(_SYSRANGE_START, 0x01)
         start = time.ticks_ms()
         while (self._read_u8(_SYSRANGE_START) & 0x01) > 0:
             if (
@@ -587,16 +640,7 @@ class VL53L0X:
         """
         # Adapted from startContinuous in pololu code at:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
-        for pair in (
-            (0x80, 0x01),
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0x91, self._stop_variable),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-            (0x80, 0x00),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(self._start_sequence)
 
         if period_ms != 0:
             osc_calibrate_val = self._read_u16(_OSC_CALIBRATE_VAL)
@@ -616,15 +660,7 @@ class VL53L0X:
         """
         # Adapted from stopContinuous in pololu code at:
         #   https://github.com/pololu/vl53l0x-arduino/blob/master/VL53L0X.cpp
-        for pair in (
-            (_SYSRANGE_START, 0x01),
-            (0xFF, 0x01),
-            (0x00, 0x00),
-            (0x91, 0x00),
-            (0x00, 0x01),
-            (0xFF, 0x00),
-        ):
-            self._write_u8(pair[0], pair[1])
+        self._write_seq(_STOP_CONTINUOUS)
 
         self._continuous_mode = False
 
@@ -0,0 +1,262 @@
+"""
+Minimal async HTTP/1.1 client on uasyncio streams.
+Every step (connect, TLS, request, response) awaits the socket, so the LED,
+sensor and button tasks keep running while a call is in flight. Responses
+look enough like urequests ones (status_code, headers, content, json(),
+close()) for the session code to use either.
+
+Connection keeps one keep-alive connection to a server for all calls to it,
+so a TLS handshake is only paid when the connection has dropped.
+"""
+import uasyncio as asyncio
+import ujson as json
+import usocket as socket
+import utime as time
+
+CONNECT_TIMEOUT = 10
+# Whole exchange after connecting: send the request, read the full response
+REQUEST_TIMEOUT = 15
+# Reconnect rather than reuse a connection idle this long, so we do not race
+# the server closing it (the API keeps idle connections for 75s).
+IDLE_TIMEOUT = 60
+# Seconds to wait before connecting again after a failure, doubling per failure
+BACKOFF_MIN = 1
+BACKOFF_MAX = 60
+
+# host -> resolved address. getaddrinfo blocks the loop, so each host is
+# looked up once and the address reused until a connect to it fails.
+_addresses = {}
+
+def split_url(url):
+    """
+    Split a URL into (host, port, path, use_ssl).
+    """
+    scheme, rest = url.split("://", 1)
+    host, _, path = rest.partition("/")
+    use_ssl = scheme == "https"
+    port = 443 if use_ssl else 80
+    if ":" in host:
+        host, p = host.split(":", 1)
+        port = int(p)
+    return host, port, "/" + path, use_ssl
+
+def _resolve(host, port):
+    addr = _addresses.get(host)
+    if addr is None:
+        sockaddr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        # Ports that return a raw sockaddr keep resolving by name
+        addr = sockaddr[0] if isinstance(sockaddr, tuple) else host
+        _addresses[host] = addr
+    return addr
+
+async def open_connection(host, port, use_ssl, timeout=CONNECT_TIMEOUT):
+    """
+    Connect to host:port, with TLS when use_ssl. Returns (reader, writer).
+    """
+    ip = _resolve(host, port)
+    try:
+        return await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=use_ssl, server_hostname=host if use_ssl else None),
+            timeout,
+        )
+    except Exception:
+        _addresses.pop(host, None)
+        raise
+
+class Response:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        # Header names are lower-cased
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        # The body is read in full before the response is returned
+        pass
+
+    def __repr__(self):
+        return "<Response [%d]>" % self.status_code
+
+def _build_request(method, host, path, headers, json_body):
+    headers = dict(headers) if headers else {}
+    body = None
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers["Content-Type"] = "application/json"
+    lines = ["%s %s HTTP/1.1" % (method, path), "Host: " + host]
+    for k, v in headers.items():
+        lines.append("%s: %s" % (k, v))
+    if body is not None:
+        lines.append("Content-Length: %d" % len(body))
+    lines.append("")
+    lines.append("")
+    request = "\r\n".join(lines).encode()
+    return request + body if body else request
+
+def _reusable(resp):
+    # Without a length the body was delimited by the server closing the connection
+    return resp.headers.get("connection", "").lower() != "close" and (
+        "content-length" in resp.headers or "transfer-encoding" in resp.headers
+    )
+
+async def read_response(reader, status):
+    """
+    Read the rest of a response whose status line has been read: headers
+    and a Content-Length, chunked or close-delimited body.
+    """
+    status_code = int(status.split(None, 2)[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise OSError("Connection closed")
+        if line == b"\r\n":
+            break
+        k, _, v = line.decode().partition(":")
+        headers[k.strip().lower()] = v.strip()
+    if "content-length" in headers:
+        content = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+        content = b"".join(parts)
+    elif status_code in (204, 304):
+        content = b""
+    else:
+        content = await reader.read(-1)
+    return Response(status_code, headers, content)
+
+async def _close(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+class _ConnectionLost(OSError):
+    """
+    The connection failed before any of the response arrived: the request
+    could not be written, or the server closed or reset the connection
+    without answering.
+    """
+
+class Connection:
+    """
+    A keep-alive HTTP/1.1 connection to the server of base_url, shared by
+    every call to it. Calls are serialized. A reused connection the server
+    had already closed is replaced and the request sent once more; a request
+    whose response was cut off partway is never resent. After a failure,
+    connecting again backs off exponentially. Counts handshakes (new
+    connections), reuses and failures.
+    """
+
+    def __init__(self, base_url):
+        self.host, self.port, _, self.use_ssl = split_url(base_url)
+        self._reader = None
+        self._writer = None
+        self._last_used = 0
+        self._lock = asyncio.Lock()
+        self._backoff = 0
+        self._retry_at = 0
+        self.handshakes = 0
+        self.reuses = 0
+        self.failures = 0
+
+    def stats(self):
+        return {"handshakes": self.handshakes, "reuses": self.reuses, "failures": self.failures}
+
+    def _failed(self):
+        self.failures += 1
+        self._backoff = min(BACKOFF_MAX, self._backoff * 2) if self._backoff else BACKOFF_MIN
+        self._retry_at = time.ticks_add(time.ticks_ms(), self._backoff * 1000)
+
+    async def _connect(self):
+        """
+        Make sure a connection is open. Returns True if it is one being reused.
+        """
+        if self._writer:
+            if time.ticks_diff(time.ticks_ms(), self._last_used) < IDLE_TIMEOUT * 1000:
+                return True
+            await self.close()
+        if self._backoff and time.ticks_diff(self._retry_at, time.ticks_ms()) > 0:
+            raise OSError("Backing off after connection failure")
+        try:
+            self._reader, self._writer = await open_connection(self.host, self.port, self.use_ssl)
+        except Exception:
+            self._failed()
+            raise
+        self.handshakes += 1
+        print("Connected to %s %s" % (self.host, self.stats()))
+        return False
+
+    async def close(self):
+        writer = self._writer
+        self._reader = self._writer = None
+        if writer:
+            await _close(writer)
+
+    async def _exchange(self, method, path, headers, json):
+        # Send the request and read its response, raising _ConnectionLost if
+        # the server cannot have seen it or never started to answer
+        try:
+            self._writer.write(_build_request(method, self.host, path, headers, json))
+            await self._writer.drain()
+            status = await self._reader.readline()
+        except OSError as e:
+            raise _ConnectionLost(*e.args)
+        if not status:
+            raise _ConnectionLost("Connection closed")
+        return await read_response(self._reader, status)
+
+    async def request(self, method, url, headers=None, json=None, timeout=REQUEST_TIMEOUT):
+        """
+        Make one request to url (on this connection's server) and return its
+        Response. Raises OSError or asyncio.TimeoutError on failure.
+        """
+        path = split_url(url)[2]
+        async with self._lock:
+            while True:
+                reused = await self._connect()
+                try:
+                    resp = await asyncio.wait_for(self._exchange(method, path, headers, json), timeout)
+                except _ConnectionLost:
+                    await self.close()
+                    if reused:
+                        # Most likely closed by the server while idle, before it
+                        # read the request; send it again on a new connection
+                        continue
+                    self._failed()
+                    raise
+                except Exception:
+                    # Includes timeouts and responses cut off partway: the
+                    # server may have acted on the request, so it is not resent
+                    await self.close()
+                    self._failed()
+                    raise
+                self._backoff = 0
+                if reused:
+                    self.reuses += 1
+                if _reusable(resp):
+                    self._last_used = time.ticks_ms()
+                else:
+                    await self.close()
+                return resp
+
+    async def get(self, url, headers=None, timeout=REQUEST_TIMEOUT):
+        return await self.request("GET", url, headers=headers, timeout=timeout)
+
+    async def post(self, url, json=None, headers=None, timeout=REQUEST_TIMEOUT):
+        return await self.request("POST", url, headers=headers, json=json, timeout=timeout)
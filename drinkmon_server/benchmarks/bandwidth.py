@@ -0,0 +1,126 @@
+"""
+Bytes on the wire and connection handshakes per device for friend polling.
+Runs the API under a real uvicorn process with some sessions open and has
+simulated devices poll /api/friend_sessions at a fixed interval under several
+configurations: a fresh connection per poll (what urequests did), gzip, and
+keep-alive with uvicorn's default and the tuned idle timeout. Reports HTTP
+bytes per poll and how often a poll needs a new connection (not counting each
+device's first), and both per device per hour at the device's 30s poll rate.
+TCP/IP and TLS overhead are not included; every new connection is one TLS
+handshake on the real deployment.
+
+The poll interval is shortened (default 6s) to keep runs quick; it only has to
+exceed uvicorn's 5s default keep-alive timeout to show its effect.
+
+Usage:
+    python -m drinkmon_server.benchmarks.bandwidth --devices 20 --sessions 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import urllib.request
+from drinkmon_server.benchmarks.common import free_port, start_server, stop_server
+from drinkmon_server.config import KEEPALIVE_TIMEOUT
+from drinkmon_server.wire import MEDIA_TYPE
+
+DEVICE_POLL_INTERVAL = 30
+UVICORN_DEFAULT_KEEPALIVE = 5
+GZIP = "Accept-Encoding: gzip\r\n"
+
+# name, server keep-alive timeout, device reuses its connection, extra request headers
+SCENARIOS = [
+    ("fresh connection per poll", UVICORN_DEFAULT_KEEPALIVE, False, ""),
+    ("fresh connection + gzip", KEEPALIVE_TIMEOUT, False, GZIP),
+    ("keep-alive, default timeout + gzip", UVICORN_DEFAULT_KEEPALIVE, True, GZIP),
+    ("keep-alive, tuned timeout + gzip", KEEPALIVE_TIMEOUT, True, GZIP),
+    ("keep-alive, tuned timeout + binary", KEEPALIVE_TIMEOUT, True, f"Accept: {MEDIA_TYPE}\r\n" + GZIP),
+]
+
+async def poll(reader, writer, headers: str, keep_alive: bool) -> int:
+    """
+    One GET /api/friend_sessions; returns request plus response bytes.
+    """
+    connection = "" if keep_alive else "Connection: close\r\n"
+    request = f"GET /api/friend_sessions HTTP/1.1\r\nHost: bench\r\n{connection}{headers}\r\n".encode()
+    writer.write(request)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    await reader.readexactly(length)
+    return len(request) + len(head) + length
+
+async def device(port: int, polls: int, interval: float, headers: str, keep_alive: bool, totals: dict):
+    await asyncio.sleep(random.uniform(0, interval))
+    reader = writer = None
+    for _ in range(polls):
+        for _ in range(2):
+            if writer is None or reader.at_eof():
+                if writer:
+                    writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                totals["connections"] += 1
+            try:
+                totals["bytes"] += await poll(reader, writer, headers, keep_alive)
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # The server closed the idle connection as we reused it
+                writer.close()
+                writer = None
+        totals["polls"] += 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+        await asyncio.sleep(interval)
+    if writer:
+        writer.close()
+
+def run(name: str, keepalive: int, keep_alive: bool, headers: str, args) -> dict:
+    port = free_port()
+    server = start_server(port, extra_args=["--timeout-keep-alive", str(keepalive)])
+    try:
+        for i in range(args.sessions):
+            color = {"r": random.randrange(256), "g": random.randrange(256), "b": i % 256}
+            req = urllib.request.Request(
+                f"http://127.0.0.1:{port}/api/start_session",
+                data=json.dumps({"color": color}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            urllib.request.urlopen(req).read()
+        totals = {"polls": 0, "bytes": 0, "connections": 0}
+
+        async def fleet():
+            await asyncio.gather(*(
+                device(port, args.polls, args.interval, headers, keep_alive, totals)
+                for _ in range(args.devices)
+            ))
+        asyncio.run(fleet())
+    finally:
+        stop_server(server)
+    per_hour = 3600 / DEVICE_POLL_INTERVAL
+    bytes_per_poll = totals["bytes"] / totals["polls"]
+    reconnects = totals["connections"] - args.devices
+    reconnects_per_poll = reconnects / max(totals["polls"] - args.devices, 1)
+    return {
+        "scenario": name,
+        "server_keepalive_s": keepalive,
+        "bytes_per_poll": round(bytes_per_poll),
+        "reconnects_per_poll": round(reconnects_per_poll, 2),
+        "kib_per_device_hour": round(bytes_per_poll * per_hour / 1024, 1),
+        "handshakes_per_device_hour": round(reconnects_per_poll * per_hour, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=50, help="sessions open during the run")
+    parser.add_argument("--polls", type=int, default=4, help="polls per device")
+    parser.add_argument("--interval", type=float, default=6.0, help="seconds between a device's polls")
+    args = parser.parse_args()
+    rows = [run(name, keepalive, reuse, headers, args) for name, keepalive, reuse, headers in SCENARIOS]
+    print(json.dumps({"devices": args.devices, "sessions": args.sessions, "runs": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
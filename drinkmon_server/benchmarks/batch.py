@@ -0,0 +1,88 @@
+"""
+Single-call versus batch throughput for session starts and closes.
+Runs the API under a real uvicorn process and pushes the same number of session
+start/close operations through /api/start_session + /api/close_session and
+through /api/batch_sessions over keep-alive connections, reporting operations
+per second for each and the speed-up.
+
+Usage:
+    python -m drinkmon_server.benchmarks.batch --sessions 4000 --batch-size 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from drinkmon_server.benchmarks.common import free_port, start_server, stop_server
+from drinkmon_server.benchmarks.concurrency import http_request
+
+def _color(i: int) -> dict:
+    return {"r": i % 256, "g": (i >> 8) % 256, "b": 42}
+
+async def single_calls(port: int, count: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        guids = []
+        for i in range(count):
+            body = json.dumps({"color": _color(i)}).encode()
+            _, _, reply = await http_request(reader, writer, "POST", "/api/start_session", body)
+            guids.append(json.loads(reply)["guid"])
+        for guid in guids:
+            await http_request(reader, writer, "POST", "/api/close_session", json.dumps({"guid": guid}).encode())
+    finally:
+        writer.close()
+
+async def batch_calls(port: int, count: int, size: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        guids = []
+        for lo in range(0, count, size):
+            body = json.dumps({"start": [{"color": _color(i)} for i in range(lo, min(count, lo + size))]}).encode()
+            _, _, reply = await http_request(reader, writer, "POST", "/api/batch_sessions", body)
+            guids.extend(s["guid"] for s in json.loads(reply)["started"])
+        for lo in range(0, len(guids), size):
+            body = json.dumps({"close": guids[lo:lo + size]}).encode()
+            await http_request(reader, writer, "POST", "/api/batch_sessions", body)
+    finally:
+        writer.close()
+
+async def timed(connections: int, make) -> float:
+    t0 = time.perf_counter()
+    await asyncio.gather(*(make() for _ in range(connections)))
+    return time.perf_counter() - t0
+
+def run(sessions: int, size: int, connections: int, store: str, data_dir: str) -> dict:
+    port = free_port()
+    env = {"DRINKMON_STORE": store, "DRINKMON_SQLITE_PATH": os.path.join(data_dir, "bench.db")}
+    server = start_server(port, env=env)
+    per_conn = sessions // connections
+    ops = 2 * per_conn * connections
+    try:
+        single_s = asyncio.run(timed(connections, lambda: single_calls(port, per_conn)))
+        batch_s = asyncio.run(timed(connections, lambda: batch_calls(port, per_conn, size)))
+    finally:
+        stop_server(server)
+    return {
+        "store": store,
+        "operations": ops,
+        "batch_size": size,
+        "connections": connections,
+        "single_ops_per_sec": round(ops / single_s),
+        "batch_ops_per_sec": round(ops / batch_s),
+        "speedup": round(single_s / batch_s, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        result = run(args.sessions, args.batch_size, args.connections, args.store, data_dir)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
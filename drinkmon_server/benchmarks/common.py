@@ -0,0 +1,104 @@
+"""
+Shared helpers for the drinkmon_server benchmark scripts.
+Starts the API under a real uvicorn process and samples its memory.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(
+    port: int,
+    extra_args: Optional[List[str]] = None,
+    env: Optional[dict] = None,
+    workers: Optional[int] = None,
+) -> subprocess.Popen:
+    """
+    Launch uvicorn serving drinkmon_server.drinkmon_api:app and wait until it answers.
+    With workers set, go through drinkmon_server.serve (coordinator plus N workers).
+    """
+    if workers:
+        launcher = ["drinkmon_server.serve", "--workers", str(workers)]
+    else:
+        launcher = ["uvicorn", "drinkmon_server.drinkmon_api:app"]
+    cmd = [sys.executable, "-m"] + launcher + [
+        "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--backlog", "8192",
+    ] + (extra_args or [])
+    proc_env = dict(os.environ, PYTHONPATH=REPO_ROOT, **(env or {}))
+    proc = subprocess.Popen(
+        cmd, cwd=REPO_ROOT, env=proc_env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/diagnostics", timeout=1).read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(proc.stderr.read().decode())
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start")
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def rss_kb(pid: int) -> int:
+    """
+    Resident set size of a process in KiB (Linux only; 0 elsewhere).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def cpu_seconds(pid: int) -> float:
+    """
+    User plus system CPU time consumed by a process so far (Linux only; 0 elsewhere).
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def process_tree(pid: int) -> List[int]:
+    """
+    pid and all of its descendants (Linux only; just pid elsewhere).
+    """
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
@@ -0,0 +1,158 @@
+"""
+Concurrency benchmark for the drinkmon HTTP endpoints.
+Runs the API under a real uvicorn process and drives it from several client
+processes, each holding keep-alive connections that issue a device-like mix of
+friend polls (half conditional), session starts and closes. Reports requests/sec
+and per-endpoint latency and server CPU time per request.
+
+Usage:
+    python -m drinkmon_server.benchmarks.concurrency --connections 64 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+import urllib.request
+from drinkmon_server.benchmarks.common import (
+    cpu_seconds,
+    free_port,
+    percentile,
+    start_server,
+    stop_server,
+)
+
+async def http_request(reader, writer, method: str, path: str, body: bytes = b"", headers: str = ""):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n{headers}\r\n".encode() + body
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    fields = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            fields[k.strip().lower()] = v.strip()
+    payload = await reader.readexactly(int(fields.get("content-length", 0)))
+    return status, fields, payload
+
+async def one_request(reader, writer, rng: random.Random, guids: list, etag: str, latencies: dict, errors: list) -> str:
+    """
+    Issue one request from the device mix. Returns the poll ETag to send next time.
+    """
+    roll = rng.random()
+    t0 = time.perf_counter()
+    if roll < 0.1 or (roll < 0.2 and not guids):
+        color = {"r": rng.randrange(256), "g": rng.randrange(256), "b": rng.randrange(256)}
+        status, _, body = await http_request(
+            reader, writer, "POST", "/api/start_session", json.dumps({"color": color}).encode()
+        )
+        kind = "start"
+        if status == 200:
+            guids.append(json.loads(body)["guid"])
+    elif roll < 0.2:
+        guid = guids.pop(rng.randrange(len(guids)))
+        status, _, _ = await http_request(
+            reader, writer, "POST", "/api/close_session", json.dumps({"guid": guid}).encode()
+        )
+        kind = "close"
+    else:
+        cond = f"If-None-Match: {etag}\r\n" if etag and roll < 0.6 else ""
+        status, fields, _ = await http_request(reader, writer, "GET", "/api/friend_sessions", headers=cond)
+        etag = fields.get("etag", "")
+        kind = "poll"
+    if status not in (200, 304):
+        errors.append(status)
+    latencies[kind].append((time.perf_counter() - t0) * 1000)
+    return etag
+
+async def connection(port: int, deadline: float, seed: int, latencies: dict, errors: list):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    guids = []
+    etag = ""
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                etag = await one_request(reader, writer, rng, guids, etag, latencies, errors)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # uvicorn drops the connection when a handler raises
+                errors.append("reset")
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    finally:
+        writer.close()
+
+def client_process(port: int, connections: int, duration: float, seed: int, start_at: float, results):
+    async def go():
+        latencies = {"poll": [], "start": [], "close": []}
+        errors = []
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            connection(port, deadline, seed * 1000 + i, latencies, errors) for i in range(connections)
+        ))
+        return latencies, errors
+    results.put(asyncio.run(go()))
+
+def run(connections: int, duration: float, procs: int, prefill: int) -> dict:
+    port = free_port()
+    server = start_server(port)
+    try:
+        for i in range(prefill):
+            req = urllib.request.Request(
+                f"http://127.0.0.1:{port}/api/start_session",
+                data=json.dumps({"color": {"r": i % 256, "g": 0, "b": 0}}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            urllib.request.urlopen(req).read()
+        results = multiprocessing.Queue()
+        start_at = time.time() + 1.0
+        per_proc = [connections // procs + (1 if i < connections % procs else 0) for i in range(procs)]
+        workers = [
+            multiprocessing.Process(target=client_process, args=(port, n, duration, i, start_at, results))
+            for i, n in enumerate(per_proc)
+        ]
+        for w in workers:
+            w.start()
+        cpu_before = cpu_seconds(server.pid)
+        latencies = {"poll": [], "start": [], "close": []}
+        errors = []
+        for _ in workers:
+            lat, err = results.get(timeout=duration + 60)
+            for kind, values in lat.items():
+                latencies[kind].extend(values)
+            errors.extend(err)
+        server_cpu = cpu_seconds(server.pid) - cpu_before
+        for w in workers:
+            w.join(timeout=10)
+    finally:
+        stop_server(server)
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "connections": connections,
+        "duration_s": duration,
+        "requests": total,
+        "rps": round(total / duration),
+        "errors": len(errors),
+        "server_cpu_us_per_request": round(server_cpu * 1e6 / max(total, 1)),
+        "latency_ms": {
+            kind: {"p50": round(percentile(v, 50), 2), "p99": round(percentile(v, 99), 2)}
+            for kind, v in latencies.items()
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--procs", type=int, default=2, help="client processes")
+    parser.add_argument("--prefill", type=int, default=200, help="sessions open before the run")
+    args = parser.parse_args()
+    print(json.dumps(run(args.connections, args.duration, args.procs, args.prefill), indent=2))
+
+if __name__ == "__main__":
+    main()
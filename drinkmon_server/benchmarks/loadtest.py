@@ -0,0 +1,290 @@
+"""
+Fleet load test: simulated drinkmon devices against the API over real uvicorn.
+Each simulated device behaves like drinkmon/app/tasks.py: it polls
+/api/friend_changes every 30s with its cursor (binary feed, lease renewal
+piggy-backed when due), starts a session when a drink is detected, closes it
+END_TIMEOUT seconds after the drink, or earlier when the button is pressed.
+How often devices drink comes from a fleet profile. Device time runs --speed
+times faster than real time.
+
+Reports requests/sec, p50/p95/p99 latency per request kind and overall, errors,
+and the server's peak RSS and CPU per request, and saves them as JSON. Pass
+--compare with an earlier result file to see the change per metric.
+
+Usage:
+    python -m drinkmon_server.benchmarks.loadtest --profile office --devices 500 --duration 60
+    python -m drinkmon_server.benchmarks.loadtest --profile office --compare loadtest-office-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import threading
+import time
+from drinkmon_server.benchmarks.common import (
+    REPO_ROOT,
+    cpu_seconds,
+    free_port,
+    percentile,
+    process_tree,
+    rss_kb,
+    start_server,
+    stop_server,
+)
+from drinkmon_server.benchmarks.concurrency import http_request
+from drinkmon_server.wire import MEDIA_TYPE
+
+# Device constants, as in drinkmon/app/tasks.py and DrinkmonState
+POLL_INTERVAL = 30
+END_TIMEOUT = 60
+RENEW_INTERVAL = 60
+
+# Fleet profiles: drinks per device-hour, drink length range in seconds, and
+# the share of sessions ended early with the button.
+PROFILES = {
+    "quiet": {"drinks_per_hour": 0.5, "drink_seconds": (30, 120), "button_share": 0.05},
+    "office": {"drinks_per_hour": 2.0, "drink_seconds": (30, 300), "button_share": 0.1},
+    "party": {"drinks_per_hour": 12.0, "drink_seconds": (20, 120), "button_share": 0.3},
+}
+KINDS = ("poll", "start", "close")
+
+class Device:
+    def __init__(self, port: int, rng: random.Random, profile: dict, speed: float, keep_alive: bool, results: dict):
+        self.port = port
+        self.rng = rng
+        self.profile = profile
+        self.speed = speed
+        self.keep_alive = keep_alive
+        self.results = results
+        self.color = {"r": rng.randrange(256), "g": rng.randrange(256), "b": rng.randrange(256)}
+        self.guid = None
+        self.cursor = ""
+        self.last_renew = 0.0
+        self.deadline = 0.0
+        self._conn = None
+        # The device makes one HTTP call at a time
+        self._lock = asyncio.Lock()
+
+    def device_time(self) -> float:
+        return time.monotonic() * self.speed
+
+    async def sleep(self, device_seconds: float) -> None:
+        # Never past the end of the run, so open sessions are closed promptly
+        await asyncio.sleep(max(0.0, min(device_seconds / self.speed, self.deadline - time.monotonic())))
+
+    async def request(self, kind: str, method: str, path: str, body: bytes = b"", headers: str = ""):
+        async with self._lock:
+            return await self._request(kind, method, path, body, headers)
+
+    async def _request(self, kind: str, method: str, path: str, body: bytes, headers: str):
+        t0 = time.perf_counter()
+        try:
+            if self._conn is None or self._conn[0].at_eof():
+                self._conn = await asyncio.open_connection("127.0.0.1", self.port)
+            reader, writer = self._conn
+            if not self.keep_alive:
+                headers += "Connection: close\r\n"
+            status, fields, payload = await http_request(reader, writer, method, path, body, headers)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            if time.monotonic() < self.deadline:
+                self.results["errors"].append(type(e).__name__)
+            self.close_connection()
+            return None, {}, b""
+        finally:
+            if time.monotonic() < self.deadline:
+                self.results["latency"][kind].append((time.perf_counter() - t0) * 1000)
+        if not self.keep_alive:
+            self.close_connection()
+        if status >= 400 and time.monotonic() < self.deadline:
+            self.results["errors"].append(status)
+        return status, fields, payload
+
+    def close_connection(self) -> None:
+        if self._conn:
+            self._conn[1].close()
+            self._conn = None
+
+    async def poll_loop(self) -> None:
+        await self.sleep(self.rng.uniform(0, POLL_INTERVAL))
+        while time.monotonic() < self.deadline:
+            headers = f"Accept: {MEDIA_TYPE}; ids=1\r\n"
+            now = self.device_time()
+            if self.guid and now - self.last_renew >= RENEW_INTERVAL:
+                headers += f"X-Drinkmon-Renew: {self.guid}\r\n"
+                self.last_renew = now
+            path = "/api/friend_changes" + (f"?since={self.cursor}" if self.cursor else "")
+            status, fields, _ = await self.request("poll", "GET", path, headers=headers)
+            if status == 200:
+                self.cursor = fields.get("x-drinkmon-cursor", "")
+            await self.sleep(POLL_INTERVAL)
+
+    async def drink_loop(self) -> None:
+        rate = self.profile["drinks_per_hour"] / 3600
+        while True:
+            await self.sleep(self.rng.expovariate(rate))
+            if time.monotonic() >= self.deadline:
+                return
+            body = json.dumps({"color": self.color}).encode()
+            status, _, payload = await self.request("start", "POST", "/api/start_session", body)
+            if status != 200:
+                continue
+            self.guid = json.loads(payload)["guid"]
+            self.last_renew = self.device_time()
+            drink = self.rng.uniform(*self.profile["drink_seconds"])
+            if self.rng.random() < self.profile["button_share"]:
+                await self.sleep(self.rng.uniform(0, drink))
+            else:
+                await self.sleep(drink + END_TIMEOUT)
+            guid, self.guid = self.guid, None
+            await self.request("close", "POST", "/api/close_session", json.dumps({"guid": guid}).encode())
+
+    async def run(self, deadline: float) -> None:
+        """
+        Simulate the device until deadline. Requests still in flight then
+        (closing open sessions) are sent but not recorded.
+        """
+        self.deadline = deadline
+        try:
+            await asyncio.gather(self.poll_loop(), self.drink_loop())
+        finally:
+            self.close_connection()
+
+def client_process(port: int, devices: int, seed: int, args, start_at: float, queue) -> None:
+    async def go():
+        results = {"latency": {k: [] for k in KINDS}, "errors": []}
+        rng = random.Random(seed)
+        fleet = [
+            Device(port, random.Random(rng.random()), PROFILES[args.profile], args.speed, args.keep_alive, results)
+            for _ in range(devices)
+        ]
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(d.run(deadline) for d in fleet))
+        return results
+    queue.put(asyncio.run(go()))
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def summarize(latencies: list) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+def run(args) -> dict:
+    port = free_port()
+    env = {"DRINKMON_RATE_LIMIT": "1"} if args.rate_limit else {}
+    server = start_server(port, env=env, workers=args.workers if args.workers > 1 else None)
+    peak_rss = [0]
+    sampling = threading.Event()
+
+    def sample_rss(pids):
+        while not sampling.wait(0.5):
+            peak_rss[0] = max(peak_rss[0], sum(rss_kb(p) for p in pids))
+
+    try:
+        pids = process_tree(server.pid)
+        sampler = threading.Thread(target=sample_rss, args=(pids,), daemon=True)
+        sampler.start()
+        queue = multiprocessing.Queue()
+        start_at = time.time() + 1.0
+        per_proc = [args.devices // args.procs + (1 if i < args.devices % args.procs else 0) for i in range(args.procs)]
+        clients = [
+            multiprocessing.Process(target=client_process, args=(port, n, args.seed + i, args, start_at, queue))
+            for i, n in enumerate(per_proc)
+        ]
+        cpu_before = sum(cpu_seconds(p) for p in pids)
+        for c in clients:
+            c.start()
+        latency = {k: [] for k in KINDS}
+        errors = []
+        for _ in clients:
+            part = queue.get(timeout=args.duration + 120)
+            for k in KINDS:
+                latency[k].extend(part["latency"][k])
+            errors.extend(part["errors"])
+        server_cpu = sum(cpu_seconds(p) for p in pids) - cpu_before
+        for c in clients:
+            c.join(timeout=10)
+        sampling.set()
+        peak_rss[0] = max(peak_rss[0], sum(rss_kb(p) for p in pids))
+    finally:
+        stop_server(server)
+    everything = [v for k in KINDS for v in latency[k]]
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "profile": args.profile,
+        "devices": args.devices,
+        "speed": args.speed,
+        "duration_s": args.duration,
+        "workers": args.workers,
+        "keep_alive": args.keep_alive,
+        "rate_limit": args.rate_limit,
+        "cpus": os.cpu_count(),
+        "requests": len(everything),
+        "requests_per_sec": round(len(everything) / args.duration, 1),
+        "errors": len(errors),
+        "latency": dict(all=summarize(everything), **{k: summarize(latency[k]) for k in KINDS}),
+        "server_peak_rss_kb": peak_rss[0],
+        "server_cpu_us_per_request": round(server_cpu * 1e6 / max(len(everything), 1)),
+    }
+
+def compare(current: dict, baseline: dict) -> dict:
+    """
+    Relative change of the headline numbers against an earlier result.
+    """
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    rows = {
+        "requests_per_sec": (current["requests_per_sec"], baseline["requests_per_sec"]),
+        "server_peak_rss_kb": (current["server_peak_rss_kb"], baseline["server_peak_rss_kb"]),
+        "server_cpu_us_per_request": (current["server_cpu_us_per_request"], baseline["server_cpu_us_per_request"]),
+    }
+    for pct in ("p50_ms", "p95_ms", "p99_ms"):
+        rows[f"latency_{pct}"] = (current["latency"]["all"][pct], baseline["latency"]["all"][pct])
+    return {
+        "baseline_revision": baseline.get("revision"),
+        "changes": {k: {"now": new, "before": old, "change": change(new, old)} for k, (new, old) in rows.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="office")
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=60.0, help="wall-clock seconds")
+    parser.add_argument("--speed", type=float, default=10.0, help="device seconds per wall-clock second")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 1, help="client processes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fresh-connections", dest="keep_alive", action="store_false",
+                        help="open a new connection per request, like devices before keep-alive")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="turn the rate limiter on (all simulated devices share one address)")
+    parser.add_argument("--output", help="result file (default loadtest-<profile>-<revision>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    result = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(result, json.load(f))
+    output = args.output or f"loadtest-{args.profile}-{result['revision']}.json"
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"Saved to {output}")
+
+if __name__ == "__main__":
+    main()
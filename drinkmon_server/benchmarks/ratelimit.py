@@ -0,0 +1,61 @@
+"""
+Per-request cost of the rate limiter.
+Times RateLimiter.check for many clients (existing buckets, and a stream of new
+clients that keeps evicting), and the RateLimitMiddleware around a no-op ASGI
+app against calling that app directly.
+
+Usage:
+    python -m drinkmon_server.benchmarks.ratelimit --clients 10000 --requests 200000
+"""
+import argparse
+import asyncio
+import json
+import time
+from drinkmon_server.ratelimit import RateLimiter, RateLimitMiddleware
+
+PATH = "/api/friend_changes"
+
+def time_checks(limiter: RateLimiter, clients: list, requests: int) -> float:
+    check = limiter.check
+    n = len(clients)
+    t0 = time.perf_counter()
+    for i in range(requests):
+        check(clients[i % n], PATH)
+    return (time.perf_counter() - t0) * 1e6 / requests
+
+async def _noop_app(scope, receive, send):
+    pass
+
+async def _drive(app, requests: int, clients: list) -> float:
+    scopes = [{"type": "http", "path": PATH, "client": (c, 1234)} for c in clients]
+    n = len(scopes)
+    t0 = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % n], None, None)
+    return (time.perf_counter() - t0) * 1e6 / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.clients)]
+    # Generous limits so every request is admitted and takes the full path
+    limits = {PATH: (1e9, 1e9)}
+    limiter = RateLimiter(limits)
+    time_checks(limiter, clients, args.clients)
+    existing = time_checks(limiter, clients, args.requests)
+    churn = RateLimiter(limits, max_buckets=args.clients)
+    fresh = [f"c{i}" for i in range(args.requests)]
+    new_clients = time_checks(churn, fresh, args.requests)
+    bare = asyncio.run(_drive(_noop_app, args.requests, clients))
+    wrapped = asyncio.run(_drive(RateLimitMiddleware(_noop_app, RateLimiter(limits)), args.requests, clients))
+    print(json.dumps({
+        "clients": args.clients,
+        "check_us_existing_bucket": round(existing, 3),
+        "check_us_new_bucket_with_eviction": round(new_clients, 3),
+        "middleware_overhead_us": round(wrapped - bare, 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
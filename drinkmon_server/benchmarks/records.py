@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: pydantic session models vs slotted SessionRecords in the hot store.
+"Before" reproduces the old storage path (a pydantic Session with a nested Color
+and datetimes per entry in a dict); "after" is the current SessionStore. Reports
+per-session memory and start/close latency.
+
+Usage:
+    python -m drinkmon_server.benchmarks.records --sessions 100000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+from uuid import uuid4
+from pydantic import BaseModel
+from drinkmon_server.models import Color
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+from drinkmon_server.session_store import SessionStore
+
+class PydanticSession(BaseModel):
+    # The shape sessions were stored in before records
+    guid: str
+    id: int = 0
+    color: Color
+    started: datetime
+    closed: Optional[datetime] = None
+
+def start_before(guids, color_req):
+    sessions = {}
+    for guid in guids:
+        sessions[guid] = PydanticSession(guid=guid, color=color_req, started=datetime.utcnow())
+    return sessions
+
+def close_before(sessions, guids):
+    for guid in guids:
+        sessions[guid].closed = datetime.utcnow()
+
+def start_after(guids, color_req):
+    store = SessionStore(closed_retention_count=len(guids), closed_retention_seconds=float("inf"))
+    for guid in guids:
+        c = color_req
+        store.add(SessionRecord(guid, pack_rgb(c.r, c.g, c.b), now_epoch()))
+    return store
+
+def close_after(store, guids):
+    for guid in guids:
+        store.close(guid, now_epoch())
+
+def measure(start, close, guids, color_req):
+    """
+    Returns (traced bytes after starting every session, start seconds, close seconds).
+    Timing and memory use separate runs so tracemalloc does not skew latency.
+    """
+    gc.collect()
+    t = time.perf_counter()
+    held = start(guids, color_req)
+    start_s = time.perf_counter() - t
+    t = time.perf_counter()
+    close(held, guids)
+    close_s = time.perf_counter() - t
+    del held
+    gc.collect()
+    tracemalloc.start()
+    held = start(guids, color_req)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return mem, start_s, close_s
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=100000)
+    args = parser.parse_args()
+    n = args.sessions
+    # GUID strings are shared by both runs, so they are excluded from the traced memory.
+    guids = [str(uuid4()) for _ in range(n)]
+    color_req = Color(r=0, g=191, b=255)
+    for name, start, close in (
+        ("before_pydantic", start_before, close_before),
+        ("after_records", start_after, close_after),
+    ):
+        mem, start_s, close_s = measure(start, close, guids, color_req)
+        print(json.dumps({
+            "store": name,
+            "sessions": n,
+            "bytes_per_session": round(mem / n),
+            "start_us": round(start_s / n * 1e6, 2),
+            "close_us": round(close_s / n * 1e6, 2),
+        }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Simulated week-long soak of the in-memory session store.
+Drives start/close traffic for a fleet of devices on a simulated clock and
+samples traced memory and history stats every simulated hour, to check that
+closed-session retention keeps the footprint flat.
+
+Usage:
+    python -m drinkmon_server.benchmarks.soak --days 7 --devices 2000
+"""
+import argparse
+import heapq
+import json
+import random
+import tracemalloc
+from uuid import uuid4
+from drinkmon_server.records import SessionRecord, pack_rgb
+from drinkmon_server.session_store import SessionStore
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--sessions-per-day", type=float, default=3.0)
+    parser.add_argument("--retention-count", type=int, default=10000)
+    parser.add_argument("--retention-seconds", type=float, default=86400)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    store = SessionStore(args.retention_count, args.retention_seconds)
+    colors = [pack_rgb(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(args.devices)]
+    start_prob = args.sessions_per_day / 24
+    clock = 1735689600  # simulated epoch seconds
+    closes = []  # heap of (close time, guid, device)
+    active_devices = set()
+    total = 0
+    tracemalloc.start()
+    samples = []
+    for hour in range(args.days * 24):
+        hour_end = clock + 3600
+        for device in range(args.devices):
+            if device in active_devices or rng.random() >= start_prob:
+                continue
+            started = clock + rng.randrange(3600)
+            session = SessionRecord(str(uuid4()), colors[device], started)
+            store.add(session)
+            active_devices.add(device)
+            total += 1
+            duration = rng.randrange(600, 7200)
+            heapq.heappush(closes, (started + duration, session.guid, device))
+        while closes and closes[0][0] < hour_end:
+            when, guid, device = heapq.heappop(closes)
+            store.close(guid, when)
+            active_devices.discard(device)
+        store.prune(hour_end)
+        clock = hour_end
+        if hour % 24 == 23:
+            current, _ = tracemalloc.get_traced_memory()
+            row = {"day": hour // 24 + 1, "sessions_total": total, "traced_kb": current // 1024}
+            row.update(store.memory_stats())
+            samples.append(row)
+            print(json.dumps(row))
+    first, last = samples[0]["traced_kb"], samples[-1]["traced_kb"]
+    print(json.dumps({"traced_kb_day1": first, "traced_kb_last": last, "growth_pct": round((last - first) / first * 100, 1)}))
+
+if __name__ == "__main__":
+    main()
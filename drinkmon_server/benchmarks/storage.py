@@ -0,0 +1,94 @@
+"""
+Benchmark the session repositories against growing closed-session history.
+For each backend and history size, prefills closed sessions plus a small active
+set, then runs a start/close/friend-poll mix and reports throughput and p50/p99
+latency per operation.
+
+Usage:
+    python -m drinkmon_server.benchmarks.storage --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from uuid import uuid4
+from drinkmon_server.benchmarks.common import percentile
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+from drinkmon_server.session_store import SessionRepository, SessionStore
+from drinkmon_server.sqlite_store import SQLiteSessionRepository
+
+RGB = pack_rgb(0, 191, 255)
+
+def new_session() -> SessionRecord:
+    return SessionRecord(str(uuid4()), RGB, now_epoch())
+
+def prefill(repo: SessionRepository, history: int, active: int) -> list:
+    now = now_epoch()
+    for _ in range(history):
+        session = new_session()
+        repo.add(session)
+        repo.close(session.guid, now)
+    open_guids = []
+    for _ in range(active):
+        session = new_session()
+        repo.add(session)
+        open_guids.append(session.guid)
+    return open_guids
+
+def run_mix(repo: SessionRepository, open_guids: list, ops: int) -> dict:
+    rng = random.Random(42)
+    timings = {"start": [], "close": [], "active": []}
+    started = time.perf_counter()
+    for _ in range(ops):
+        roll = rng.random()
+        if roll < 0.1:
+            t = time.perf_counter()
+            list(repo.active())
+            timings["active"].append(time.perf_counter() - t)
+        elif roll < 0.55 or not open_guids:
+            session = new_session()
+            t = time.perf_counter()
+            repo.add(session)
+            timings["start"].append(time.perf_counter() - t)
+            open_guids.append(session.guid)
+        else:
+            guid = open_guids.pop(rng.randrange(len(open_guids)))
+            t = time.perf_counter()
+            repo.close(guid, now_epoch())
+            timings["close"].append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    result = {"ops_per_sec": round(ops / elapsed)}
+    for op, values in timings.items():
+        us = [v * 1e6 for v in values]
+        result[op] = {"p50_us": round(percentile(us, 50), 1), "p99_us": round(percentile(us, 99), 1)}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--active", type=int, default=50, help="open sessions during the run")
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                if backend == "sqlite":
+                    repo = SQLiteSessionRepository(os.path.join(tmp, "bench.db"))
+                else:
+                    # Keep the full history so every size really is in memory
+                    repo = SessionStore(closed_retention_count=size + 1, closed_retention_seconds=float("inf"))
+                t = time.perf_counter()
+                open_guids = prefill(repo, size, args.active)
+                fill_s = time.perf_counter() - t
+                row = {"backend": backend, "history": size, "prefill_s": round(fill_s, 1)}
+                row.update(run_mix(repo, open_guids, args.ops))
+                repo.close_storage()
+            print(json.dumps(row))
+            results.append(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Friend-poll throughput with N uvicorn workers sharing one session coordinator.
+For each worker count, starts drinkmon_server.serve, opens some sessions, then
+drives /api/friend_sessions from several keep-alive client processes and
+reports polls/sec, server CPU per poll (summed over the coordinator and
+workers) and the scaling factor against the first worker count.
+
+Usage:
+    python -m drinkmon_server.benchmarks.workers --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import urllib.request
+from drinkmon_server.benchmarks.common import (
+    cpu_seconds,
+    free_port,
+    percentile,
+    process_tree,
+    start_server,
+    stop_server,
+)
+from drinkmon_server.benchmarks.concurrency import http_request
+
+async def poller(port: int, deadline: float, latencies: list, errors: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            status, _, _ = await http_request(reader, writer, "GET", "/api/friend_sessions")
+            if status != 200:
+                errors.append(status)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    finally:
+        writer.close()
+
+def client_process(port: int, connections: int, duration: float, start_at: float, results):
+    async def go():
+        latencies, errors = [], []
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(poller(port, deadline, latencies, errors) for _ in range(connections)))
+        return latencies, errors
+    results.put(asyncio.run(go()))
+
+def run(workers: int, connections: int, duration: float, procs: int, sessions: int) -> dict:
+    port = free_port()
+    server = start_server(port, workers=workers if workers > 1 else None)
+    try:
+        for i in range(sessions):
+            req = urllib.request.Request(
+                f"http://127.0.0.1:{port}/api/start_session",
+                data=json.dumps({"color": {"r": i % 256, "g": 0, "b": 0}}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            urllib.request.urlopen(req).read()
+        results = multiprocessing.Queue()
+        start_at = time.time() + 1.0
+        per_proc = [connections // procs + (1 if i < connections % procs else 0) for i in range(procs)]
+        clients = [
+            multiprocessing.Process(target=client_process, args=(port, n, duration, start_at, results))
+            for n in per_proc
+        ]
+        for c in clients:
+            c.start()
+        tree = process_tree(server.pid)
+        cpu_before = sum(cpu_seconds(p) for p in tree)
+        latencies, errors = [], []
+        for _ in clients:
+            lat, err = results.get(timeout=duration + 60)
+            latencies.extend(lat)
+            errors.extend(err)
+        server_cpu = sum(cpu_seconds(p) for p in tree) - cpu_before
+        for c in clients:
+            c.join(timeout=10)
+    finally:
+        stop_server(server)
+    return {
+        "workers": workers,
+        "polls": len(latencies),
+        "polls_per_sec": round(len(latencies) / duration),
+        "errors": len(errors),
+        "server_processes": len(tree),
+        "server_cpu_us_per_poll": round(server_cpu * 1e6 / max(len(latencies), 1)),
+        "latency_ms": {"p50": round(percentile(latencies, 50), 2), "p99": round(percentile(latencies, 99), 2)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 1, help="client processes")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions open during the run")
+    args = parser.parse_args()
+    rows = [run(n, args.connections, args.duration, args.procs, args.sessions) for n in args.workers]
+    base = rows[0]["polls_per_sec"] or 1
+    for row in rows:
+        row["scaling"] = round(row["polls_per_sec"] / base, 2)
+    print(json.dumps({"cpus": os.cpu_count(), "runs": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
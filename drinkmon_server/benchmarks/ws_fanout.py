@@ -0,0 +1,114 @@
+"""
+Load test for the friend-session WebSocket hub.
+Connects N local WebSocket clients to /api/friend_ws (spread over several client
+processes so the load generator is not the bottleneck), starts sessions over HTTP,
+and reports event delivery latency plus server RSS before and after.
+
+Usage:
+    python -m drinkmon_server.benchmarks.ws_fanout --clients 3000 --events 50 --procs 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import httpx
+import websockets
+from drinkmon_server.benchmarks.common import (
+    free_port,
+    percentile,
+    rss_kb,
+    start_server,
+    stop_server,
+)
+
+async def client(url: str, expected: int, latencies: list, connected: list):
+    async with websockets.connect(url, max_queue=None, open_timeout=120) as ws:
+        await ws.recv()  # snapshot
+        connected[0] += 1
+        received = 0
+        while received < expected:
+            msg = json.loads(await ws.recv())
+            if msg["type"] != "add":
+                continue
+            received += 1
+            # The sender encodes its wall-clock send time in milliseconds into the colour.
+            c = msg["color"]
+            sent_ms = (c["r"] << 16) | (c["g"] << 8) | c["b"]
+            now_ms = int(time.time() * 1000) & 0xFFFFFF
+            latencies.append((now_ms - sent_ms) % 0x1000000)
+
+def client_process(url: str, clients: int, expected: int, ready, results):
+    async def go():
+        latencies = []
+        connected = [0]
+        tasks = []
+        for i in range(clients):
+            tasks.append(asyncio.create_task(client(url, expected, latencies, connected)))
+            if i % 100 == 99:
+                await asyncio.sleep(0.05)
+        while connected[0] < clients:
+            await asyncio.sleep(0.05)
+        ready.release()
+        await asyncio.wait_for(asyncio.gather(*tasks), 300)
+        return latencies
+    results.put(asyncio.run(go()))
+
+def run(clients: int, events: int, interval: float, procs: int) -> dict:
+    port = free_port()
+    proc = start_server(port)
+    workers = []
+    try:
+        base = f"http://127.0.0.1:{port}"
+        url = f"ws://127.0.0.1:{port}/api/friend_ws"
+        rss_idle = rss_kb(proc.pid)
+        ready = multiprocessing.Semaphore(0)
+        results = multiprocessing.Queue()
+        per_proc = [clients // procs + (1 if i < clients % procs else 0) for i in range(procs)]
+        for n in per_proc:
+            w = multiprocessing.Process(target=client_process, args=(url, n, events, ready, results))
+            w.start()
+            workers.append(w)
+        for _ in per_proc:
+            ready.acquire(timeout=300)
+        rss_connected = rss_kb(proc.pid)
+        with httpx.Client(base_url=base) as http:
+            for _ in range(events):
+                now_ms = int(time.time() * 1000) & 0xFFFFFF
+                color = {"r": (now_ms >> 16) & 0xFF, "g": (now_ms >> 8) & 0xFF, "b": now_ms & 0xFF}
+                http.post("/api/start_session", json={"color": color})
+                time.sleep(interval)
+            latencies = []
+            for _ in per_proc:
+                latencies.extend(results.get(timeout=300))
+            hub_stats = http.get("/api/diagnostics").json()["hub"]
+        rss_after = rss_kb(proc.pid)
+    finally:
+        for w in workers:
+            w.join(timeout=10)
+        stop_server(proc)
+    return {
+        "clients": clients,
+        "events": events,
+        "deliveries": len(latencies),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=0),
+        },
+        "server_rss_kb": {"idle": rss_idle, "connected": rss_connected, "after_events": rss_after},
+        "hub": hub_stats,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between events")
+    parser.add_argument("--procs", type=int, default=4, help="client processes")
+    args = parser.parse_args()
+    result = run(args.clients, args.events, args.interval, args.procs)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
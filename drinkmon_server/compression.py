@@ -0,0 +1,65 @@
+"""
+Gzip for friend feed responses.
+Feed bodies are compressed once per representation and version, keyed by ETag,
+and reused for every poll until the feed changes. Bodies under the size
+threshold are sent as they are, where gzip would save little or even add bytes.
+"""
+import gzip
+from typing import Dict
+
+GZIP_LEVEL = 6
+# Compressed bodies kept; only the current version of each representation is
+# polled, so a handful covers them all.
+CACHE_SIZE = 8
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Check an Accept-Encoding header value for gzip (or *) with a non-zero q.
+    """
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        return True
+    return False
+
+def gzip_etag(etag: str) -> str:
+    """
+    ETag of the gzipped form of a representation, distinct from the plain one.
+    """
+    return etag[:-1] + '-gzip"'
+
+def compress(body: bytes) -> bytes:
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+class GzipCache:
+    def __init__(self, min_size: int):
+        self.min_size = min_size
+        self._bodies: Dict[str, bytes] = {}
+        self.compressions = 0
+
+    def wants(self, body: bytes) -> bool:
+        """
+        True if a body this size should be sent compressed.
+        """
+        return bool(self.min_size) and len(body) >= self.min_size
+
+    def get(self, etag: str, body: bytes) -> bytes:
+        """
+        The gzipped body for a representation's ETag, compressing it on first use.
+        """
+        gz = self._bodies.get(etag)
+        if gz is None:
+            if len(self._bodies) >= CACHE_SIZE:
+                self._bodies.clear()
+            gz = self._bodies[etag] = compress(body)
+            self.compressions += 1
+        return gz
@@ -0,0 +1,54 @@
+"""
+Environment configuration for the drinkmon backend.
+Read once at import by the API workers and the session coordinator.
+"""
+import os
+from drinkmon_server.journal import DEFAULT_JOURNAL_SIZE
+from drinkmon_server.leases import DEFAULT_LEASE_SECONDS
+from drinkmon_server.session_store import (
+    DEFAULT_CLOSED_RETENTION_COUNT,
+    DEFAULT_CLOSED_RETENTION_SECONDS,
+)
+
+# Logging runs through a queue; formatting and I/O happen on a listener thread.
+LOG_LEVEL = os.environ.get("DRINKMON_LOG_LEVEL", "DEBUG")
+# Only one in this many friend feed debug records is kept.
+FEED_LOG_SAMPLE_RATE = int(os.environ.get("DRINKMON_FEED_LOG_SAMPLE", 100))
+
+# Set DRINKMON_DATA_DIR to persist sessions across restarts.
+DATA_DIR = os.environ.get("DRINKMON_DATA_DIR")
+# "memory" (default) or "sqlite"
+STORE_BACKEND = os.environ.get("DRINKMON_STORE", "memory")
+SQLITE_PATH = os.environ.get(
+    "DRINKMON_SQLITE_PATH", os.path.join(DATA_DIR or ".", "drinkmon_sessions.db")
+)
+# Closed-session history kept in memory, by count and by age.
+CLOSED_RETENTION_COUNT = int(os.environ.get("DRINKMON_CLOSED_RETENTION_COUNT", DEFAULT_CLOSED_RETENTION_COUNT))
+CLOSED_RETENTION_SECONDS = float(os.environ.get("DRINKMON_CLOSED_RETENTION_SECONDS", DEFAULT_CLOSED_RETENTION_SECONDS))
+
+# Sessions whose lease is not renewed within this many seconds are closed by the reaper.
+LEASE_SECONDS = float(os.environ.get("DRINKMON_SESSION_LEASE", DEFAULT_LEASE_SECONDS))
+REAP_INTERVAL = 5.0
+
+# Changes kept for /api/friend_changes; older cursors get a full snapshot.
+JOURNAL_SIZE = int(os.environ.get("DRINKMON_JOURNAL_SIZE", DEFAULT_JOURNAL_SIZE))
+
+# Friend feed bodies at least this many bytes are gzipped for clients that
+# accept it (0 disables compression).
+GZIP_MIN_SIZE = int(os.environ.get("DRINKMON_GZIP_MIN_SIZE", 1024))
+# Seconds an idle HTTP/1.1 connection is kept open. Longer than the devices'
+# 30s friend poll, so a polling device keeps reusing one connection.
+KEEPALIVE_TIMEOUT = int(os.environ.get("DRINKMON_KEEPALIVE", 75))
+
+# Per-client token buckets on the API endpoints (see ratelimit.DEFAULT_LIMITS);
+# set to 1 to turn admission control on. Off by default: clients are told
+# apart by address, and behind a proxy or NAT they all share one. Each worker
+# limits on its own.
+RATE_LIMIT = os.environ.get("DRINKMON_RATE_LIMIT", "0") == "1"
+
+# Multi-worker mode: set by drinkmon_server.serve for every uvicorn worker.
+# Unix socket of the session coordinator and name of its shared feed segment.
+COORDINATOR_SOCKET = os.environ.get("DRINKMON_COORDINATOR")
+FEED_SHM_NAME = os.environ.get("DRINKMON_FEED_SHM")
+# Capacity of the shared feed segment in bytes (~36 bytes per active session).
+FEED_SHM_SIZE = int(os.environ.get("DRINKMON_FEED_SHM_SIZE", 4 * 1024 * 1024))
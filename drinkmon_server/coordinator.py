@@ -0,0 +1,494 @@
+"""
+Session coordinator for multi-worker mode.
+One coordinator process owns the SessionService. Uvicorn workers send it
+mutations over a unix socket using a small binary protocol, receive its change
+events on a subscription connection, and read the friend feed straight out of a
+shared-memory segment, so friend polls never leave the worker.
+
+Wire format: every frame is a struct header (code u8, payload length u32)
+followed by the payload. Requests carry an OP_* code, replies a status code,
+and subscription frames STATUS_EVENT.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, List, Optional, Tuple
+from drinkmon_server import wire
+from drinkmon_server.events import FriendEvent, snapshot_payload
+from drinkmon_server.feed import etag_for
+from drinkmon_server.records import SessionRecord, color_dict, pack_rgb
+from drinkmon_server.session_store import SessionAlreadyClosed, SessionNotFound
+from drinkmon_server.service import BATCH_STATUSES, SessionService
+
+logger = logging.getLogger("drinkmon")
+
+HEADER = struct.Struct("!BI")
+OP_START, OP_CLOSE, OP_RENEW, OP_CLEAR, OP_SNAPSHOT, OP_STATS, OP_SUBSCRIBE, OP_FEED, OP_BATCH = range(1, 10)
+OK, NOT_FOUND, ALREADY_CLOSED, BAD_REQUEST = range(4)
+STATUS_EVENT = 16
+
+START_REQUEST = struct.Struct("!I")        # rgb
+START_REPLY = struct.Struct("!QQ")         # id, started; GUID follows
+BATCH_REQUEST = struct.Struct("!HH?")      # starts, closes, all_or_nothing; rgbs then GUIDs follow
+GUID_PREFIX = struct.Struct("!H")          # length of each GUID in a batch
+BATCH_REPLY = struct.Struct("!?")          # applied; START_REPLY+GUID per start, status byte per close
+GUID_LEN = 36
+COUNT = struct.Struct("!I")
+VERSION = struct.Struct("!Q")
+FRIEND = struct.Struct("!QI")              # id, rgb; repeated after VERSION in snapshots
+EVENT = struct.Struct("!BQQI")             # kind, version, id, rgb
+EVENT_KINDS = ("add", "remove", "reset")
+# Seconds the coordinator waits for workers to disconnect when asked to stop.
+SHUTDOWN_GRACE = 10.0
+
+def encode_frame(code: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(code, len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    code, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return code, await reader.readexactly(length) if length else b""
+
+def encode_event(event: FriendEvent, rgb: int) -> bytes:
+    return encode_frame(STATUS_EVENT, EVENT.pack(EVENT_KINDS.index(event.kind), event.version, event.id, rgb))
+
+def decode_event(payload: bytes) -> FriendEvent:
+    kind, version, sid, rgb = EVENT.unpack(payload)
+    if EVENT_KINDS[kind] == "reset":
+        return FriendEvent("reset", version)
+    return FriendEvent(EVENT_KINDS[kind], version, sid, color_dict(rgb))
+
+class SharedFeed:
+    """
+    The rendered friend feed in a shared-memory segment, guarded by a seqlock.
+    Holds the JSON body followed by the binary body with ids; workers derive
+    the colours-only binary body from the latter.
+    The coordinator is the only writer: it makes the sequence odd, writes the
+    body, then makes it even again. Readers retry if the sequence was odd or
+    moved while they copied, and keep their last copy until it moves.
+    """
+    LAYOUT = struct.Struct("=QQII8s")  # seq, version, JSON length, binary length, boot id
+    BODY_OFFSET = 32
+    OVERFLOW = 0xFFFFFFFF
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        self._seq = 0
+        self._cached_seq = -1
+        self._cached: Tuple[int, str, Optional[Tuple[bytes, bytes]]] = (0, "", (b"[]", b""))
+        # Reads answered from the local copy vs. reads that copied the segment
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def create(cls, name: str, size: int) -> "SharedFeed":
+        return cls(shared_memory.SharedMemory(name=name, create=True, size=size), owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFeed":
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the coordinator may unlink the segment; stop this process's
+        # resource tracker from removing it when a worker exits.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def capacity(self) -> int:
+        return self._shm.size - self.BODY_OFFSET
+
+    def publish(self, version: int, boot_id: str, body: bytes, binary: bytes) -> bool:
+        """
+        Write new JSON and binary feed bodies. Returns False (and publishes an
+        overflow marker) if they do not fit the segment.
+        """
+        fits = len(body) + len(binary) <= self.capacity
+        buf = self._buf
+        self._seq += 1
+        struct.pack_into("=Q", buf, 0, self._seq)
+        if fits:
+            split = self.BODY_OFFSET + len(body)
+            buf[self.BODY_OFFSET:split] = body
+            buf[split:split + len(binary)] = binary
+        self.LAYOUT.pack_into(
+            buf, 0, self._seq, version, len(body) if fits else self.OVERFLOW, len(binary), boot_id.encode()
+        )
+        self._seq += 1
+        struct.pack_into("=Q", buf, 0, self._seq)
+        return fits
+
+    def read(self) -> Tuple[int, str, Optional[Tuple[bytes, bytes]]]:
+        """
+        Return (version, boot id, (JSON body, binary body)). The bodies are
+        None when the coordinator reported an overflow and the feed has to be
+        fetched over the socket.
+        """
+        buf = self._buf
+        while True:
+            seq = struct.unpack_from("=Q", buf, 0)[0]
+            if seq == self._cached_seq:
+                self.cache_hits += 1
+                return self._cached
+            if seq & 1:
+                time.sleep(0)
+                continue
+            _, version, length, bin_length, boot = self.LAYOUT.unpack_from(buf, 0)
+            bodies = None
+            if length != self.OVERFLOW:
+                split = self.BODY_OFFSET + length
+                bodies = (bytes(buf[self.BODY_OFFSET:split]), bytes(buf[split:split + bin_length]))
+            if struct.unpack_from("=Q", buf, 0)[0] == seq:
+                self.cache_misses += 1
+                self._cached_seq = seq
+                self._cached = (version, boot.decode(), bodies)
+                return self._cached
+
+    def close(self) -> None:
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+class CoordinatorServer:
+    """
+    Serves a SessionService to workers over a unix socket and mirrors its
+    feed into a SharedFeed after every change. Changes are collected and
+    published together, so a batch renders the feed once, not once per item.
+    """
+
+    def __init__(self, service: SessionService, shared: SharedFeed):
+        self.service = service
+        self.shared = shared
+        self._subscribers: List[asyncio.StreamWriter] = []
+        self._connections = {}
+        self._server = None
+        # Event frames not yet sent to subscribers; the feed is published first
+        self._pending: List[bytes] = []
+        service.listeners.append(self._on_event)
+
+    def publish_feed(self) -> None:
+        feed = self.service.feed
+        _, body = feed.render()
+        _, binary = feed.render(wire.FORMAT_BINARY_IDS)
+        if not self.shared.publish(feed.version, feed.boot_id, body, binary):
+            logger.warning(
+                "Friend feed (%d bytes) exceeds the shared segment (%d bytes); workers fall back to the socket",
+                len(body) + len(binary), self.shared.capacity,
+            )
+
+    def _on_event(self, event: FriendEvent) -> None:
+        c = event.color
+        rgb = pack_rgb(c["r"], c["g"], c["b"]) if c else 0
+        if not self._pending:
+            # Changes outside a request (the reaper) are flushed on the next loop pass
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._pending.append(encode_event(event, rgb))
+
+    def _flush(self) -> None:
+        """
+        Publish the feed once for every change since the last flush, then
+        send their events, so a worker never hears of a change before the
+        shared feed has it.
+        """
+        if not self._pending:
+            return
+        frames = b"".join(self._pending)
+        self._pending.clear()
+        self.publish_feed()
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.remove(writer)
+            else:
+                writer.write(frames)
+
+    async def start(self, path: str) -> None:
+        self.publish_feed()
+        self._server = await asyncio.start_unix_server(self._handle, path=path)
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Wait for subscribed workers to disconnect. A terminal Ctrl-C or a
+        process-group SIGTERM reaches the coordinator and the workers at once,
+        and the workers still need it while they shut down.
+        """
+        deadline = time.monotonic() + timeout
+        while self._subscribers and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+        # Closing the transports makes every handler see EOF and return
+        for writer in list(self._connections.values()):
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                op, payload = await read_frame(reader)
+                if op == OP_SUBSCRIBE:
+                    self._subscribers.append(writer)
+                    writer.write(encode_frame(OK))
+                    # Nothing else arrives on this connection; wait for the worker to go away.
+                    await reader.read()
+                    return
+                status, reply = await self._dispatch(op, payload)
+                # The caller may read the shared feed as soon as it has the reply
+                self._flush()
+                writer.write(encode_frame(status, reply))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if writer in self._subscribers:
+                self._subscribers.remove(writer)
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _dispatch(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        service = self.service
+        if op == OP_START:
+            session = await service.start(START_REQUEST.unpack(payload)[0])
+            return OK, START_REPLY.pack(session.id, session.started) + session.guid.encode()
+        if op == OP_CLOSE:
+            try:
+                await service.close(payload.decode())
+            except SessionNotFound:
+                return NOT_FOUND, b""
+            except SessionAlreadyClosed:
+                return ALREADY_CLOSED, b""
+            return OK, b""
+        if op == OP_BATCH:
+            n_starts, n_closes, all_or_nothing = BATCH_REQUEST.unpack_from(payload)
+            offset = BATCH_REQUEST.size
+            rgbs = list(struct.unpack_from(f"!{n_starts}I", payload, offset))
+            offset += 4 * n_starts
+            guids = []
+            for _ in range(n_closes):
+                (length,) = GUID_PREFIX.unpack_from(payload, offset)
+                offset += GUID_PREFIX.size
+                guids.append(payload[offset:offset + length].decode())
+                offset += length
+            started, statuses, applied = await service.batch(rgbs, guids, all_or_nothing)
+            reply = [BATCH_REPLY.pack(applied)]
+            reply.extend(START_REPLY.pack(s.id, s.started) + s.guid.encode() for s in started)
+            reply.append(bytes(BATCH_STATUSES.index(st) for st in statuses))
+            return OK, b"".join(reply)
+        if op == OP_RENEW:
+            guids = [g for g in payload.decode().split(",") if g]
+            return OK, COUNT.pack(await service.renew(guids))
+        if op == OP_CLEAR:
+            return OK, COUNT.pack(await service.clear())
+        if op == OP_SNAPSHOT:
+            friends = b"".join(FRIEND.pack(sid, rgb) for sid, rgb in service.feed.entries())
+            return OK, VERSION.pack(service.version) + friends
+        if op == OP_STATS:
+            stats = await service.stats()
+            stats["workers"] = len(self._subscribers)
+            return OK, json.dumps(stats).encode()
+        if op == OP_FEED:
+            _, body = service.feed.render()
+            _, binary = service.feed.render(wire.FORMAT_BINARY_IDS)
+            return OK, VERSION.pack(service.version) + COUNT.pack(len(body)) + body + binary
+        return BAD_REQUEST, b""
+
+def _ignore_result(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+class CoordinatorClient:
+    """
+    Worker-side stand-in for SessionService that forwards writes to the
+    coordinator and serves reads from the shared feed.
+    """
+
+    def __init__(self, socket_path: str, shm_name: str):
+        self.socket_path = socket_path
+        self.shared = SharedFeed.attach(shm_name)
+        self.listeners: List[Callable[[FriendEvent], None]] = []
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        # Reply read of a call that was cancelled after sending its request
+        self._unread: Optional[asyncio.Future] = None
+        self._events = None
+        # Colours-only binary body derived from the shared one, per version
+        self._stripped: Tuple[int, str, bytes] = (-1, "", b"")
+
+    @property
+    def version(self) -> int:
+        return self.shared.read()[0]
+
+    @property
+    def boot_id(self) -> str:
+        return self.shared.read()[1]
+
+    async def open(self) -> None:
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        writer.write(encode_frame(OP_SUBSCRIBE))
+        # Wait for the acknowledgement so no write made after open() misses its event
+        await read_frame(reader)
+        self._events = asyncio.create_task(self._pump_events(reader, writer))
+
+    async def shutdown(self) -> None:
+        if self._events:
+            self._events.cancel()
+        if self._writer:
+            self._writer.close()
+        self.shared.close()
+
+    async def _pump_events(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                code, payload = await read_frame(reader)
+                if code == STATUS_EVENT:
+                    event = decode_event(payload)
+                    for listener in self.listeners:
+                        listener(event)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error("Lost the coordinator event stream")
+        finally:
+            writer.close()
+
+    async def _call(self, op: int, payload: bytes = b"") -> Tuple[int, bytes]:
+        # One request in flight per worker; the coordinator answers in order.
+        async with self._lock:
+            if self._unread is not None:
+                # A cancelled call's reply; it has to be consumed before ours
+                try:
+                    await asyncio.shield(self._unread)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    pass  # the write below fails the same way
+                self._unread = None
+            self._writer.write(encode_frame(op, payload))
+            reply = asyncio.ensure_future(read_frame(self._reader))
+            try:
+                return await asyncio.shield(reply)
+            except asyncio.CancelledError:
+                # Keep reading the reply in the background so the next call
+                # does not take it for its own.
+                self._unread = reply
+                reply.add_done_callback(_ignore_result)
+                raise
+
+    async def start(self, rgb: int) -> SessionRecord:
+        _, reply = await self._call(OP_START, START_REQUEST.pack(rgb))
+        sid, started = START_REPLY.unpack_from(reply)
+        return SessionRecord(reply[START_REPLY.size:].decode(), rgb, started, sid)
+
+    async def close(self, guid: str) -> None:
+        status, _ = await self._call(OP_CLOSE, guid.encode())
+        if status == NOT_FOUND:
+            raise SessionNotFound(guid)
+        if status == ALREADY_CLOSED:
+            raise SessionAlreadyClosed(guid)
+
+    async def batch(self, rgbs: List[int], guids: List[str],
+                    all_or_nothing: bool = False) -> Tuple[List[SessionRecord], List[str], bool]:
+        payload = BATCH_REQUEST.pack(len(rgbs), len(guids), all_or_nothing)
+        payload += struct.pack(f"!{len(rgbs)}I", *rgbs)
+        for guid in guids:
+            raw = guid.encode()
+            payload += GUID_PREFIX.pack(len(raw)) + raw
+        _, reply = await self._call(OP_BATCH, payload)
+        applied = BATCH_REPLY.unpack_from(reply)[0]
+        offset = BATCH_REPLY.size
+        started = []
+        if applied:
+            for rgb in rgbs:
+                sid, when = START_REPLY.unpack_from(reply, offset)
+                offset += START_REPLY.size
+                started.append(SessionRecord(reply[offset:offset + GUID_LEN].decode(), rgb, when, sid))
+                offset += GUID_LEN
+        statuses = [BATCH_STATUSES[code] for code in reply[offset:]]
+        return started, statuses, applied
+
+    async def renew(self, guids: List[str]) -> int:
+        _, reply = await self._call(OP_RENEW, ",".join(guids).encode())
+        return COUNT.unpack(reply)[0]
+
+    async def clear(self) -> int:
+        _, reply = await self._call(OP_CLEAR)
+        return COUNT.unpack(reply)[0]
+
+    async def render(self, fmt: str = wire.FORMAT_JSON) -> Tuple[str, bytes]:
+        version, boot_id, bodies = self.shared.read()
+        if bodies is None:
+            _, reply = await self._call(OP_FEED)
+            version = VERSION.unpack_from(reply)[0]
+            split = VERSION.size + COUNT.size + COUNT.unpack_from(reply, VERSION.size)[0]
+            bodies = (reply[VERSION.size + COUNT.size:split], reply[split:])
+        if fmt == wire.FORMAT_JSON:
+            body = bodies[0]
+        elif fmt == wire.FORMAT_BINARY_IDS:
+            body = bodies[1]
+        else:
+            if self._stripped[:2] != (version, boot_id):
+                self._stripped = (version, boot_id, wire.strip_ids(bodies[1]))
+            body = self._stripped[2]
+        return etag_for(boot_id, version, fmt), body
+
+    def feed_cache_stats(self) -> Tuple[int, int]:
+        """
+        (hits, misses) of this worker's copy of the shared feed.
+        """
+        return self.shared.cache_hits, self.shared.cache_misses
+
+    async def snapshot(self) -> dict:
+        _, reply = await self._call(OP_SNAPSHOT)
+        version = VERSION.unpack_from(reply)[0]
+        friends = [
+            (sid, color_dict(rgb))
+            for sid, rgb in FRIEND.iter_unpack(reply[VERSION.size:])
+        ]
+        return snapshot_payload(version, friends)
+
+    async def stats(self) -> dict:
+        _, reply = await self._call(OP_STATS)
+        return json.loads(reply)
+
+def run(socket_path: str, shm_name: str, shm_size: int) -> None:
+    """
+    Coordinator process entry point: serve the configured SessionService
+    until SIGTERM or SIGINT.
+    """
+    from drinkmon_server import config
+    from drinkmon_server.log_pipeline import process_log_file, setup_logging
+
+    listener = setup_logging(config.LOG_LEVEL, process_log_file("coordinator"))
+
+    async def main():
+        service = SessionService.from_config()
+        shared = SharedFeed.create(shm_name, shm_size)
+        server = CoordinatorServer(service, shared)
+        await service.open()
+        await server.start(socket_path)
+        logger.info("Session coordinator listening on %s", socket_path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await stop.wait()
+            await server.drain(SHUTDOWN_GRACE)
+        finally:
+            await server.stop()
+            await service.shutdown()
+            shared.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
@@ -5,132 +5,369 @@ Stores active sessions, assigns GUIDs, and allows closing sessions.
 VERSION = "0.0.2"
 
 
-import logging
-from logging.config import dictConfig
-import sys
+import asyncio
 import json
-from datetime import datetime
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
-from uuid import uuid4
-
-# Custom JSON formatter for structured logs
-class JsonFormatter(logging.Formatter):
-    def format(self, record):
-        log_record = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "level": record.levelname,
-            "logger": record.name,
-            "module": record.module,
-            "line": record.lineno,
-            "message": record.getMessage(),
-        }
-        if record.exc_info:
-            log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
-
-# Logging configuration
-log_config = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "json": {"()": JsonFormatter},
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "level": "DEBUG",
-            "formatter": "json",
-            "stream": "ext://sys.stdout",
-        },
-        "rotating_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "level": "DEBUG",
-            "formatter": "json",
-            "filename": "drinkmon_api.log",
-            "maxBytes": 10485760,  # 10 MB
-            "backupCount": 5,
-        },
-    },
-    "loggers": {
-        "drinkmon": {
-            "handlers": ["console", "rotating_file"],
-            "level": "DEBUG",
-            "propagate": False,
-        },
-    },
-    "root": {
-        "handlers": ["console"],
-        "level": "DEBUG",
-    },
-}
-dictConfig(log_config)
-logger = logging.getLogger("drinkmon")
-
-app = FastAPI()
-logger.info(f"Started drinkmon API server version {VERSION}")
-
-class Color(BaseModel):
-    r: int = Field(..., ge=0, le=255)
-    g: int = Field(..., ge=0, le=255)
-    b: int = Field(..., ge=0, le=255)
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Optional
+from drinkmon_server import config, wire
+from drinkmon_server.models import (
+    Color,
+    SessionBatchRequest,
+    SessionBatchResponse,
+    SessionCloseResult,
+    SessionCloseRequest,
+    SessionRenewRequest,
+    SessionRenewResponse,
+    SessionStartRequest,
+    SessionStartResponse,
+)
+from drinkmon_server.session_store import SessionAlreadyClosed, SessionNotFound
+from drinkmon_server.records import pack_rgb
+from drinkmon_server.feed import FriendFeed
+from drinkmon_server.events import HEARTBEAT_INTERVAL, format_sse, format_ws
+from drinkmon_server.hub import RESYNC, BroadcastHub
+from drinkmon_server.log_pipeline import SamplingFilter, process_log_file, setup_logging
+from drinkmon_server.service import SessionService
+from drinkmon_server.journal import ChangeJournal
+from drinkmon_server.compression import GzipCache, accepts_gzip, compress, gzip_etag
+from drinkmon_server.ratelimit import RateLimiter, RateLimitMiddleware
+from drinkmon_server.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware
 
-class SessionStartRequest(BaseModel):
-    color: Color
+# Workers started by drinkmon_server.serve each write their own log file
+log_listener = setup_logging(
+    config.LOG_LEVEL, process_log_file("worker" if config.COORDINATOR_SOCKET else None)
+)
+logger = logging.getLogger("drinkmon")
+feed_logger = logging.getLogger("drinkmon.feed")
+feed_logger.addFilter(SamplingFilter({logging.DEBUG: config.FEED_LOG_SAMPLE_RATE}))
 
-class SessionStartResponse(BaseModel):
-    guid: str
+# Session state lives in a SessionService in this process, or, when started by
+# drinkmon_server.serve with several workers, in the shared coordinator process.
+if config.COORDINATOR_SOCKET:
+    from drinkmon_server.coordinator import CoordinatorClient
+    sessions = CoordinatorClient(config.COORDINATOR_SOCKET, config.FEED_SHM_NAME)
+    MODE = "coordinator"
+else:
+    sessions = SessionService.from_config()
+    MODE = f"{config.STORE_BACKEND} store"
+hub = BroadcastHub()
+journal = ChangeJournal(config.JOURNAL_SIZE)
+gzip_cache = GzipCache(config.GZIP_MIN_SIZE)
+limiter = RateLimiter()
+metrics = Metrics()
+sessions.listeners.append(hub.publish)
+sessions.listeners.append(journal.record)
 
-class SessionCloseRequest(BaseModel):
-    guid: str
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Already running on the first lifespan; restarted for any later one
+    log_listener.start()
+    await sessions.open()
+    journal.start_at(sessions.version)
+    lag_monitor = asyncio.create_task(metrics.monitor_loop_lag())
+    yield
+    lag_monitor.cancel()
+    await sessions.shutdown()
+    log_listener.stop()
 
-class Session(BaseModel):
-    guid: str
-    color: Color
-    started: datetime
-    closed: Optional[datetime] = None
+app = FastAPI(lifespan=lifespan)
+if config.RATE_LIMIT:
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+# Outermost, so rate-limited requests are counted too
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+logger.info("Started drinkmon API server version %s (%s)", VERSION, MODE)
 
-sessions: Dict[str, Session] = {}
+# Handlers are all async: they run on the event loop, which makes it the only
+# thread touching leases, the feed and (for the in-memory store) the sessions.
 
 @app.post("/api/start_session", response_model=SessionStartResponse)
-def start_session(req: SessionStartRequest) -> SessionStartResponse:
+async def start_session(req: SessionStartRequest) -> SessionStartResponse:
     """
     Start a new session, assign a GUID, and store it as active.
     """
-    guid = str(uuid4())
-    session = Session(guid=guid, color=req.color, started=datetime.utcnow())
-    sessions[guid] = session
-    logger.info(f"Session started: guid={guid}, color={req.color.dict()}")
-    return SessionStartResponse(guid=guid)
+    c = req.color
+    session = await sessions.start(pack_rgb(c.r, c.g, c.b))
+    logger.info("Session started: guid=%s, color=(%d, %d, %d)", session.guid, c.r, c.g, c.b)
+    return SessionStartResponse(guid=session.guid)
 
 @app.post("/api/close_session")
-def close_session(req: SessionCloseRequest):
+async def close_session(req: SessionCloseRequest):
     """
     Close an active session by GUID.
     """
-    session = sessions.get(req.guid)
-    if not session:
-        logger.warning(f"Attempt to close non-existent session: guid={req.guid}")
+    try:
+        await sessions.close(req.guid)
+    except SessionNotFound:
+        logger.warning("Attempt to close non-existent session: guid=%s", req.guid)
         raise HTTPException(status_code=404, detail="Session not found")
-    if session.closed:
-        logger.warning(f"Attempt to close already closed session: guid={req.guid}")
+    except SessionAlreadyClosed:
+        logger.warning("Attempt to close already closed session: guid=%s", req.guid)
         raise HTTPException(status_code=400, detail="Session already closed")
-    session.closed = datetime.utcnow()
-    logger.info(f"Session closed: guid={req.guid}")
+    logger.info("Session closed: guid=%s", req.guid)
     return {"status": "closed"}
 
+@app.post("/api/batch_sessions", response_model=SessionBatchResponse)
+async def batch_sessions(req: SessionBatchRequest):
+    """
+    Start and close many sessions in one request, for gateways and bulk tooling.
+    The batch is applied as one unit and per-item results come back in request
+    order. With all_or_nothing, a batch in which any close would fail is
+    rejected with 409 and nothing is applied.
+    """
+    rgbs = [pack_rgb(s.color.r, s.color.g, s.color.b) for s in req.start]
+    started, statuses, applied = await sessions.batch(rgbs, req.close, req.all_or_nothing)
+    resp = SessionBatchResponse(
+        applied=applied,
+        started=[SessionStartResponse(guid=s.guid) for s in started],
+        closed=[SessionCloseResult(guid=g, status=st) for g, st in zip(req.close, statuses)],
+    )
+    logger.info("Session batch: started=%d, closes=%d, applied=%s", len(started), len(req.close), applied)
+    if not applied:
+        return JSONResponse(status_code=409, content=resp.model_dump())
+    return resp
+
+# Devices may piggy-back lease renewals on a friend poll with this header
+# (comma-separated GUIDs); the count renewed comes back in RENEWED_HEADER.
+RENEW_HEADER = "x-drinkmon-renew"
+RENEWED_HEADER = "X-Drinkmon-Renewed"
+
+async def _piggybacked_renewal(request: Request, headers: dict) -> None:
+    renew = request.headers.get(RENEW_HEADER)
+    if renew:
+        guids = [g.strip() for g in renew.split(",") if g.strip()]
+        headers[RENEWED_HEADER] = str(await sessions.renew(guids))
+
+@app.post("/api/renew", response_model=SessionRenewResponse)
+async def renew_sessions(req: SessionRenewRequest) -> SessionRenewResponse:
+    """
+    Renew the leases of one or more open sessions.
+    Unknown or already closed GUIDs are counted but otherwise ignored.
+    """
+    renewed = await sessions.renew(req.guids)
+    logger.debug("Sessions renewed: %d/%d", renewed, len(req.guids))
+    return SessionRenewResponse(renewed=renewed, unknown=len(req.guids) - renewed)
+
 @app.get("/api/friend_sessions", response_model=List[Dict[str, Color]])
-def get_active_sessions() -> List[Dict[str, Color]]:
+async def get_active_sessions(request: Request) -> Response:
     """
     Return a list of active (open) sessions and their colors.
+    Serves the cached body with an ETag and answers 304 when the client's
+    If-None-Match still matches the current state version. Clients that accept
+    wire.MEDIA_TYPE get the compact binary encoding instead of JSON, and bodies
+    of at least GZIP_MIN_SIZE bytes are gzipped (once per version) for clients
+    that accept gzip. Renews any leases listed in the X-Drinkmon-Renew header.
+    """
+    fmt = wire.negotiate(request.headers.get("accept", ""))
+    plain_etag, body = await sessions.render(fmt)
+    gzipped = gzip_cache.wants(body) and accepts_gzip(request.headers.get("accept-encoding", ""))
+    etag = gzip_etag(plain_etag) if gzipped else plain_etag
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    await _piggybacked_renewal(request, headers)
+    if FriendFeed.etag_matches(request.headers.get("if-none-match", ""), etag):
+        feed_logger.debug("Active sessions not modified. ETag: %s", etag)
+        return Response(status_code=304, headers=headers)
+    feed_logger.debug("Active sessions requested. ETag: %s", etag)
+    if gzipped:
+        body = gzip_cache.get(plain_etag, body)
+        headers["Content-Encoding"] = "gzip"
+    media_type = "application/json" if fmt == wire.FORMAT_JSON else wire.MEDIA_TYPE
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def _parse_cursor(cursor: str, boot_id: str) -> Optional[int]:
+    """
+    Version encoded in a friend_changes cursor ("<boot id>-<version>"), or None
+    if it is malformed or was issued before a restart.
+    """
+    boot, _, version = cursor.partition("-")
+    if boot != boot_id or not version.isdigit():
+        return None
+    return int(version)
+
+def _packed(color: Dict[str, int]) -> int:
+    return pack_rgb(color["r"], color["g"], color["b"])
+
+def _json_bytes(data) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def _feed_response(request: Request, content: bytes, media_type: str, headers: dict) -> Response:
+    """
+    Build a per-request feed response, gzipped when it is large enough and
+    the client accepts gzip.
     """
-    active = [{"color": s.color} for s in sessions.values() if not s.closed]
-    logger.debug(f"Active sessions requested. Count: {len(active)}")
-    return active
-  
+    if gzip_cache.wants(content) and accepts_gzip(request.headers.get("accept-encoding", "")):
+        content = compress(content)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content, media_type=media_type, headers=headers)
+
+@app.get("/api/friend_changes")
+async def friend_changes(request: Request, since: str = "") -> Response:
+    """
+    Return the changes to the active set since a cursor from an earlier response.
+    Answers with added/removed friends while the journal still covers the
+    cursor, and with the full friend list ("full": true) when it does not, for
+    a missing cursor, or after a server restart. Clients that accept
+    wire.MEDIA_TYPE get the binary encoding, with the cursor in the
+    X-Drinkmon-Cursor header. Large bodies are gzipped like friend_sessions.
+    Renews any leases listed in the X-Drinkmon-Renew header.
+    """
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    binary = wire.negotiate(request.headers.get("accept", "")) != wire.FORMAT_JSON
+    await _piggybacked_renewal(request, headers)
+    boot_id = sessions.boot_id
+    cursor = _parse_cursor(since, boot_id)
+    changes = None
+    if cursor is not None and cursor <= sessions.version:
+        changes = journal.since(cursor)
+    if changes is None:
+        snapshot = await sessions.snapshot()
+        feed_logger.debug("Friend changes: full snapshot at %d", snapshot["v"])
+        next_cursor = f"{boot_id}-{snapshot['v']}"
+        if binary:
+            headers["X-Drinkmon-Cursor"] = next_cursor
+            entries = [(f["id"], _packed(f["color"])) for f in snapshot["friends"]]
+            return _feed_response(request, wire.encode_friends(entries), wire.MEDIA_TYPE, headers)
+        body = {"cursor": next_cursor, "full": True, "friends": snapshot["friends"]}
+        return _feed_response(request, _json_bytes(body), "application/json", headers)
+    added, removed = changes
+    feed_logger.debug("Friend changes since %d: +%d -%d", cursor, len(added), len(removed))
+    next_cursor = f"{boot_id}-{max(cursor, journal.last)}"
+    if binary:
+        headers["X-Drinkmon-Cursor"] = next_cursor
+        content = wire.encode_changes({i: _packed(c) for i, c in added.items()}, removed)
+        return _feed_response(request, content, wire.MEDIA_TYPE, headers)
+    body = {
+        "cursor": next_cursor,
+        "full": False,
+        "added": [{"id": i, "color": c} for i, c in added.items()],
+        "removed": removed,
+    }
+    return _feed_response(request, _json_bytes(body), "application/json", headers)
+
+@app.get("/api/friend_events")
+async def friend_events(request: Request) -> StreamingResponse:
+    """
+    Stream active-set deltas as Server-Sent Events.
+    Sends a snapshot first, then add/remove events as sessions start and close,
+    and a heartbeat every HEARTBEAT_INTERVAL seconds while idle. A connection
+    that falls behind is resynced with a fresh snapshot.
+    """
+    async def stream():
+        # Subscribing here rather than in the handler means a stream that never
+        # starts (the client went away first) leaves no subscription behind.
+        sub = hub.subscribe()
+        logger.debug("Friend event stream opened. Connections: %d", hub.connection_count)
+        try:
+            current = await sessions.snapshot()
+            yield format_sse("snapshot", current)
+            seen = current["v"]
+            while True:
+                try:
+                    event = await sub.get(HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield format_sse("heartbeat", {"v": sessions.version})
+                    continue
+                if event is RESYNC:
+                    current = await sessions.snapshot()
+                    seen = current["v"]
+                    yield format_sse("snapshot", current)
+                elif event.version > seen:
+                    seen = event.version
+                    yield event.sse()
+        finally:
+            hub.unsubscribe(sub)
+            logger.debug("Friend event stream closed. Connections: %d", hub.connection_count)
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+@app.websocket("/api/friend_ws")
+async def friend_ws(websocket: WebSocket):
+    """
+    Push active-set deltas over a WebSocket.
+    Messages are JSON objects with a "type" of snapshot, add, remove or heartbeat,
+    in the same shape as the SSE stream.
+    """
+    await websocket.accept()
+    sub = hub.subscribe()
+    logger.debug("Friend websocket opened. Connections: %d", hub.connection_count)
+    try:
+        current = await sessions.snapshot()
+        await websocket.send_text(format_ws("snapshot", current))
+        seen = current["v"]
+        while True:
+            try:
+                event = await sub.get(HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await websocket.send_text(format_ws("heartbeat", {"v": sessions.version}))
+                continue
+            if event is RESYNC:
+                current = await sessions.snapshot()
+                seen = current["v"]
+                await websocket.send_text(format_ws("snapshot", current))
+            elif event.version > seen:
+                seen = event.version
+                await websocket.send_text(event.ws())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(sub)
+        logger.debug("Friend websocket closed. Connections: %d", hub.connection_count)
+
+def process_rss_kb() -> int:
+    """
+    Current resident set size of this process in KiB (peak RSS off Linux).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+@app.get("/api/diagnostics")
+async def diagnostics():
+    """
+    Return runtime diagnostics for the session store, streaming hub, rate
+    limiter and process memory.
+    """
+    return {
+        "sessions": await sessions.stats(),
+        "hub": hub.stats(),
+        "rate_limit": limiter.stats(),
+        "memory": {"rss_kb": process_rss_kb()},
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """
+    Return request, session, feed cache and event loop metrics in the
+    Prometheus text format. With several workers each reports its own requests.
+    """
+    stats = await sessions.stats()
+    hits, misses = sessions.feed_cache_stats()
+    samples = {
+        "drinkmon_sessions_active": ("gauge", "Open sessions.", stats["active"]),
+        "drinkmon_sessions_closed": ("gauge", "Closed sessions still retained.", stats["closed"]),
+        "drinkmon_stream_connections": ("gauge", "Open SSE and WebSocket friend streams.", hub.connection_count),
+        "drinkmon_feed_cache_hits_total": ("counter", "Friend feed reads served from the cached body.", hits),
+        "drinkmon_feed_cache_misses_total": ("counter", "Friend feed reads that rebuilt or copied the body.", misses),
+        "drinkmon_feed_cache_hit_ratio": ("gauge", "Share of friend feed reads served from cache.", round(hits / max(hits + misses, 1), 4)),
+        "drinkmon_rate_limited_total": ("counter", "Requests rejected by the rate limiter.", limiter.rejected),
+        "drinkmon_event_loop_lag_last_seconds": ("gauge", "Most recent event loop lag sample.", round(metrics.loop_lag_last, 6)),
+    }
+    return Response(metrics.render(samples), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/api/clear_sessions")
-def clear_sessions():
+async def clear_sessions():
     """
     Clear all active and closed sessions from the server.
     
@@ -138,7 +375,9 @@ def clear_sessions():
         dict: Status message indicating sessions were cleared.
     """
     # Clear all sessions (active and closed)
-    count = len(sessions)
-    sessions.clear()
-    logger.info(f"All sessions cleared. Previous count: {count}")
+    count = await sessions.clear()
+    logger.info("All sessions cleared. Previous count: %d", count)
     return {"status": "sessions cleared", "cleared_count": count}
+
+# Preallocate request metrics for every route defined above
+metrics.add_routes((method, route.path) for route in app.routes for method in getattr(route, "methods", ()))
@@ -0,0 +1,55 @@
+"""
+Friend-session events and their wire encodings for the drinkmon backend.
+Events are delivered to streaming connections (SSE and WebSocket) by the hub.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+HEARTBEAT_INTERVAL = 15.0
+
+class FriendEvent:
+    """
+    A single change to the active set.
+    kind is "add", "remove" or "reset" (everything was cleared).
+    Encoded frames are cached so each event is serialized once, not once per connection.
+    """
+    __slots__ = ("kind", "version", "id", "color", "_sse", "_ws")
+
+    def __init__(self, kind: str, version: int, id: int = 0, color: Optional[Dict[str, int]] = None):
+        self.kind = kind
+        self.version = version
+        self.id = id
+        self.color = color
+        self._sse = None
+        self._ws = None
+
+    def to_dict(self) -> dict:
+        return {"v": self.version, "id": self.id, "color": self.color}
+
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = format_sse(self.kind, self.to_dict())
+        return self._sse
+
+    def ws(self) -> str:
+        if self._ws is None:
+            self._ws = format_ws(self.kind, self.to_dict())
+        return self._ws
+
+def _dumps(data) -> str:
+    return json.dumps(data, separators=(",", ":"))
+
+def format_sse(event: str, data) -> bytes:
+    """
+    Encode one Server-Sent Event frame.
+    """
+    return f"event: {event}\ndata: {_dumps(data)}\n\n".encode()
+
+def format_ws(event: str, data: dict) -> str:
+    """
+    Encode one WebSocket text message; the event name goes in the "type" field.
+    """
+    return _dumps({"type": event, **data})
+
+def snapshot_payload(version: int, friends: List[Tuple[int, Dict[str, int]]]) -> dict:
+    return {"v": version, "friends": [{"id": i, "color": c} for i, c in friends]}
@@ -0,0 +1,110 @@
+"""
+Precomputed friend-sessions feed for the drinkmon backend.
+Holds the read model of the active set (session id -> packed colour), tracks a
+monotonically increasing state version and keeps the serialized
+/api/friend_sessions bodies (JSON and binary) cached until the active set changes.
+"""
+import json
+from typing import Dict, Iterable, List, Tuple
+from uuid import uuid4
+from drinkmon_server import wire
+from drinkmon_server.records import SessionRecord, color_dict
+
+def etag_for(boot_id: str, version: int, fmt: str = wire.FORMAT_JSON) -> str:
+    """
+    ETag of one representation of the feed at a version. Binary
+    representations get their own tags so a cache never mixes them with JSON.
+    """
+    if fmt == wire.FORMAT_JSON:
+        return f'"{boot_id}-{version}"'
+    return f'"{boot_id}-{version}-{fmt}"'
+
+class FriendFeed:
+    def __init__(self):
+        # Boot id keeps ETags from a previous process from matching after a restart.
+        self.boot_id = uuid4().hex[:8]
+        self.version = 0
+        # Only the session writer updates this; readers render from it and never
+        # have to wait on the repository.
+        self._friends = {}
+        self._rendered_version = -1
+        self._bodies: Dict[str, bytes] = {}
+        # Renders answered from the cached body vs. renders that had to build one
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __len__(self) -> int:
+        return len(self._friends)
+
+    def bump(self) -> int:
+        """
+        Mark the active set as changed. Returns the new state version.
+        """
+        self.version += 1
+        return self.version
+
+    def add(self, session: SessionRecord) -> int:
+        self._friends[session.id] = session.rgb
+        return self.bump()
+
+    def remove(self, session: SessionRecord) -> int:
+        self._friends.pop(session.id, None)
+        return self.bump()
+
+    def reset(self, sessions: Iterable[SessionRecord] = ()) -> int:
+        """
+        Replace the whole active set, e.g. after a restore or a clear.
+        """
+        self._friends = {s.id: s.rgb for s in sessions}
+        return self.bump()
+
+    def entries(self) -> List[Tuple[int, int]]:
+        """
+        (id, packed rgb) pairs for the current active set, in start order.
+        """
+        return list(self._friends.items())
+
+    def friends(self) -> List[Tuple[int, dict]]:
+        """
+        (id, colour) pairs for the current active set, in start order.
+        """
+        return [(sid, color_dict(rgb)) for sid, rgb in self._friends.items()]
+
+    def render(self, fmt: str = wire.FORMAT_JSON) -> Tuple[str, bytes]:
+        """
+        Return (etag, body) for the current state in one of the wire formats,
+        building each body only once per version.
+        """
+        if self._rendered_version != self.version:
+            self._bodies = {}
+            self._rendered_version = self.version
+        body = self._bodies.get(fmt)
+        if body is None:
+            body = self._bodies[fmt] = self._encode(fmt)
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return etag_for(self.boot_id, self.version, fmt), body
+
+    def _encode(self, fmt: str) -> bytes:
+        if fmt == wire.FORMAT_JSON:
+            active = [{"color": color_dict(rgb)} for rgb in self._friends.values()]
+            return json.dumps(active, separators=(",", ":")).encode()
+        if fmt == wire.FORMAT_BINARY:
+            return wire.strip_ids(self.render(wire.FORMAT_BINARY_IDS)[1])
+        return wire.encode_friends(self._friends.items())
+
+    @staticmethod
+    def etag_matches(if_none_match: str, etag: str) -> bool:
+        """
+        Check an If-None-Match header value against the current ETag.
+        """
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == etag or tag == "*":
+                return True
+        return False
@@ -0,0 +1,124 @@
+"""
+Asyncio broadcast hub for friend-session events.
+Fans each start/close event out to every streaming connection (SSE or WebSocket)
+through a bounded per-connection queue. A connection that falls behind has its
+backlog dropped and is told to resync from a full snapshot instead of buffering
+without limit.
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Set
+from drinkmon_server.events import FriendEvent
+
+DEFAULT_QUEUE_SIZE = 64
+
+# Returned by Subscription.get() when the connection must resend a full snapshot.
+RESYNC = FriendEvent("resync", 0)
+
+class Subscription:
+    __slots__ = ("loop", "maxsize", "_pending", "_wakeup", "_resync", "overflows")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.maxsize = maxsize
+        self._pending: Deque[FriendEvent] = deque()
+        self._wakeup = asyncio.Event()
+        self._resync = False
+        self.overflows = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def push(self, event: FriendEvent) -> None:
+        # Must run on self.loop
+        if self._resync:
+            # A snapshot is already owed; it will include this change.
+            return
+        if event.kind == "reset" or len(self._pending) >= self.maxsize:
+            if event.kind != "reset":
+                self.overflows += 1
+            self._pending.clear()
+            self._resync = True
+        else:
+            self._pending.append(event)
+        self._wakeup.set()
+
+    async def get(self, timeout: float) -> FriendEvent:
+        """
+        Wait for the next event, or RESYNC if the backlog was coalesced.
+        Raises:
+            asyncio.TimeoutError: If nothing arrives within timeout seconds.
+        """
+        while not self._pending and not self._resync:
+            self._wakeup.clear()
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        if self._resync:
+            self._resync = False
+            return RESYNC
+        return self._pending.popleft()
+
+class BroadcastHub:
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[asyncio.AbstractEventLoop, Set[Subscription]] = {}
+        self.published = 0
+        self._overflows_closed = 0
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self) -> Subscription:
+        """
+        Register a new connection on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        sub = Subscription(loop, self.queue_size)
+        self._subscribers.setdefault(loop, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.loop)
+        if subs is not None:
+            subs.discard(sub)
+            self._overflows_closed += sub.overflows
+            if not subs:
+                del self._subscribers[sub.loop]
+
+    def publish(self, event: FriendEvent) -> None:
+        """
+        Deliver an event to every connection. Safe to call from worker threads;
+        costs one loop wakeup per event loop rather than one per connection.
+        """
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for loop in list(self._subscribers):
+            if loop is running:
+                self._fanout(loop, event)
+            else:
+                loop.call_soon_threadsafe(self._fanout, loop, event)
+
+    def _fanout(self, loop: asyncio.AbstractEventLoop, event: FriendEvent) -> None:
+        for sub in list(self._subscribers.get(loop, ())):
+            sub.push(event)
+
+    def stats(self) -> dict:
+        """
+        Connection count and queue-depth metrics for diagnostics.
+        """
+        depths = [sub.depth for subs in self._subscribers.values() for sub in subs]
+        overflows = self._overflows_closed + sum(
+            sub.overflows for subs in self._subscribers.values() for sub in subs
+        )
+        return {
+            "connections": len(depths),
+            "queue_size": self.queue_size,
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "overflows": overflows,
+            "published": self.published,
+        }
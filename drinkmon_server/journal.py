@@ -0,0 +1,70 @@
+"""
+Bounded change journal behind /api/friend_changes.
+Records the add/remove events of the active set so a device can ask for the
+changes since the version it last saw, instead of downloading the whole list.
+Cursors older than the oldest retained change get a full snapshot instead.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from drinkmon_server.events import FriendEvent
+
+DEFAULT_JOURNAL_SIZE = 1024
+
+class ChangeJournal:
+    def __init__(self, capacity: int = DEFAULT_JOURNAL_SIZE):
+        self.capacity = capacity
+        self._events: "deque[FriendEvent]" = deque()
+        # Every change after floor is retained; older cursors need a snapshot.
+        self.floor = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def last(self) -> int:
+        """
+        Version of the newest recorded change (floor when there is none).
+        """
+        return self._events[-1].version if self._events else self.floor
+
+    def start_at(self, version: int) -> None:
+        """
+        Drop everything and journal from version onwards.
+        """
+        self._events.clear()
+        self.floor = version
+
+    def record(self, event: FriendEvent) -> None:
+        if event.version <= self.last:
+            return
+        if event.kind == "reset":
+            # Nothing before a clear can be replayed as a delta
+            self.start_at(event.version)
+            return
+        if len(self._events) >= self.capacity:
+            self.floor = self._events.popleft().version
+        self._events.append(event)
+
+    def since(self, cursor: int) -> Optional[Tuple[Dict[int, dict], List[int]]]:
+        """
+        Net changes after cursor as (added id -> colour, removed ids), or None
+        if cursor predates the journal and the caller needs a snapshot.
+        A session both added and removed within the range does not appear.
+        """
+        if cursor < self.floor:
+            return None
+        pending = []
+        for event in reversed(self._events):
+            if event.version <= cursor:
+                break
+            pending.append(event)
+        added: Dict[int, dict] = {}
+        removed: List[int] = []
+        for event in reversed(pending):
+            if event.kind == "add":
+                added[event.id] = event.color
+            elif event.id in added:
+                del added[event.id]
+            else:
+                removed.append(event.id)
+        return added, removed
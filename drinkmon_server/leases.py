@@ -0,0 +1,74 @@
+"""
+Session leases for the drinkmon backend.
+Every open session holds a lease that devices renew; a min-heap keyed on expiry
+lets the reaper find expired sessions in O(expired log n) instead of scanning
+every session. The table is only touched from the event loop thread, so it
+takes no locks.
+"""
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Devices renew every 60s by default, so a lease survives four missed renewals.
+DEFAULT_LEASE_SECONDS = 300.0
+
+class LeaseTable:
+    def __init__(self, ttl: float = DEFAULT_LEASE_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._expiry: Dict[str, float] = {}
+        # Renewals push a new entry and leave the old one behind; stale entries
+        # are skipped when popped and purged when they outnumber live leases.
+        self._heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._expiry
+
+    def grant(self, guid: str, ttl: Optional[float] = None) -> float:
+        """
+        Start or extend a lease. Returns the new expiry time.
+        """
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+        self._expiry[guid] = expires
+        heapq.heappush(self._heap, (expires, guid))
+        if len(self._heap) > 2 * len(self._expiry) + 64:
+            self._compact()
+        return expires
+
+    def renew(self, guid: str) -> bool:
+        """
+        Extend an existing lease. Returns False if the GUID holds no lease.
+        """
+        if guid not in self._expiry:
+            return False
+        self.grant(guid)
+        return True
+
+    def revoke(self, guid: str) -> None:
+        self._expiry.pop(guid, None)
+
+    def clear(self) -> None:
+        self._expiry.clear()
+        self._heap.clear()
+
+    def pop_expired(self, now: Optional[float] = None) -> List[str]:
+        """
+        Remove and return every GUID whose lease has run out.
+        """
+        if now is None:
+            now = self._clock()
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires, guid = heapq.heappop(heap)
+            if self._expiry.get(guid) == expires:
+                del self._expiry[guid]
+                expired.append(guid)
+        return expired
+
+    def _compact(self) -> None:
+        self._heap = [(e, g) for g, e in self._expiry.items()]
+        heapq.heapify(self._heap)
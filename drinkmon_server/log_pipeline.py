@@ -0,0 +1,159 @@
+"""
+Non-blocking structured logging for the drinkmon backend.
+Request threads only drop LogRecords onto a bounded in-process queue; a
+background QueueListener thread does the JSON encoding and the console and
+rotating-file writes, so request latency never waits on disk I/O.
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# orjson is optional; fall back to the stdlib encoder when it is not installed.
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+QUEUE_SIZE = 10000
+LOG_FILE = "drinkmon_api.log"
+LOG_MAX_BYTES = 10485760  # 10 MB
+LOG_BACKUP_COUNT = 5
+
+# Custom JSON formatter for structured logs
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        log_record = {
+            # Use the time the record was created, not when the listener gets to it
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).replace(tzinfo=None).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            log_record["exception"] = self.formatException(record.exc_info)
+        return _dumps(log_record)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread and
+    drops records instead of blocking when the queue is full.
+    """
+
+    def __init__(self, q: "queue.Queue"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves this process, so the record does not need to be
+        # made picklable. Exception info is rendered now, while the traceback is live.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _Listener(logging.handlers.QueueListener):
+    """
+    QueueListener whose start and stop can be called repeatedly, so an app
+    can go through several lifespans. Records logged while it is stopped
+    wait in the queue and are written when it starts again.
+    """
+
+    def start(self) -> None:
+        if self._thread is None:
+            super().start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            super().stop()
+
+    def enqueue_sentinel(self) -> None:
+        # Block rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only one of every N records per level, e.g. {"DEBUG": 100}.
+    Levels without a rate always pass. Counting is unlocked, so under
+    concurrency the rate is approximate.
+    """
+
+    def __init__(self, rates: Dict[object, int]):
+        super().__init__()
+        self.rates = {
+            level if isinstance(level, int) else logging.getLevelName(level): n
+            for level, n in rates.items()
+        }
+        self._counts = dict.fromkeys(self.rates, 0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        if not rate or rate <= 1:
+            return True
+        count = self._counts[record.levelno]
+        self._counts[record.levelno] = count + 1
+        return count % rate == 0
+
+def process_log_file(role: Optional[str] = None) -> str:
+    """
+    Log file name for this process. Under drinkmon_server.serve the coordinator
+    and every worker log separately, since RotatingFileHandlers in several
+    processes would rotate the same file out from under each other.
+    """
+    if role is None:
+        return LOG_FILE
+    stem, ext = os.path.splitext(LOG_FILE)
+    if role == "worker":
+        role = f"worker-{os.getpid()}"
+    return f"{stem}.{role}{ext}"
+
+def setup_logging(level: str = "DEBUG", log_file: Optional[str] = LOG_FILE) -> logging.handlers.QueueListener:
+    """
+    Route the "drinkmon" logger (and root) through a LazyQueueHandler and start
+    the listener thread that writes JSON lines to stdout and a rotating file.
+    Returns the started listener; stop it on shutdown to flush.
+    """
+    formatter = JsonFormatter()
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+    handlers = [console]
+    if log_file:
+        rotating = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+        )
+        rotating.setFormatter(formatter)
+        # Only application logs go to the file; library logs stay on the console.
+        rotating.addFilter(logging.Filter("drinkmon"))
+        handlers.append(rotating)
+
+    q: "queue.Queue" = queue.Queue(QUEUE_SIZE)
+    queue_handler = LazyQueueHandler(q)
+    listener = _Listener(q, *handlers, respect_handler_level=True)
+
+    app_logger = logging.getLogger("drinkmon")
+    app_logger.handlers[:] = [queue_handler]
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+    root = logging.getLogger()
+    root.handlers[:] = [LazyQueueHandler(q)]
+    root.setLevel(level)
+
+    listener.start()
+    return listener
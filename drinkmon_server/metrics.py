@@ -0,0 +1,148 @@
+"""
+Prometheus-style metrics for the drinkmon API, served at /metrics.
+Request counters and latency histograms are preallocated per route when the
+app starts, so recording a request is a dict lookup, a bisect and a few
+integer increments. Everything is updated from the event loop only, so plain
+ints are enough and no locks are taken.
+
+Latency is measured to the start of the response (status and headers sent),
+which keeps streaming endpoints from reporting their connection lifetime.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds; a final +Inf bucket is implied.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_INTERVAL = 0.5
+# Label for requests that match no route, so unknown paths cannot grow the label set.
+OTHER_ROUTE = "other"
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        sep = "," if labels else ""
+        lines = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {total}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class RouteStats:
+    __slots__ = ("route", "method", "latency", "statuses")
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.latency = Histogram(LATENCY_BUCKETS)
+        # status code -> count; only a handful of codes per route ever appear
+        self.statuses: Dict[int, int] = {}
+
+class Metrics:
+    def __init__(self):
+        self._other = RouteStats(OTHER_ROUTE, "")
+        self._routes: Dict[Tuple[str, str], RouteStats] = {("", OTHER_ROUTE): self._other}
+        self.loop_lag = Histogram(LOOP_LAG_BUCKETS)
+        self.loop_lag_last = 0.0
+
+    def add_routes(self, routes: Iterable[Tuple[str, str]]) -> None:
+        """
+        Preallocate stats for (method, path) pairs.
+        """
+        for method, path in routes:
+            self._routes.setdefault((method, path), RouteStats(path, method))
+
+    def route(self, method: str, path: str) -> RouteStats:
+        return self._routes.get((method, path), self._other)
+
+    async def monitor_loop_lag(self, interval: float = LOOP_LAG_INTERVAL) -> None:
+        """
+        Sleep for interval over and over and record how late each wake-up is.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag_last = lag
+            self.loop_lag.observe(lag)
+
+    def render(self, samples: Dict[str, Tuple[str, str, float]]) -> str:
+        """
+        Exposition text for everything recorded plus single-value samples
+        (name -> (type, help text, value)) taken by the caller.
+        """
+        lines = [
+            "# HELP drinkmon_requests_total HTTP requests by route, method and status.",
+            "# TYPE drinkmon_requests_total counter",
+        ]
+        routes = [s for s in self._routes.values() if s.latency.count or s.statuses]
+        for s in routes:
+            for status, count in sorted(s.statuses.items()):
+                lines.append(f'drinkmon_requests_total{{route="{s.route}",method="{s.method}",status="{status}"}} {count}')
+        lines += [
+            "# HELP drinkmon_request_duration_seconds Time to the start of the response by route.",
+            "# TYPE drinkmon_request_duration_seconds histogram",
+        ]
+        for s in routes:
+            lines += s.latency.render("drinkmon_request_duration_seconds", f'route="{s.route}",method="{s.method}"')
+        lines += [
+            "# HELP drinkmon_event_loop_lag_seconds Lateness of a periodic event loop wake-up.",
+            "# TYPE drinkmon_event_loop_lag_seconds histogram",
+        ]
+        lines += self.loop_lag.render("drinkmon_event_loop_lag_seconds")
+        for name, (kind, help_text, value) in samples.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that counts HTTP requests and times them per route.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = self.metrics.route(scope["method"], scope["path"])
+        start = time.perf_counter()
+        status: Optional[int] = None
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                stats.latency.observe(time.perf_counter() - start)
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if status is None:
+                # The app failed before responding; the server answers 500
+                stats.latency.observe(time.perf_counter() - start)
+                stats.statuses[500] = stats.statuses.get(500, 0) + 1
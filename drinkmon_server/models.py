@@ -0,0 +1,43 @@
+"""
+Pydantic request and response models of the drinkmon backend API.
+"""
+from typing import Annotated, List
+from pydantic import BaseModel, Field
+
+class Color(BaseModel):
+    r: int = Field(..., ge=0, le=255)
+    g: int = Field(..., ge=0, le=255)
+    b: int = Field(..., ge=0, le=255)
+
+class SessionStartRequest(BaseModel):
+    color: Color
+
+class SessionStartResponse(BaseModel):
+    guid: str
+
+class SessionCloseRequest(BaseModel):
+    guid: str
+
+class SessionRenewRequest(BaseModel):
+    guids: List[str] = Field(..., max_length=256)
+
+class SessionRenewResponse(BaseModel):
+    renewed: int
+    unknown: int
+
+# Largest number of starts, and of closes, a single batch request may carry.
+MAX_BATCH = 1000
+
+class SessionBatchRequest(BaseModel):
+    start: List[SessionStartRequest] = Field(default_factory=list, max_length=MAX_BATCH)
+    close: List[Annotated[str, Field(max_length=64)]] = Field(default_factory=list, max_length=MAX_BATCH)
+    all_or_nothing: bool = False
+
+class SessionCloseResult(BaseModel):
+    guid: str
+    status: str
+
+class SessionBatchResponse(BaseModel):
+    applied: bool
+    started: List[SessionStartResponse]
+    closed: List[SessionCloseResult]
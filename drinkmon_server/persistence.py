@@ -0,0 +1,186 @@
+"""
+Durable append-only session log for the drinkmon backend.
+Start/close/clear events are queued from the request path and written by a
+background thread to a JSON-lines write-ahead log with one fsync per batch.
+The writer periodically compacts the log into a snapshot of the active set,
+and startup replays snapshot + log back into the session store.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from drinkmon_server.records import SessionRecord, pack_rgb, to_epoch
+from drinkmon_server.session_store import SessionRepository
+
+logger = logging.getLogger("drinkmon")
+
+LOG_FILE = "sessions.log"
+SNAPSHOT_FILE = "snapshot.json"
+FLUSH_INTERVAL = 0.05
+COMPACT_EVERY = 10000
+
+_STOP = object()
+
+class SessionLog:
+    def __init__(self, directory: str, flush_interval: float = FLUSH_INTERVAL, compact_every: int = COMPACT_EVERY):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        # Writer-side mirror of the active set, so compaction never touches the live store.
+        self._active: Dict[str, list] = {}
+        self._next_id = 1
+        self._since_compact = 0
+        self.batches = 0
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # Request path: never touches disk
+
+    def append_start(self, session: SessionRecord) -> None:
+        self._queue.put(["start", session.guid, session.id, session.rgb, session.started])
+
+    def append_close(self, guid: str) -> None:
+        self._queue.put(["close", guid])
+
+    def append_batch(self, starts: List[SessionRecord], closes: List[str]) -> None:
+        """
+        Log a batch as one record, so a crash never replays half of it.
+        """
+        recs = [["start", s.guid, s.id, s.rgb, s.started] for s in starts]
+        recs.extend(["close", guid] for guid in closes)
+        self._queue.put(["batch", recs])
+
+    def append_clear(self) -> None:
+        self._queue.put(["clear"])
+
+    # Startup
+
+    def replay(self, store: SessionRepository) -> int:
+        """
+        Load the snapshot and replay the log into store. Safe to run over a log
+        that overlaps the snapshot, since every record is applied idempotently.
+        Returns:
+            int: Number of active sessions restored.
+        """
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snap = json.load(f)
+            self._next_id = snap.get("next_id", 1)
+            for rec in snap.get("active", []):
+                if len(rec) == 5:
+                    self._active[rec[1]] = rec
+                else:
+                    self._apply(rec)
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash
+                        logger.warning("Ignoring unreadable session log record")
+                        break
+                    self._apply(rec)
+        for _, guid, sid, rgb, started in self._active.values():
+            store.restore(SessionRecord(guid, rgb, started, sid))
+        store.reserve_ids(self._next_id)
+        return len(self._active)
+
+    def _apply(self, rec: list) -> None:
+        op = rec[0]
+        if op == "start":
+            if len(rec) == 7:
+                # Older logs stored r, g, b and an ISO start time
+                _, guid, sid, r, g, b, started = rec
+                rec = ["start", guid, sid, pack_rgb(r, g, b), to_epoch(datetime.fromisoformat(started))]
+            self._active[rec[1]] = rec
+            if rec[2] >= self._next_id:
+                self._next_id = rec[2] + 1
+        elif op == "close":
+            self._active.pop(rec[1], None)
+        elif op == "clear":
+            self._active.clear()
+        elif op == "batch":
+            for item in rec[1]:
+                self._apply(item)
+
+    # Writer thread
+
+    def start(self) -> None:
+        self._file = open(self.log_path, "a")
+        self._thread = threading.Thread(target=self._run, name="drinkmon-session-log", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """
+        Flush everything queued so far and stop the writer thread.
+        """
+        if self._thread:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            rec = self._queue.get()
+            batch = []
+            while True:
+                if rec is _STOP:
+                    stopping = True
+                    break
+                batch.append(rec)
+                try:
+                    rec = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception:
+                    logger.exception("Session log write failed")
+            if not stopping:
+                # Bound the fsync rate; anything arriving meanwhile joins the next batch.
+                time.sleep(self.flush_interval)
+
+    def _write_batch(self, batch: list) -> None:
+        lines = []
+        for rec in batch:
+            self._apply(rec)
+            lines.append(json.dumps(rec, separators=(",", ":")))
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.batches += 1
+        self.records += len(batch)
+        self._since_compact += len(batch)
+        if self._since_compact >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Write the active set to a new snapshot and truncate the log.
+        """
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"next_id": self._next_id, "active": list(self._active.values())}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        if self._file:
+            self._file.close()
+        self._file = open(self.log_path, "w")
+        self._since_compact = 0
+        logger.info("Session log compacted. Active: %d", len(self._active))
@@ -0,0 +1,132 @@
+"""
+Per-client, per-endpoint admission control for the drinkmon API.
+Each (client address, endpoint) pair gets a token bucket that refills at the
+endpoint's rate up to its burst size; a request that finds the bucket empty is
+answered with 429 and a Retry-After header without reaching the handler.
+
+Buckets live in an OrderedDict in least-recently-used order, so a check, the
+refill and evicting buckets that have been idle long enough to be full again
+are all O(1) (eviction amortized). Only the event loop touches them.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+# path -> (tokens per second, burst). Paths not listed are not limited.
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "/api/start_session": (0.5, 20),
+    "/api/close_session": (0.5, 20),
+    "/api/batch_sessions": (0.2, 10),
+    "/api/renew": (1.0, 20),
+    "/api/friend_sessions": (2.0, 30),
+    "/api/friend_changes": (2.0, 30),
+    "/api/friend_events": (0.2, 5),
+    "/api/friend_ws": (0.2, 5),
+    "/api/clear_sessions": (0.1, 2),
+}
+DEFAULT_MAX_BUCKETS = 100_000
+
+class RateLimiter:
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]] = DEFAULT_LIMITS,
+        max_buckets: int = DEFAULT_MAX_BUCKETS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limits = dict(limits)
+        self.max_buckets = max_buckets
+        self.clock = clock
+        # (client, path) -> [tokens, last update], oldest update first
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _idle_seconds(self, path: str) -> float:
+        # Long enough for the bucket to refill completely; after that it is
+        # indistinguishable from a new one and can be dropped.
+        rate, burst = self.limits[path]
+        return burst / rate
+
+    def check(self, client: str, path: str) -> float:
+        """
+        Take a token for one request. Returns 0 if the request is admitted,
+        otherwise the seconds until a token will be available.
+        """
+        limit = self.limits.get(path)
+        if limit is None:
+            return 0.0
+        rate, burst = limit
+        now = self.clock()
+        buckets = self._buckets
+        key = (client, path)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [burst, now]
+            self._evict(now)
+        else:
+            buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return (1 - bucket[0]) / rate
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        while buckets:
+            (client, path), (_, last) = next(iter(buckets.items()))
+            if len(buckets) <= self.max_buckets and now - last < self._idle_seconds(path):
+                return
+            buckets.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+        }
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that applies a RateLimiter before routing. HTTP requests
+    over the limit get a 429 JSON response, WebSocket handshakes a close with
+    code 1013 (try again later).
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        retry = self.limiter.check(client[0] if client else "", scope["path"])
+        if not retry:
+            return await self.app(scope, receive, send)
+        if scope["type"] == "websocket":
+            await receive()  # websocket.connect
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
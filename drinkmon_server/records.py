@@ -0,0 +1,51 @@
+"""
+Compact session records for the drinkmon backend's storage layer.
+Stores hold slotted SessionRecord objects with the colour packed into one
+24-bit int and timestamps as epoch seconds; pydantic models are only used
+at the API boundary.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+
+class SessionRecord:
+    """
+    One session. closed is 0 while the session is open.
+    """
+    __slots__ = ("guid", "id", "rgb", "started", "closed")
+
+    def __init__(self, guid: str, rgb: int, started: int, id: int = 0, closed: int = 0):
+        self.guid = guid
+        self.id = id
+        self.rgb = rgb
+        self.started = started
+        self.closed = closed
+
+    def __repr__(self) -> str:
+        return f"SessionRecord(guid={self.guid!r}, id={self.id}, rgb=0x{self.rgb:06x}, started={self.started}, closed={self.closed})"
+
+def pack_rgb(r: int, g: int, b: int) -> int:
+    return (r << 16) | (g << 8) | b
+
+def unpack_rgb(rgb: int) -> Tuple[int, int, int]:
+    return rgb >> 16, (rgb >> 8) & 0xFF, rgb & 0xFF
+
+def color_dict(rgb: int) -> Dict[str, int]:
+    return {"r": rgb >> 16, "g": (rgb >> 8) & 0xFF, "b": rgb & 0xFF}
+
+def now_epoch() -> int:
+    return int(time.time())
+
+def to_epoch(when: datetime) -> int:
+    """
+    Convert a naive UTC datetime to epoch seconds.
+    """
+    return int((when - _EPOCH).total_seconds())
+
+def from_epoch(ts: int) -> datetime:
+    """
+    Convert epoch seconds to a naive UTC datetime.
+    """
+    return _EPOCH + timedelta(seconds=ts)
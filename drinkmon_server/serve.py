@@ -0,0 +1,71 @@
+"""
+Multi-worker launcher for the drinkmon backend.
+Starts the session coordinator in its own process, then uvicorn with N workers
+that share its session state. With --workers 1 (the default) the API runs on
+its own, exactly as under plain uvicorn.
+
+Usage:
+    python -m drinkmon_server.serve --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uvicorn
+from drinkmon_server import config, coordinator
+
+APP = "drinkmon_server.drinkmon_api:app"
+
+def start_coordinator(socket_path: str, shm_name: str) -> multiprocessing.Process:
+    proc = multiprocessing.Process(
+        target=coordinator.run,
+        args=(socket_path, shm_name, config.FEED_SHM_SIZE),
+        name="drinkmon-coordinator",
+    )
+    proc.start()
+    deadline = time.time() + 30
+    while not os.path.exists(socket_path):
+        if not proc.is_alive() or time.time() > deadline:
+            proc.kill()
+            raise RuntimeError("session coordinator did not start")
+        time.sleep(0.05)
+    return proc
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument(
+        "--timeout-keep-alive", type=int, default=config.KEEPALIVE_TIMEOUT,
+        help="seconds to keep idle connections open (uvicorn's own default is 5)",
+    )
+    args = parser.parse_args()
+    options = dict(
+        host=args.host, port=args.port, log_level=args.log_level, backlog=args.backlog,
+        timeout_keep_alive=args.timeout_keep_alive,
+    )
+
+    if args.workers <= 1:
+        uvicorn.run(APP, **options)
+        return
+    runtime = tempfile.mkdtemp(prefix="drinkmon-")
+    socket_path = os.path.join(runtime, "coordinator.sock")
+    shm_name = f"drinkmon-feed-{os.getpid()}"
+    proc = start_coordinator(socket_path, shm_name)
+    # Workers read these through drinkmon_server.config when they import the app.
+    os.environ["DRINKMON_COORDINATOR"] = socket_path
+    os.environ["DRINKMON_FEED_SHM"] = shm_name
+    try:
+        uvicorn.run(APP, workers=args.workers, **options)
+    finally:
+        proc.terminate()
+        proc.join(timeout=10)
+        shutil.rmtree(runtime, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Session service for the drinkmon backend.
+Owns the write side of session state (repository, leases, write-ahead log) and
+the friend feed read model, and hands every change to its listeners as a
+FriendEvent. A single-process server runs one in the API process; in
+multi-worker mode the coordinator runs the only one.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from uuid import uuid4
+from drinkmon_server import config, wire
+from drinkmon_server.events import FriendEvent, snapshot_payload
+from drinkmon_server.feed import FriendFeed
+from drinkmon_server.leases import LeaseTable
+from drinkmon_server.persistence import SessionLog
+from drinkmon_server.records import SessionRecord, color_dict, now_epoch
+from drinkmon_server.session_store import (
+    SessionAlreadyClosed,
+    SessionNotFound,
+    SessionRepository,
+    SessionStore,
+)
+from drinkmon_server.sqlite_store import SQLiteSessionRepository
+from drinkmon_server.writer import SessionWriter
+
+logger = logging.getLogger("drinkmon")
+
+def make_repository() -> SessionRepository:
+    """
+    Build the session repository selected by DRINKMON_STORE.
+    """
+    if config.STORE_BACKEND == "sqlite":
+        return SQLiteSessionRepository(config.SQLITE_PATH)
+    if config.STORE_BACKEND != "memory":
+        raise ValueError(f"Unknown DRINKMON_STORE backend: {config.STORE_BACKEND}")
+    return SessionStore(config.CLOSED_RETENTION_COUNT, config.CLOSED_RETENTION_SECONDS)
+
+# Per-item close results of a batch
+CLOSED, NOT_FOUND, ALREADY_CLOSED, SKIPPED = "closed", "not_found", "already_closed", "skipped"
+BATCH_STATUSES = (CLOSED, NOT_FOUND, ALREADY_CLOSED, SKIPPED)
+
+def batch_status(outcome, applied: bool) -> str:
+    if isinstance(outcome, SessionNotFound):
+        return NOT_FOUND
+    if isinstance(outcome, SessionAlreadyClosed):
+        return ALREADY_CLOSED
+    # Valid closes in a rejected all-or-nothing batch were not applied
+    return CLOSED if applied else SKIPPED
+
+class SessionService:
+    def __init__(self, store: SessionRepository, leases: LeaseTable, session_log: Optional[SessionLog] = None):
+        self.store = store
+        self.leases = leases
+        self.session_log = session_log
+        self.writer = SessionWriter(store)
+        self.feed = FriendFeed()
+        self.listeners: List[Callable[[FriendEvent], None]] = []
+        self._reaper: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls) -> "SessionService":
+        store = make_repository()
+        # SQLite is durable on its own; the write-ahead log only backs the in-memory store.
+        log = SessionLog(config.DATA_DIR) if config.DATA_DIR and isinstance(store, SessionStore) else None
+        return cls(store, LeaseTable(config.LEASE_SECONDS), log)
+
+    @property
+    def version(self) -> int:
+        return self.feed.version
+
+    @property
+    def boot_id(self) -> str:
+        return self.feed.boot_id
+
+    async def open(self, reap_interval: Optional[float] = config.REAP_INTERVAL) -> None:
+        """
+        Replay the write-ahead log, lease and publish every active session and
+        start the lease reaper (unless reap_interval is None).
+        """
+        if self.session_log:
+            started = datetime.utcnow()
+            restored = self.session_log.replay(self.store)
+            self.session_log.start()
+            elapsed_ms = (datetime.utcnow() - started).total_seconds() * 1000
+            logger.info(
+                "Restored %d active sessions from %s in %.1fms",
+                restored, self.session_log.directory, elapsed_ms,
+            )
+        # Sessions that survived a restart get a fresh lease and seed the feed
+        active = list(self.store.active())
+        self.feed.reset(active)
+        for session in active:
+            self.leases.grant(session.guid)
+        if reap_interval is not None:
+            self._reaper = asyncio.create_task(self._run_reaper(reap_interval))
+
+    async def shutdown(self) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+        if self.session_log:
+            self.session_log.close()
+        self.writer.close()
+        self.store.close_storage()
+
+    def _emit(self, event: FriendEvent) -> None:
+        for listener in self.listeners:
+            listener(event)
+
+    async def start(self, rgb: int) -> SessionRecord:
+        """
+        Store a new active session with a fresh GUID and lease.
+        """
+        session = SessionRecord(str(uuid4()), rgb, now_epoch())
+        await self.writer.submit(self.store.add, session)
+        self.leases.grant(session.guid)
+        if self.session_log:
+            self.session_log.append_start(session)
+        self._emit(FriendEvent("add", self.feed.add(session), session.id, color_dict(session.rgb)))
+        return session
+
+    async def close(self, guid: str) -> SessionRecord:
+        """
+        Close a session and propagate it to the log, feed and listeners.
+        Raises SessionNotFound / SessionAlreadyClosed from the store.
+        """
+        session = await self.writer.submit(self.store.close, guid, now_epoch())
+        self.leases.revoke(guid)
+        if self.session_log:
+            self.session_log.append_close(guid)
+        self._emit(FriendEvent("remove", self.feed.remove(session), session.id, color_dict(session.rgb)))
+        return session
+
+    async def batch(self, rgbs: List[int], guids: List[str],
+                    all_or_nothing: bool = False) -> Tuple[List[SessionRecord], List[str], bool]:
+        """
+        Start a session per colour and close every GUID as one unit: a single
+        writer step, one write-ahead log record and (for SQLite) one transaction.
+        Returns:
+            Tuple: (started sessions, close status per GUID, whether the batch was applied).
+        """
+        now = now_epoch()
+        starts = [SessionRecord(str(uuid4()), rgb, now) for rgb in rgbs]
+        outcomes, applied = await self.writer.submit(self.store.apply_batch, starts, guids, now, all_or_nothing)
+        statuses = [batch_status(o, applied) for o in outcomes]
+        if not applied:
+            return [], statuses, False
+        closed = [o for o in outcomes if isinstance(o, SessionRecord)]
+        if self.session_log:
+            self.session_log.append_batch(starts, [s.guid for s in closed])
+        for session in starts:
+            self.leases.grant(session.guid)
+            self._emit(FriendEvent("add", self.feed.add(session), session.id, color_dict(session.rgb)))
+        for session in closed:
+            self.leases.revoke(session.guid)
+            self._emit(FriendEvent("remove", self.feed.remove(session), session.id, color_dict(session.rgb)))
+        return starts, statuses, True
+
+    async def renew(self, guids: List[str]) -> int:
+        return sum(1 for guid in guids if self.leases.renew(guid))
+
+    async def clear(self) -> int:
+        """
+        Drop all active and closed sessions. Returns the previous count.
+        """
+        count = await self.writer.submit(self.store.clear)
+        self.leases.clear()
+        if self.session_log:
+            self.session_log.append_clear()
+        self._emit(FriendEvent("reset", self.feed.reset()))
+        return count
+
+    async def reap_once(self) -> int:
+        """
+        Close every session whose lease has run out. Only expired leases are
+        touched, and reaped sessions reach the friend feed as ordinary closes.
+        Returns:
+            int: Number of sessions reaped.
+        """
+        reaped = 0
+        for guid in self.leases.pop_expired():
+            try:
+                await self.close(guid)
+            except (SessionNotFound, SessionAlreadyClosed):
+                continue
+            reaped += 1
+            logger.info("Session expired: guid=%s", guid)
+        return reaped
+
+    async def _run_reaper(self, interval: float) -> None:
+        """
+        Run reap_once every interval seconds and apply the closed-session retention policy.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.reap_once()
+            await self.writer.submit(self.store.prune, now_epoch())
+
+    async def render(self, fmt: str = wire.FORMAT_JSON) -> Tuple[str, bytes]:
+        return self.feed.render(fmt)
+
+    def feed_cache_stats(self) -> Tuple[int, int]:
+        """
+        (hits, misses) of the rendered feed body cache.
+        """
+        return self.feed.cache_hits, self.feed.cache_misses
+
+    async def snapshot(self) -> dict:
+        return snapshot_payload(self.feed.version, self.feed.friends())
+
+    async def stats(self) -> dict:
+        sessions = await self.writer.submit(self.store.memory_stats)
+        sessions["leased"] = len(self.leases)
+        sessions["writes"] = self.writer.writes
+        return sessions
@@ -0,0 +1,323 @@
+"""
+Session storage for the drinkmon backend.
+Defines the SessionRepository interface every backend implements, and the default
+in-memory SessionStore. The in-memory store keeps open sessions in a dedicated
+active index next to a bounded closed-session history, so start/close are O(1),
+friend polls cost O(active), and memory stays flat no matter how long it runs.
+"""
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from drinkmon_server.records import SessionRecord
+
+DEFAULT_CLOSED_RETENTION_COUNT = 10000
+DEFAULT_CLOSED_RETENTION_SECONDS = 86400.0
+
+class SessionNotFound(KeyError):
+    """Raised when a GUID is unknown to the store."""
+
+class SessionAlreadyClosed(ValueError):
+    """Raised when closing a session that has already been closed."""
+
+class SessionRepository(ABC):
+    """
+    Storage interface used by the API for all session reads and writes.
+    """
+
+    @property
+    @abstractmethod
+    def active_count(self) -> int: ...
+
+    @property
+    @abstractmethod
+    def closed_count(self) -> int: ...
+
+    def __len__(self) -> int:
+        return self.active_count + self.closed_count
+
+    @abstractmethod
+    def add(self, session: SessionRecord) -> None:
+        """
+        Store a new open session and assign its public id.
+        """
+
+    @abstractmethod
+    def restore(self, session: SessionRecord) -> None:
+        """
+        Re-insert a recovered open session, keeping its existing public id.
+        """
+
+    @abstractmethod
+    def reserve_ids(self, next_id: int) -> None:
+        """
+        Make sure future public ids start at next_id or later.
+        """
+
+    @abstractmethod
+    def get(self, guid: str) -> Optional[SessionRecord]:
+        """
+        Look up a session by GUID, open or closed.
+        """
+
+    @abstractmethod
+    def close(self, guid: str, when: int) -> SessionRecord:
+        """
+        Mark an open session closed at when (epoch seconds) and return it.
+        Raises:
+            SessionNotFound: If the GUID was never seen.
+            SessionAlreadyClosed: If the session is already closed.
+        """
+
+    def check_close(self, guid: str) -> Optional[Exception]:
+        """
+        Return the error close(guid) would raise right now, or None if it would succeed.
+        """
+        session = self.get(guid)
+        if session is None:
+            return SessionNotFound(guid)
+        if session.closed:
+            return SessionAlreadyClosed(guid)
+        return None
+
+    def apply_batch(self, starts: List[SessionRecord], closes: List[str], when: int,
+                    all_or_nothing: bool = False) -> Tuple[List[Union[SessionRecord, Exception]], bool]:
+        """
+        Add every session in starts and close every GUID in closes as one unit.
+        Close failures are returned in place of the closed record instead of
+        being raised; with all_or_nothing, any failure leaves the store untouched.
+        Returns:
+            Tuple: (close outcomes in request order, whether the batch was applied).
+        """
+        outcomes: List[Optional[Union[SessionRecord, Exception]]] = []
+        seen = set()
+        for guid in closes:
+            error = self.check_close(guid)
+            if error is None and guid in seen:
+                error = SessionAlreadyClosed(guid)
+            seen.add(guid)
+            outcomes.append(error)
+        if all_or_nothing and any(o is not None for o in outcomes):
+            return outcomes, False
+        for session in starts:
+            self.add(session)
+        for i, guid in enumerate(closes):
+            if outcomes[i] is None:
+                outcomes[i] = self.close(guid, when)
+        return outcomes, True
+
+    @abstractmethod
+    def active(self) -> Iterable[SessionRecord]:
+        """
+        Return the currently open sessions.
+        """
+
+    @abstractmethod
+    def clear(self) -> int:
+        """
+        Drop all active and closed sessions. Returns the number removed.
+        """
+
+    def prune(self, now: int) -> int:
+        """
+        Evict closed sessions that fall outside the retention policy as of now (epoch seconds).
+        Returns the number evicted; backends without retention return 0.
+        """
+        return 0
+
+    def memory_stats(self) -> dict:
+        """
+        Footprint figures for the diagnostics endpoint.
+        """
+        return {"active": self.active_count, "closed": self.closed_count}
+
+    def close_storage(self) -> None:
+        """
+        Release any underlying resources. No-op for in-memory backends.
+        """
+
+class ClosedHistory:
+    """
+    Fixed-capacity ring buffer of closed sessions, stored as parallel array
+    columns instead of one record object per session. The oldest entry is
+    evicted when the buffer is full or when it is older than max_age seconds.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CLOSED_RETENTION_COUNT,
+                 max_age: float = DEFAULT_CLOSED_RETENTION_SECONDS):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.max_age = max_age
+        self._guids: List[Optional[str]] = [None] * capacity
+        self._ids = array("q", [0]) * capacity
+        self._rgb = array("I", [0]) * capacity
+        self._started = array("q", [0]) * capacity
+        self._closed = array("q", [0]) * capacity
+        self._index: Dict[str, int] = {}
+        self._head = 0
+        self._len = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._index
+
+    def append(self, session: SessionRecord) -> None:
+        if self._len == self.capacity:
+            self._evict_oldest()
+        slot = (self._head + self._len) % self.capacity
+        closed = session.closed
+        self._guids[slot] = session.guid
+        self._ids[slot] = session.id
+        self._rgb[slot] = session.rgb
+        self._started[slot] = session.started
+        self._closed[slot] = closed
+        self._index[session.guid] = slot
+        self._len += 1
+        self._prune_before(closed - self.max_age)
+
+    def get(self, guid: str) -> Optional[SessionRecord]:
+        slot = self._index.get(guid)
+        if slot is None:
+            return None
+        return SessionRecord(guid, self._rgb[slot], self._started[slot], self._ids[slot], self._closed[slot])
+
+    def prune(self, now: int) -> int:
+        return self._prune_before(now - self.max_age)
+
+    def _prune_before(self, cutoff: float) -> int:
+        # Entries are appended in close order, so expired ones sit at the head.
+        evicted = 0
+        while self._len and self._closed[self._head] < cutoff:
+            self._evict_oldest()
+            evicted += 1
+        return evicted
+
+    def _evict_oldest(self) -> None:
+        head = self._head
+        del self._index[self._guids[head]]
+        self._guids[head] = None
+        self._head = (head + 1) % self.capacity
+        self._len -= 1
+        self.evicted += 1
+
+    def clear(self) -> None:
+        self._guids = [None] * self.capacity
+        self._index.clear()
+        self._head = 0
+        self._len = 0
+
+    def nbytes(self) -> int:
+        """
+        Approximate bytes held by the history: columns, index and GUID strings.
+        """
+        columns = sum(a.itemsize * len(a) for a in (self._ids, self._rgb, self._started, self._closed))
+        guids = sys.getsizeof(self._guids) + sum(sys.getsizeof(g) for g in self._index)
+        return columns + guids + sys.getsizeof(self._index)
+
+class SessionStore(SessionRepository):
+    """
+    Default in-memory repository.
+    """
+
+    def __init__(self, closed_retention_count: int = DEFAULT_CLOSED_RETENTION_COUNT,
+                 closed_retention_seconds: float = DEFAULT_CLOSED_RETENTION_SECONDS):
+        self._active: Dict[str, SessionRecord] = {}
+        self._closed = ClosedHistory(closed_retention_count, closed_retention_seconds)
+        # Public friend ids are never reused, even across clear().
+        self._next_id = 1
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    @property
+    def closed_count(self) -> int:
+        return len(self._closed)
+
+    def add(self, session: SessionRecord) -> None:
+        """
+        Register a new open session in the active index and assign its public id.
+        """
+        session.id = self._next_id
+        self._next_id += 1
+        self._active[session.guid] = session
+
+    def restore(self, session: SessionRecord) -> None:
+        """
+        Re-insert a recovered open session, keeping its existing public id.
+        """
+        self._active[session.guid] = session
+        if session.id >= self._next_id:
+            self._next_id = session.id + 1
+
+    def reserve_ids(self, next_id: int) -> None:
+        """
+        Make sure future public ids start at next_id or later.
+        """
+        self._next_id = max(self._next_id, next_id)
+
+    def get(self, guid: str) -> Optional[SessionRecord]:
+        """
+        Look up a session by GUID, open or closed.
+        """
+        session = self._active.get(guid)
+        if session is None:
+            session = self._closed.get(guid)
+        return session
+
+    def check_close(self, guid: str) -> Optional[Exception]:
+        if guid in self._active:
+            return None
+        if guid in self._closed:
+            return SessionAlreadyClosed(guid)
+        return SessionNotFound(guid)
+
+    def close(self, guid: str, when: int) -> SessionRecord:
+        """
+        Close an open session and move it from the active index to the history.
+        Raises:
+            SessionNotFound: If the GUID is unknown or has aged out of the history.
+            SessionAlreadyClosed: If the session is already closed.
+        """
+        session = self._active.pop(guid, None)
+        if session is None:
+            if guid in self._closed:
+                raise SessionAlreadyClosed(guid)
+            raise SessionNotFound(guid)
+        session.closed = when
+        self._closed.append(session)
+        return session
+
+    def active(self) -> Iterable[SessionRecord]:
+        """
+        Return a view of the currently open sessions.
+        """
+        return self._active.values()
+
+    def clear(self) -> int:
+        """
+        Drop all active and closed sessions.
+        Returns:
+            int: Number of sessions removed.
+        """
+        count = len(self)
+        self._active.clear()
+        self._closed.clear()
+        return count
+
+    def prune(self, now: int) -> int:
+        return self._closed.prune(now)
+
+    def memory_stats(self) -> dict:
+        return {
+            "active": self.active_count,
+            "closed": self.closed_count,
+            "closed_capacity": self._closed.capacity,
+            "closed_max_age_s": self._closed.max_age,
+            "closed_evicted": self._closed.evicted,
+            "closed_history_bytes": self._closed.nbytes(),
+        }
@@ -0,0 +1,153 @@
+"""
+SQLite-backed session repository for the drinkmon backend.
+Runs in WAL mode with a partial index on open sessions (closed IS NULL) and an
+index on the start time, so active-set queries stay cheap as history grows.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+from drinkmon_server.records import SessionRecord, from_epoch, pack_rgb, to_epoch, unpack_rgb
+from drinkmon_server.session_store import SessionAlreadyClosed, SessionNotFound, SessionRepository
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    guid TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    r INTEGER NOT NULL,
+    g INTEGER NOT NULL,
+    b INTEGER NOT NULL,
+    started TEXT NOT NULL,
+    closed TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_open ON sessions(id) WHERE closed IS NULL;
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started);
+"""
+
+_COLUMNS = "guid, id, r, g, b, started, closed"
+
+def _row_to_record(row) -> SessionRecord:
+    guid, sid, r, g, b, started, closed = row
+    return SessionRecord(
+        guid,
+        pack_rgb(r, g, b),
+        to_epoch(datetime.fromisoformat(started)),
+        sid,
+        to_epoch(datetime.fromisoformat(closed)) if closed else 0,
+    )
+
+class SQLiteSessionRepository(SessionRepository):
+    def __init__(self, path: str):
+        self.path = path
+        # Writes come from the session writer thread; startup and tests may read
+        # from others, so the one connection stays behind a lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            row = self._conn.execute("SELECT MAX(id) FROM sessions").fetchone()
+        self._next_id = (row[0] or 0) + 1
+
+    def _count(self, where: str) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM sessions WHERE {where}").fetchone()[0]
+
+    @property
+    def active_count(self) -> int:
+        return self._count("closed IS NULL")
+
+    @property
+    def closed_count(self) -> int:
+        return self._count("closed IS NOT NULL")
+
+    def _insert(self, session: SessionRecord) -> None:
+        r, g, b = unpack_rgb(session.rgb)
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, NULL)",
+            (session.guid, session.id, r, g, b, from_epoch(session.started).isoformat()),
+        )
+
+    def add(self, session: SessionRecord) -> None:
+        with self._lock:
+            session.id = self._next_id
+            self._next_id += 1
+            self._insert(session)
+
+    def restore(self, session: SessionRecord) -> None:
+        with self._lock:
+            self._insert(session)
+            self._next_id = max(self._next_id, session.id + 1)
+
+    def reserve_ids(self, next_id: int) -> None:
+        with self._lock:
+            self._next_id = max(self._next_id, next_id)
+
+    def _get(self, guid: str) -> Optional[SessionRecord]:
+        row = self._conn.execute(f"SELECT {_COLUMNS} FROM sessions WHERE guid = ?", (guid,)).fetchone()
+        return _row_to_record(row) if row else None
+
+    def get(self, guid: str) -> Optional[SessionRecord]:
+        with self._lock:
+            return self._get(guid)
+
+    def _close(self, guid: str, stamp: str) -> SessionRecord:
+        cur = self._conn.execute(
+            "UPDATE sessions SET closed = ? WHERE guid = ? AND closed IS NULL", (stamp, guid)
+        )
+        if cur.rowcount == 0:
+            exists = self._conn.execute("SELECT 1 FROM sessions WHERE guid = ?", (guid,)).fetchone()
+            if exists:
+                raise SessionAlreadyClosed(guid)
+            raise SessionNotFound(guid)
+        return self._get(guid)
+
+    def close(self, guid: str, when: int) -> SessionRecord:
+        with self._lock:
+            return self._close(guid, from_epoch(when).isoformat())
+
+    def apply_batch(self, starts: List[SessionRecord], closes: List[str], when: int,
+                    all_or_nothing: bool = False) -> Tuple[List[Union[SessionRecord, Exception]], bool]:
+        """
+        Same contract as SessionRepository.apply_batch, in a single transaction.
+        """
+        stamp = from_epoch(when).isoformat()
+        next_id = self._next_id
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                outcomes: List[Union[SessionRecord, Exception]] = []
+                for guid in closes:
+                    try:
+                        outcomes.append(self._close(guid, stamp))
+                    except (SessionNotFound, SessionAlreadyClosed) as e:
+                        outcomes.append(e)
+                if all_or_nothing and any(isinstance(o, Exception) for o in outcomes):
+                    self._conn.execute("ROLLBACK")
+                    return outcomes, False
+                for session in starts:
+                    session.id = self._next_id
+                    self._next_id += 1
+                    self._insert(session)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._next_id = next_id
+                raise
+        return outcomes, True
+
+    def active(self) -> List[SessionRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM sessions WHERE closed IS NULL ORDER BY id"
+            ).fetchall()
+        return [_row_to_record(row) for row in rows]
+
+    def clear(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions").rowcount
+
+    def close_storage(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,159 @@
+"""
+Unit tests for the multi-worker session coordinator.
+Covers the shared feed seqlock and a client talking to a coordinator over a unix socket.
+"""
+
+import asyncio
+import json
+import os
+import pytest
+from uuid import uuid4
+from drinkmon_server import wire
+from drinkmon_server.coordinator import CoordinatorClient, CoordinatorServer, SharedFeed
+from drinkmon_server.leases import LeaseTable
+from drinkmon_server.records import pack_rgb
+from drinkmon_server.session_store import SessionAlreadyClosed, SessionNotFound, SessionStore
+from drinkmon_server.service import SessionService
+
+def test_shared_feed_publish_and_read():
+    name = f"drinkmon-test-{uuid4().hex[:8]}"
+    owner = SharedFeed.create(name, 4096)
+    reader = SharedFeed.attach(name)
+    try:
+        owner.publish(3, "abcd1234", b'[{"color":{"r":1,"g":2,"b":3}}]', b"\x01bin")
+        assert reader.read() == (3, "abcd1234", (b'[{"color":{"r":1,"g":2,"b":3}}]', b"\x01bin"))
+        # Unchanged sequence is served from the reader's copy
+        assert reader.read() is reader.read()
+        assert not owner.publish(4, "abcd1234", b"x" * 4000, b"y" * 1000)
+        assert reader.read() == (4, "abcd1234", None)
+    finally:
+        reader.close()
+        owner.close()
+
+def test_client_round_trip(tmp_path):
+    path = str(tmp_path / "coord.sock")
+    name = f"drinkmon-test-{uuid4().hex[:8]}"
+
+    async def go():
+        service = SessionService(SessionStore(), LeaseTable())
+        shared = SharedFeed.create(name, 65536)
+        server = CoordinatorServer(service, shared)
+        await service.open(reap_interval=None)
+        await server.start(path)
+        client = CoordinatorClient(path, name)
+        events = []
+        client.listeners.append(events.append)
+        await client.open()
+        try:
+            session = await client.start(pack_rgb(10, 20, 30))
+            assert session.id == 1 and len(session.guid) == 36
+            etag, body = await client.render()
+            assert body == b'[{"color":{"r":10,"g":20,"b":30}}]'
+            assert etag == f'"{service.feed.boot_id}-{service.version}"'
+            assert await client.render(wire.FORMAT_BINARY_IDS) == service.feed.render(wire.FORMAT_BINARY_IDS)
+            assert await client.render(wire.FORMAT_BINARY) == service.feed.render(wire.FORMAT_BINARY)
+            snapshot = await client.snapshot()
+            assert snapshot["friends"] == [{"id": 1, "color": {"r": 10, "g": 20, "b": 30}}]
+            assert await client.renew([session.guid, "nope"]) == 1
+            await client.close(session.guid)
+            with pytest.raises(SessionAlreadyClosed):
+                await client.close(session.guid)
+            with pytest.raises(SessionNotFound):
+                await client.close("nope")
+            assert (await client.render())[1] == b"[]"
+            started, statuses, applied = await client.batch(
+                [pack_rgb(1, 1, 1), pack_rgb(2, 2, 2)], [session.guid, "nope"]
+            )
+            assert applied and [s.id for s in started] == [2, 3]
+            assert statuses == ["already_closed", "not_found"]
+            assert (await client.snapshot())["friends"][1] == {"id": 3, "color": {"r": 2, "g": 2, "b": 2}}
+            assert (await client.stats())["workers"] == 1
+            for _ in range(100):
+                if len(events) == 4:
+                    break
+                await asyncio.sleep(0.01)
+            assert [(e.kind, e.id) for e in events] == [("add", 1), ("remove", 1), ("add", 2), ("add", 3)]
+        finally:
+            await client.shutdown()
+            await server.stop()
+            await service.shutdown()
+            shared.close()
+
+    asyncio.run(go())
+    assert not os.path.exists(f"/dev/shm/{name}")
+
+def test_cancelled_call_does_not_shift_replies(tmp_path):
+    path = str(tmp_path / "coord.sock")
+    name = f"drinkmon-test-{uuid4().hex[:8]}"
+
+    async def go():
+        service = SessionService(SessionStore(), LeaseTable())
+        shared = SharedFeed.create(name, 65536)
+        server = CoordinatorServer(service, shared)
+        await service.open(reap_interval=None)
+        await server.start(path)
+        client = CoordinatorClient(path, name)
+        await client.open()
+        try:
+            await client.start(pack_rgb(1, 2, 3))
+            # Cancel once the request is on the wire but before the reply is read,
+            # as Starlette does to an SSE generator when the client goes away.
+            snapshot = asyncio.ensure_future(client.snapshot())
+            await asyncio.sleep(0)
+            assert client._lock.locked()
+            snapshot.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await snapshot
+            session = await client.start(pack_rgb(4, 5, 6))
+            assert session.id == 2 and len(session.guid) == 36
+            assert service.store.get(session.guid).id == 2
+            assert (await client.snapshot())["friends"][1] == {"id": 2, "color": {"r": 4, "g": 5, "b": 6}}
+        finally:
+            await client.shutdown()
+            await server.stop()
+            await service.shutdown()
+            shared.close()
+
+    asyncio.run(go())
+
+def test_batch_publishes_feed_once(tmp_path):
+    path = str(tmp_path / "coord.sock")
+    name = f"drinkmon-test-{uuid4().hex[:8]}"
+
+    async def go():
+        service = SessionService(SessionStore(), LeaseTable())
+        shared = SharedFeed.create(name, 1 << 20)
+        server = CoordinatorServer(service, shared)
+        publishes = []
+        publish = shared.publish
+        shared.publish = lambda *args: publishes.append(args[0]) or publish(*args)
+        await service.open(reap_interval=None)
+        await server.start(path)
+        client = CoordinatorClient(path, name)
+        events = []
+        client.listeners.append(events.append)
+        await client.open()
+        try:
+            publishes.clear()
+            started, _, applied = await client.batch([pack_rgb(i, i, i) for i in range(50)], [])
+            assert applied and len(started) == 50
+            assert publishes == [service.version]
+            # The reply only goes out once the shared feed has the batch
+            assert client.version == service.version
+            assert len(json.loads((await client.render())[1])) == 50
+            # A change outside any request (as the reaper makes) is published too
+            await service.close(started[0].guid)
+            await asyncio.sleep(0)
+            assert publishes == [service.version - 1, service.version]
+            for _ in range(100):
+                if len(events) == 51:
+                    break
+                await asyncio.sleep(0.01)
+            assert [e.kind for e in events] == ["add"] * 50 + ["remove"]
+        finally:
+            await client.shutdown()
+            await server.stop()
+            await service.shutdown()
+            shared.close()
+
+    asyncio.run(go())
@@ -3,9 +3,12 @@ Unit tests for drinkmon_api.py FastAPI backend.
 Covers session open, close, and GET logic.
 """
 
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
+from drinkmon_server import wire
 from drinkmon_server.drinkmon_api import app
+from drinkmon_server.records import pack_rgb
 
 client = TestClient(app)
 
@@ -38,3 +41,174 @@ def test_double_close():
     client.post("/api/close_session", json={"guid": guid})
     resp2 = client.post("/api/close_session", json={"guid": guid})
     assert resp2.status_code == 400
+
+def test_friend_sessions_etag_and_not_modified():
+    resp = client.get("/api/friend_sessions")
+    etag = resp.headers["etag"]
+    resp2 = client.get("/api/friend_sessions", headers={"If-None-Match": etag})
+    assert resp2.status_code == 304
+    assert resp2.content == b""
+    # Starting a session changes the version, so the old tag no longer matches
+    color = {"r": 4, "g": 5, "b": 6}
+    guid = client.post("/api/start_session", json={"color": color}).json()["guid"]
+    resp3 = client.get("/api/friend_sessions", headers={"If-None-Match": etag})
+    assert resp3.status_code == 200
+    assert resp3.headers["etag"] != etag
+    assert any(s["color"] == color for s in resp3.json())
+    client.post("/api/close_session", json={"guid": guid})
+
+def test_friend_websocket_receives_snapshot_and_deltas():
+    with client.websocket_connect("/api/friend_ws") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "snapshot"
+        color = {"r": 7, "g": 8, "b": 9}
+        guid = client.post("/api/start_session", json={"color": color}).json()["guid"]
+        added = ws.receive_json()
+        assert added["type"] == "add"
+        assert added["color"] == color
+        assert client.get("/api/diagnostics").json()["hub"]["connections"] == 1
+        client.post("/api/close_session", json={"guid": guid})
+        removed = ws.receive_json()
+        assert removed["type"] == "remove"
+        assert removed["id"] == added["id"]
+
+def test_expired_session_is_reaped_and_leaves_feed():
+    from drinkmon_server import drinkmon_api
+    color = {"r": 11, "g": 12, "b": 13}
+    guid = client.post("/api/start_session", json={"color": color}).json()["guid"]
+    drinkmon_api.sessions.leases.grant(guid, ttl=-1)
+    assert asyncio.run(drinkmon_api.sessions.reap_once()) == 1
+    assert all(s["color"] != color for s in client.get("/api/friend_sessions").json())
+    resp = client.post("/api/close_session", json={"guid": guid})
+    assert resp.status_code == 400
+
+def test_renew_endpoint_and_piggy_backed_renewal():
+    from drinkmon_server import drinkmon_api
+    guid = client.post("/api/start_session", json={"color": {"r": 1, "g": 1, "b": 1}}).json()["guid"]
+    resp = client.post("/api/renew", json={"guids": [guid, "not-a-guid"]})
+    assert resp.json() == {"renewed": 1, "unknown": 1}
+    resp2 = client.get("/api/friend_sessions", headers={"X-Drinkmon-Renew": guid})
+    assert resp2.headers["x-drinkmon-renewed"] == "1"
+    client.post("/api/close_session", json={"guid": guid})
+    assert guid not in drinkmon_api.sessions.leases
+    resp3 = client.post("/api/renew", json={"guids": [guid]})
+    assert resp3.json() == {"renewed": 0, "unknown": 1}
+
+def test_batch_start_and_close():
+    colors = [{"r": 200, "g": i, "b": 7} for i in range(3)]
+    resp = client.post("/api/batch_sessions", json={"start": [{"color": c} for c in colors]})
+    assert resp.status_code == 200
+    guids = [s["guid"] for s in resp.json()["started"]]
+    assert len(guids) == 3
+    feed = client.get("/api/friend_sessions").json()
+    assert all({"color": c} in feed for c in colors)
+    resp2 = client.post("/api/batch_sessions", json={"close": [guids[0], "nope"], "all_or_nothing": True})
+    assert resp2.status_code == 409
+    assert resp2.json()["closed"] == [
+        {"guid": guids[0], "status": "skipped"},
+        {"guid": "nope", "status": "not_found"},
+    ]
+    resp3 = client.post("/api/batch_sessions", json={"close": guids + ["nope"]})
+    assert resp3.json()["applied"]
+    assert [c["status"] for c in resp3.json()["closed"]] == ["closed"] * 3 + ["not_found"]
+    assert all({"color": c} not in client.get("/api/friend_sessions").json() for c in colors)
+
+def test_friend_changes_delta_and_snapshot_fallback():
+    full = client.get("/api/friend_changes").json()
+    assert full["full"]
+    cursor = full["cursor"]
+    guid = client.post("/api/start_session", json={"color": {"r": 3, "g": 4, "b": 5}}).json()["guid"]
+    delta = client.get("/api/friend_changes", params={"since": cursor}).json()
+    assert not delta["full"]
+    assert [a["color"] for a in delta["added"]] == [{"r": 3, "g": 4, "b": 5}]
+    added_id = delta["added"][0]["id"]
+    client.post("/api/close_session", json={"guid": guid})
+    delta2 = client.get("/api/friend_changes", params={"since": delta["cursor"]}).json()
+    assert delta2["added"] == [] and delta2["removed"] == [added_id]
+    nothing = client.get("/api/friend_changes", params={"since": delta2["cursor"]}).json()
+    assert nothing == {"cursor": delta2["cursor"], "full": False, "added": [], "removed": []}
+    # A cursor from another boot falls back to the full list
+    assert client.get("/api/friend_changes", params={"since": "stale-1"}).json()["full"]
+
+def test_binary_friend_feed_negotiated_by_accept():
+    color = {"r": 7, "g": 8, "b": 9}
+    guid = client.post("/api/start_session", json={"color": color}).json()["guid"]
+    accept = {"Accept": f"{wire.MEDIA_TYPE}; ids=1"}
+    resp = client.get("/api/friend_sessions", headers=accept)
+    assert resp.headers["content-type"] == wire.MEDIA_TYPE
+    assert resp.headers["etag"] != client.get("/api/friend_sessions").headers["etag"]
+    flags, records, _ = wire.decode(resp.content)
+    assert flags == wire.FLAG_FULL | wire.FLAG_IDS
+    assert pack_rgb(7, 8, 9) in [rgb for _, rgb in records]
+    assert client.get("/api/friend_sessions", headers={"Accept": accept["Accept"], "If-None-Match": resp.headers["etag"]}).status_code == 304
+    full = client.get("/api/friend_changes", headers=accept)
+    cursor = full.headers["x-drinkmon-cursor"]
+    client.post("/api/close_session", json={"guid": guid})
+    delta = client.get("/api/friend_changes", params={"since": cursor}, headers=accept)
+    flags, records, removed = wire.decode(delta.content)
+    assert flags == wire.FLAG_IDS and records == [] and len(removed) == 1
+
+def test_large_feed_is_gzipped_for_clients_that_accept_it():
+    started = client.post("/api/batch_sessions", json={"start": [{"color": {"r": i, "g": 0, "b": 0}} for i in range(60)]})
+    guids = [s["guid"] for s in started.json()["started"]]
+    plain = client.get("/api/friend_sessions", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    resp = client.get("/api/friend_sessions", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["etag"] != plain.headers["etag"]
+    assert resp.json() == plain.json()
+    assert client.get("/api/friend_sessions", headers={"Accept-Encoding": "gzip", "If-None-Match": resp.headers["etag"]}).status_code == 304
+    full = client.get("/api/friend_changes", headers={"Accept-Encoding": "gzip"})
+    assert full.headers["content-encoding"] == "gzip" and full.json()["full"]
+    client.post("/api/batch_sessions", json={"close": guids})
+    # Small bodies go out as they are
+    small = client.get("/api/friend_changes", params={"since": full.json()["cursor"]}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+def test_rate_limited_endpoint_returns_429_with_retry_after():
+    from drinkmon_server import drinkmon_api
+    from drinkmon_server.ratelimit import RateLimitMiddleware
+    # The limiter is opt-in (DRINKMON_RATE_LIMIT=1), so wrap the app as it would be
+    limited = TestClient(RateLimitMiddleware(app, limiter=drinkmon_api.limiter))
+    limits = drinkmon_api.limiter.limits
+    saved = limits["/api/clear_sessions"]
+    limits["/api/clear_sessions"] = (0.01, 1)
+    try:
+        assert limited.post("/api/clear_sessions").status_code == 200
+        resp = limited.post("/api/clear_sessions")
+        assert resp.status_code == 429
+        assert int(resp.headers["retry-after"]) >= 1
+        assert limited.get("/api/diagnostics").json()["rate_limit"]["rejected"] >= 1
+    finally:
+        limits["/api/clear_sessions"] = saved
+
+def test_metrics_endpoint():
+    client.get("/api/friend_sessions")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    text = resp.text
+    assert 'drinkmon_requests_total{route="/api/friend_sessions",method="GET",status="200"}' in text
+    assert 'drinkmon_request_duration_seconds_bucket{route="/api/friend_sessions",method="GET",le="+Inf"}' in text
+    assert "drinkmon_sessions_active " in text
+    assert "drinkmon_feed_cache_hit_ratio " in text
+    assert "drinkmon_event_loop_lag_seconds_count " in text
+
+def test_app_survives_a_second_lifespan():
+    for _ in range(2):
+        with TestClient(app) as c:
+            assert c.post("/api/start_session", json={"color": {"r": 1, "g": 1, "b": 1}}).status_code == 200
+
+def test_friend_events_subscribes_only_once_streaming():
+    from starlette.requests import Request
+    from drinkmon_server import drinkmon_api
+
+    async def go():
+        before = drinkmon_api.hub.connection_count
+        request = Request({"type": "http", "method": "GET", "path": "/api/friend_events", "headers": []})
+        # The client goes away before the response starts, so the body never runs
+        resp = await drinkmon_api.friend_events(request)
+        await resp.body_iterator.aclose()
+        assert drinkmon_api.hub.connection_count == before
+
+    asyncio.run(go())
@@ -0,0 +1,19 @@
+"""
+Unit tests for friend-session event encodings.
+Covers SSE and WebSocket framing.
+"""
+
+from drinkmon_server.events import FriendEvent, format_sse, snapshot_payload
+
+def test_format_sse():
+    frame = format_sse("snapshot", snapshot_payload(3, [(1, {"r": 0, "g": 0, "b": 255})]))
+    assert frame == (
+        b'event: snapshot\n'
+        b'data: {"v":3,"friends":[{"id":1,"color":{"r":0,"g":0,"b":255}}]}\n\n'
+    )
+
+def test_event_frames_are_cached():
+    event = FriendEvent("add", 1, 7, {"r": 1, "g": 2, "b": 3})
+    assert event.ws() == '{"type":"add","v":1,"id":7,"color":{"r":1,"g":2,"b":3}}'
+    assert event.ws() is event.ws()
+    assert event.sse() is event.sse()
@@ -0,0 +1,62 @@
+"""
+Unit tests for the cached friend feed.
+Covers the active-set read model, versioned re-rendering, If-None-Match
+matching and the gzip body cache.
+"""
+
+import gzip
+from drinkmon_server.compression import GzipCache, accepts_gzip, gzip_etag
+from drinkmon_server import wire
+from drinkmon_server.feed import FriendFeed
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+
+def test_render_is_cached_until_changed():
+    feed = FriendFeed()
+    etag, body = feed.render()
+    assert body == b"[]"
+    assert feed.render() == (etag, body)
+    session = SessionRecord("a", pack_rgb(1, 2, 3), now_epoch(), id=7)
+    feed.add(session)
+    etag2, body2 = feed.render()
+    assert etag2 != etag
+    assert body2 == b'[{"color":{"r":1,"g":2,"b":3}}]'
+    assert feed.friends() == [(7, {"r": 1, "g": 2, "b": 3})]
+    feed.remove(session)
+    assert feed.render()[1] == b"[]"
+    assert len(feed) == 0
+
+def test_binary_render_cached_per_format():
+    feed = FriendFeed()
+    feed.add(SessionRecord("a", pack_rgb(1, 2, 3), now_epoch(), id=7))
+    etag, body = feed.render(wire.FORMAT_BINARY_IDS)
+    assert etag != feed.render()[0]
+    assert wire.decode(body)[1] == [(7, pack_rgb(1, 2, 3))]
+    assert feed.render(wire.FORMAT_BINARY_IDS)[1] is body
+    assert feed.render(wire.FORMAT_BINARY)[1] == wire.encode_friends(feed.entries(), ids=False)
+
+def test_reset_replaces_active_set():
+    feed = FriendFeed()
+    feed.add(SessionRecord("a", pack_rgb(1, 1, 1), now_epoch(), id=1))
+    version = feed.reset([SessionRecord("b", pack_rgb(2, 2, 2), now_epoch(), id=2)])
+    assert version == feed.version == 2
+    assert [sid for sid, _ in feed.friends()] == [2]
+
+def test_etag_matches():
+    assert FriendFeed.etag_matches('"x-1"', '"x-1"')
+    assert FriendFeed.etag_matches('W/"x-1", "x-2"', '"x-1"')
+    assert FriendFeed.etag_matches('*', '"x-1"')
+    assert not FriendFeed.etag_matches('', '"x-1"')
+    assert not FriendFeed.etag_matches('"x-0"', '"x-1"')
+
+def test_gzip_cache_and_accept_encoding():
+    cache = GzipCache(min_size=100)
+    body = b'{"color":{"r":1,"g":2,"b":3}}' * 10
+    assert cache.wants(body) and not cache.wants(b"[]")
+    gz = cache.get('"x-1"', body)
+    assert gzip.decompress(gz) == body
+    assert cache.get('"x-1"', body) is gz and cache.compressions == 1
+    assert gzip_etag('"x-1"') == '"x-1-gzip"'
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip("gzip;q=0")
@@ -0,0 +1,64 @@
+"""
+Unit tests for the friend-session broadcast hub.
+Covers fan-out, bounded queues with snapshot coalescing, and metrics.
+"""
+
+import asyncio
+import pytest
+from drinkmon_server.events import FriendEvent
+from drinkmon_server.hub import RESYNC, BroadcastHub
+
+def add(version):
+    return FriendEvent("add", version, version, {"r": 1, "g": 2, "b": 3})
+
+def test_publish_reaches_every_connection():
+    async def run():
+        hub = BroadcastHub()
+        a = hub.subscribe()
+        b = hub.subscribe()
+        hub.publish(add(1))
+        got = (await a.get(1), await b.get(1))
+        hub.unsubscribe(a)
+        hub.unsubscribe(b)
+        return got, hub.connection_count
+    (got_a, got_b), remaining = asyncio.run(run())
+    assert got_a is got_b
+    assert got_a.version == 1
+    assert remaining == 0
+
+def test_slow_connection_is_coalesced_to_resync():
+    async def run():
+        hub = BroadcastHub(queue_size=4)
+        sub = hub.subscribe()
+        for v in range(1, 4):
+            hub.publish(add(v))
+        stats_before = hub.stats()
+        for v in range(4, 20):
+            hub.publish(add(v))
+        stats_after = hub.stats()
+        first = await sub.get(1)
+        hub.publish(add(20))
+        second = await sub.get(1)
+        return stats_before, stats_after, first, second
+    before, after, first, second = asyncio.run(run())
+    assert before["queue_depth_max"] == 3
+    assert after["queue_depth_max"] == 0
+    assert after["overflows"] == 1
+    assert first is RESYNC
+    assert second.version == 20
+
+def test_get_times_out_when_idle():
+    async def run():
+        hub = BroadcastHub()
+        sub = hub.subscribe()
+        with pytest.raises(asyncio.TimeoutError):
+            await sub.get(0.01)
+    asyncio.run(run())
+
+def test_publish_from_worker_thread():
+    async def run():
+        hub = BroadcastHub()
+        sub = hub.subscribe()
+        await asyncio.get_running_loop().run_in_executor(None, hub.publish, add(1))
+        return await sub.get(1)
+    assert asyncio.run(run()).version == 1
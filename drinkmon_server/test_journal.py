@@ -0,0 +1,40 @@
+"""
+Unit tests for the friend change journal.
+Covers net deltas, eviction past capacity and resets.
+"""
+
+from drinkmon_server.events import FriendEvent
+from drinkmon_server.journal import ChangeJournal
+
+RED = {"r": 255, "g": 0, "b": 0}
+
+def test_since_returns_net_changes():
+    journal = ChangeJournal()
+    journal.start_at(1)
+    journal.record(FriendEvent("add", 2, 1, RED))
+    journal.record(FriendEvent("add", 3, 2, RED))
+    journal.record(FriendEvent("remove", 4, 1, RED))
+    journal.record(FriendEvent("remove", 5, 7, RED))
+    assert journal.since(1) == ({2: RED}, [7])
+    assert journal.since(3) == ({}, [1, 7])
+    assert journal.since(5) == ({}, [])
+    assert journal.since(0) is None
+    # Events the journal has already seen are ignored
+    journal.record(FriendEvent("add", 4, 9, RED))
+    assert journal.last == 5
+
+def test_old_cursor_needs_snapshot_after_eviction():
+    journal = ChangeJournal(capacity=2)
+    for v in range(1, 5):
+        journal.record(FriendEvent("add", v, v, RED))
+    assert len(journal) == 2
+    assert journal.floor == 2
+    assert journal.since(1) is None
+    assert journal.since(2) == ({3: RED, 4: RED}, [])
+
+def test_reset_restarts_the_journal():
+    journal = ChangeJournal()
+    journal.record(FriendEvent("add", 1, 1, RED))
+    journal.record(FriendEvent("reset", 2))
+    assert journal.since(1) is None
+    assert journal.since(2) == ({}, [])
@@ -0,0 +1,54 @@
+"""
+Unit tests for session leases.
+Covers expiry ordering, renewal, revocation, and stale heap entries.
+"""
+
+from drinkmon_server.leases import LeaseTable
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_pop_expired_returns_only_expired_leases():
+    clock = FakeClock()
+    leases = LeaseTable(ttl=10, clock=clock)
+    leases.grant("a")
+    clock.now = 5
+    leases.grant("b")
+    assert leases.pop_expired() == []
+    clock.now = 10
+    assert leases.pop_expired() == ["a"]
+    assert "a" not in leases
+    assert "b" in leases
+
+def test_renew_pushes_expiry_out():
+    clock = FakeClock()
+    leases = LeaseTable(ttl=10, clock=clock)
+    leases.grant("a")
+    clock.now = 8
+    assert leases.renew("a")
+    clock.now = 12
+    assert leases.pop_expired() == []
+    clock.now = 18
+    assert leases.pop_expired() == ["a"]
+    assert not leases.renew("a")
+
+def test_revoked_lease_never_expires():
+    clock = FakeClock()
+    leases = LeaseTable(ttl=10, clock=clock)
+    leases.grant("a")
+    leases.revoke("a")
+    clock.now = 100
+    assert leases.pop_expired() == []
+    assert len(leases) == 0
+
+def test_stale_entries_are_compacted():
+    clock = FakeClock()
+    leases = LeaseTable(ttl=10, clock=clock)
+    leases.grant("a")
+    for _ in range(1000):
+        leases.renew("a")
+    assert len(leases._heap) <= 2 * len(leases) + 65
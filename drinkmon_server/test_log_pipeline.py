@@ -0,0 +1,71 @@
+"""
+Unit tests for the queue-based logging pipeline.
+Covers deferred formatting, drop-on-full queues, sampling, and JSON output.
+"""
+
+import json
+import logging
+import os
+import queue
+from drinkmon_server.log_pipeline import (
+    LOG_FILE, JsonFormatter, LazyQueueHandler, SamplingFilter, _Listener, process_log_file,
+)
+
+def make_record(level=logging.INFO, msg="Session started: guid=%s", args=("abc",)):
+    return logging.LogRecord("drinkmon", level, __file__, 1, msg, args, None)
+
+def test_queue_handler_defers_formatting():
+    q = queue.Queue(10)
+    handler = LazyQueueHandler(q)
+    record = make_record()
+    handler.handle(record)
+    queued = q.get_nowait()
+    assert queued is record
+    assert queued.msg == "Session started: guid=%s"
+    assert queued.args == ("abc",)
+
+def test_queue_handler_drops_when_full():
+    handler = LazyQueueHandler(queue.Queue(1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+
+def test_sampling_filter_keeps_one_in_n_per_level():
+    sampler = SamplingFilter({"DEBUG": 10})
+    debug = [sampler.filter(make_record(logging.DEBUG)) for _ in range(30)]
+    info = [sampler.filter(make_record(logging.INFO)) for _ in range(5)]
+    assert sum(debug) == 3
+    assert all(info)
+
+def test_json_formatter_output():
+    line = JsonFormatter().format(make_record())
+    data = json.loads(line)
+    assert data["message"] == "Session started: guid=abc"
+    assert data["level"] == "INFO"
+    assert data["logger"] == "drinkmon"
+
+def test_listener_start_and_stop_are_idempotent():
+    q = queue.Queue(10)
+    seen = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            seen.append(record.getMessage())
+
+    listener = _Listener(q, Collect())
+    listener.start()
+    listener.start()
+    listener.stop()
+    listener.stop()
+    # Logged between lifespans: kept until the listener runs again
+    LazyQueueHandler(q).handle(make_record())
+    listener.start()
+    listener.stop()
+    assert seen == ["Session started: guid=abc"]
+
+def test_process_log_file_is_per_process():
+    assert process_log_file() == LOG_FILE
+    assert process_log_file("coordinator") == "drinkmon_api.coordinator.log"
+    worker = process_log_file("worker")
+    assert worker == f"drinkmon_api.worker-{os.getpid()}.log"
+    assert len({LOG_FILE, process_log_file("coordinator"), worker}) == 3
@@ -0,0 +1,36 @@
+"""
+Unit tests for the Prometheus-style metrics.
+Covers histogram bucketing, route lookup and the exposition text.
+"""
+
+import asyncio
+from drinkmon_server.metrics import Histogram, Metrics, MetricsMiddleware, OTHER_ROUTE
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value)
+    assert hist.counts == [2, 1, 1]
+    lines = hist.render("h", 'route="/x"')
+    assert lines[:3] == ['h_bucket{route="/x",le="0.1"} 2', 'h_bucket{route="/x",le="1.0"} 3', 'h_bucket{route="/x",le="+Inf"} 4']
+    assert lines[-1] == 'h_count{route="/x"} 4'
+
+def test_middleware_counts_requests_per_route():
+    metrics = Metrics()
+    metrics.add_routes([("GET", "/api/friend_sessions")])
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 304 if scope["path"] != "/nope" else 404})
+
+    async def noop(message):
+        pass
+
+    wrapped = MetricsMiddleware(app, metrics)
+    for path in ("/api/friend_sessions", "/api/friend_sessions", "/nope"):
+        asyncio.run(wrapped({"type": "http", "method": "GET", "path": path}, None, noop))
+    assert metrics.route("GET", "/api/friend_sessions").statuses == {304: 2}
+    assert metrics.route("GET", "/unknown").route == OTHER_ROUTE
+    text = metrics.render({"drinkmon_sessions_active": ("gauge", "Open sessions.", 3)})
+    assert 'drinkmon_requests_total{route="/api/friend_sessions",method="GET",status="304"} 2' in text
+    assert f'drinkmon_requests_total{{route="{OTHER_ROUTE}",method="",status="404"}} 1' in text
+    assert "# TYPE drinkmon_sessions_active gauge\ndrinkmon_sessions_active 3\n" in text
@@ -0,0 +1,116 @@
+"""
+Unit tests for the device's persistent outbox, run under CPython.
+Covers start/close coalescing, the event in flight, a full ring and reloading
+the flash file after a reboot.
+"""
+
+import asyncio
+import struct
+import sys
+
+# The outbox only needs these two MicroPython modules
+sys.modules.setdefault("uasyncio", asyncio)
+sys.modules.setdefault("ustruct", struct)
+
+from drinkmon.app.outbox import KIND_CLOSE, KIND_NONE, KIND_START, Outbox
+
+RED = (255, 0, 0)
+
+def make_outbox(tmp_path, slots=4):
+    return Outbox(str(tmp_path / "outbox.bin"), slots)
+
+def drain(outbox):
+    events = []
+    while outbox.peek():
+        events.append(outbox.peek())
+        outbox.pop()
+    return events
+
+def test_close_cancels_queued_start(tmp_path):
+    outbox = make_outbox(tmp_path)
+    first = outbox.queue_start(RED, 100)
+    second = outbox.queue_start(RED, 110)
+    outbox.queue_close(first, None, 120)
+    assert len(outbox) == 1
+    assert outbox.peek()[:2] == (KIND_START, second)
+    outbox.queue_close(second, None, 130)
+    assert len(outbox) == 0 and outbox.peek() is None
+
+def test_close_after_start_in_flight_is_queued(tmp_path):
+    outbox = make_outbox(tmp_path)
+    local_id = outbox.queue_start(RED, 100)
+    outbox.in_flight = True
+    outbox.queue_close(local_id, None, 110)
+    outbox.in_flight = False
+    assert len(outbox) == 2
+    # The guid the server gave the start is copied into the close
+    outbox.resolve(local_id, "guid-1")
+    assert [e[0] for e in drain(outbox)] == [KIND_START, KIND_CLOSE]
+    outbox.queue_start(RED, 120)
+    assert outbox.peek()[1] == local_id + 1
+
+def test_resolve_fills_in_close_guid(tmp_path):
+    outbox = make_outbox(tmp_path)
+    local_id = outbox.queue_start(RED, 100)
+    outbox.in_flight = True
+    outbox.queue_close(local_id, None, 110)
+    outbox.pop()
+    outbox.in_flight = False
+    outbox.resolve(local_id, "guid-1")
+    assert outbox.peek() == (KIND_CLOSE, local_id, (0, 0, 0), 110, "guid-1")
+
+def test_full_ring_drops_oldest_event(tmp_path):
+    outbox = make_outbox(tmp_path, slots=3)
+    ids = [outbox.queue_start(RED, 100 + i) for i in range(4)]
+    assert len(outbox) == 3
+    assert [e[1] for e in drain(outbox)] == ids[1:]
+
+def test_full_ring_keeps_event_in_flight(tmp_path):
+    outbox = make_outbox(tmp_path, slots=3)
+    ids = [outbox.queue_start(RED, 100 + i) for i in range(3)]
+    outbox.in_flight = True
+    newest = outbox.queue_start(RED, 200)
+    # The event being sent stays at the head and the next oldest makes room
+    assert outbox.peek()[1] == ids[0]
+    outbox.pop()
+    outbox.in_flight = False
+    assert [e[1] for e in drain(outbox)] == [ids[2], newest]
+
+def test_reload_after_reboot(tmp_path):
+    outbox = make_outbox(tmp_path)
+    closed = outbox.queue_start(RED, 100)
+    outbox.queue_close(closed, "guid-1", 110)  # the start is still queued, so both go
+    sent = outbox.queue_start(RED, 120)
+    outbox.in_flight = True
+    outbox.queue_close(sent, "guid-2", 130)
+    outbox.in_flight = False
+    open_id = outbox.queue_start(RED, 140)
+
+    reloaded = make_outbox(tmp_path)
+    # The start of the session the reboot ended is dropped; the rest survives
+    assert reloaded.ready.is_set()
+    assert reloaded.next_id == open_id + 1
+    assert drain(reloaded) == [
+        (KIND_START, sent, RED, 120, None),
+        (KIND_CLOSE, sent, (0, 0, 0), 130, "guid-2"),
+    ]
+    assert len(make_outbox(tmp_path)) == 0
+
+def test_wrong_size_file_starts_empty(tmp_path):
+    (tmp_path / "outbox.bin").write_bytes(b"\0" * 10)
+    outbox = make_outbox(tmp_path)
+    assert len(outbox) == 0 and not outbox.ready.is_set()
+    outbox.queue_start(RED, 100)
+    assert len(make_outbox(tmp_path)) == 0  # a lone start is dropped on reload
+
+def test_full_ring_skips_slots_freed_by_coalescing(tmp_path):
+    outbox = make_outbox(tmp_path, slots=3)
+    oldest = outbox.queue_start(RED, 100)
+    cancelled = outbox.queue_start(RED, 110)
+    newest = outbox.queue_start(RED, 120)
+    outbox.queue_close(cancelled, None, 130)  # frees the middle slot
+    assert len(outbox) == 3
+    outbox.queue_start(RED, 140)
+    # Dropping the oldest must not leave the freed slot at the head
+    assert outbox.peek()[:2] == (KIND_START, newest)
+    assert all(e[0] != KIND_NONE for e in drain(outbox))
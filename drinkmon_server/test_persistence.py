@@ -0,0 +1,90 @@
+"""
+Unit tests for the durable session log.
+Covers write-ahead logging, compaction, and replay into a fresh store.
+"""
+
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+from drinkmon_server.persistence import SessionLog
+from drinkmon_server.session_store import SessionStore
+
+def start(store, log, guid, r=1):
+    session = SessionRecord(guid, pack_rgb(r, 2, 3), now_epoch())
+    store.add(session)
+    log.append_start(session)
+    return session
+
+def test_replay_restores_active_sessions(tmp_path):
+    store = SessionStore()
+    log = SessionLog(str(tmp_path), flush_interval=0)
+    log.start()
+    start(store, log, "a")
+    b = start(store, log, "b", r=9)
+    start(store, log, "c")
+    store.close("a", now_epoch())
+    log.append_close("a")
+    log.close()
+
+    restored = SessionStore()
+    assert SessionLog(str(tmp_path)).replay(restored) == 2
+    assert sorted(s.guid for s in restored.active()) == ["b", "c"]
+    assert restored.get("b").id == b.id
+    assert restored.get("b").rgb == pack_rgb(9, 2, 3)
+    # New ids continue after the recovered ones
+    fresh = SessionRecord("d", 0, now_epoch())
+    restored.add(fresh)
+    assert fresh.id == 4
+
+def test_compaction_truncates_log_and_survives_replay(tmp_path):
+    store = SessionStore()
+    log = SessionLog(str(tmp_path), flush_interval=0, compact_every=3)
+    log.start()
+    for guid in "abc":
+        start(store, log, guid)
+    log.append_close("b")
+    log.append_clear()
+    start(store, log, "d")
+    log.close()
+    assert log.batches >= 1
+    assert log.records == 6
+
+    restored = SessionStore()
+    assert SessionLog(str(tmp_path)).replay(restored) == 1
+    assert [s.guid for s in restored.active()] == ["d"]
+
+def test_replay_ignores_torn_tail(tmp_path):
+    store = SessionStore()
+    log = SessionLog(str(tmp_path), flush_interval=0)
+    log.start()
+    start(store, log, "a")
+    log.close()
+    with open(log.log_path, "a") as f:
+        f.write('["start","b",2,')
+    restored = SessionStore()
+    assert SessionLog(str(tmp_path)).replay(restored) == 1
+
+def test_replay_reads_older_record_format(tmp_path):
+    log = SessionLog(str(tmp_path))
+    with open(log.log_path, "w") as f:
+        f.write('["start","a",3,1,2,3,"2025-01-01T00:00:00"]\n')
+    restored = SessionStore()
+    assert log.replay(restored) == 1
+    session = restored.get("a")
+    assert session.rgb == pack_rgb(1, 2, 3)
+    assert session.started == 1735689600
+    assert session.id == 3
+
+def test_batch_record_replays_as_a_unit(tmp_path):
+    store = SessionStore()
+    log = SessionLog(str(tmp_path), flush_interval=0)
+    log.start()
+    a = start(store, log, "a")
+    b = SessionRecord("b", pack_rgb(4, 5, 6), now_epoch())
+    store.add(b)
+    store.close("a", now_epoch())
+    log.append_batch([b], ["a"])
+    log.close()
+
+    restored = SessionStore()
+    assert SessionLog(str(tmp_path)).replay(restored) == 1
+    assert restored.get("b").id == b.id == a.id + 1
+    assert restored.get("a") is None
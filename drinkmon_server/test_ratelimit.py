@@ -0,0 +1,48 @@
+"""
+Unit tests for the per-client token-bucket rate limiter.
+Covers refill, per-client and per-endpoint isolation, and idle-bucket eviction.
+"""
+
+from drinkmon_server.ratelimit import RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = RateLimiter({"/a": (2.0, 3)}, clock=clock)
+    assert [limiter.check("c", "/a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.check("c", "/a") == 0.5
+    clock.now += 0.5
+    assert limiter.check("c", "/a") == 0.0
+    assert limiter.check("c", "/a") > 0
+    assert limiter.stats()["rejected"] == 2
+
+def test_buckets_are_per_client_and_endpoint():
+    limiter = RateLimiter({"/a": (1.0, 1), "/b": (1.0, 1)}, clock=FakeClock())
+    assert limiter.check("c", "/a") == 0.0
+    assert limiter.check("c", "/a") > 0
+    assert limiter.check("d", "/a") == 0.0
+    assert limiter.check("c", "/b") == 0.0
+    # Unlisted paths are never limited and get no bucket
+    assert all(limiter.check("c", "/other") == 0.0 for _ in range(10))
+    assert len(limiter) == 3
+
+def test_idle_buckets_are_evicted():
+    clock = FakeClock()
+    limiter = RateLimiter({"/a": (1.0, 2)}, max_buckets=3, clock=clock)
+    limiter.check("old", "/a")
+    clock.now += 1.0
+    limiter.check("recent", "/a")
+    clock.now += 1.5
+    # "old" has been idle long enough to be full again; "recent" has not
+    limiter.check("new", "/a")
+    assert len(limiter) == 2
+    for client in ("x", "y", "z"):
+        limiter.check(client, "/a")
+    assert len(limiter) == 3
+    assert limiter.stats()["evicted"] == 3
@@ -0,0 +1,135 @@
+"""
+Unit tests for the session repositories.
+Covers the active index, closed history, and clearing on every backend.
+"""
+
+import pytest
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+from drinkmon_server.session_store import ClosedHistory, SessionAlreadyClosed, SessionNotFound, SessionStore
+from drinkmon_server.sqlite_store import SQLiteSessionRepository
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        repo = SQLiteSessionRepository(str(tmp_path / "sessions.db"))
+    else:
+        repo = SessionStore()
+    yield repo
+    repo.close_storage()
+
+RGB = pack_rgb(1, 2, 3)
+
+def make_session(guid):
+    return SessionRecord(guid, RGB, now_epoch())
+
+def test_close_moves_session_out_of_active_index(store):
+    store.add(make_session("a"))
+    store.add(make_session("b"))
+    store.close("a", now_epoch())
+    assert [s.guid for s in store.active()] == ["b"]
+    assert store.active_count == 1
+    assert store.closed_count == 1
+    assert store.get("a").closed != 0
+    assert store.get("b").rgb == RGB
+
+def test_close_errors(store):
+    with pytest.raises(SessionNotFound):
+        store.close("missing", now_epoch())
+    store.add(make_session("a"))
+    store.close("a", now_epoch())
+    with pytest.raises(SessionAlreadyClosed):
+        store.close("a", now_epoch())
+
+def test_clear_counts_active_and_closed(store):
+    store.add(make_session("a"))
+    store.add(make_session("b"))
+    store.close("a", now_epoch())
+    assert store.clear() == 2
+    assert len(store) == 0
+    assert list(store.active()) == []
+
+def test_ids_are_unique_and_restorable(store):
+    a = make_session("a")
+    store.add(a)
+    restored = make_session("r")
+    restored.id = 10
+    store.restore(restored)
+    b = make_session("b")
+    store.add(b)
+    assert a.id == 1
+    assert b.id == 11
+
+def test_sqlite_reopen_keeps_sessions(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    repo = SQLiteSessionRepository(path)
+    repo.add(make_session("a"))
+    repo.close_storage()
+    reopened = SQLiteSessionRepository(path)
+    assert [s.guid for s in reopened.active()] == ["a"]
+    fresh = make_session("b")
+    reopened.add(fresh)
+    assert fresh.id == 2
+    reopened.close_storage()
+
+def closed_session(guid, closed):
+    session = make_session(guid)
+    session.closed = closed
+    return session
+
+def test_closed_history_evicts_by_count():
+    history = ClosedHistory(capacity=3, max_age=3600)
+    now = 1735689600
+    for i in range(5):
+        history.append(closed_session(f"g{i}", now))
+    assert len(history) == 3
+    assert "g1" not in history
+    assert history.get("g4").guid == "g4"
+    assert history.get("g4").rgb == RGB
+    assert history.evicted == 2
+
+def test_closed_history_evicts_by_age():
+    history = ClosedHistory(capacity=100, max_age=60)
+    start = 1735689600
+    history.append(closed_session("old", start))
+    history.append(closed_session("new", start + 30))
+    assert len(history) == 2
+    history.append(closed_session("newer", start + 61))
+    assert "old" not in history
+    assert history.prune(start + 200) == 2
+    assert len(history) == 0
+
+def test_aged_out_session_reports_not_found():
+    store = SessionStore(closed_retention_count=1)
+    store.add(make_session("a"))
+    store.add(make_session("b"))
+    store.close("a", now_epoch())
+    store.close("b", now_epoch())
+    with pytest.raises(SessionAlreadyClosed):
+        store.close("b", now_epoch())
+    with pytest.raises(SessionNotFound):
+        store.close("a", now_epoch())
+    assert store.memory_stats()["closed_evicted"] == 1
+
+def test_apply_batch_reports_per_item_results(store):
+    store.add(make_session("a"))
+    store.add(make_session("b"))
+    store.close("b", now_epoch())
+    starts = [make_session("c"), make_session("d")]
+    outcomes, applied = store.apply_batch(starts, ["a", "b", "missing", "a"], now_epoch())
+    assert applied
+    assert [s.id for s in starts] == [3, 4]
+    assert outcomes[0].guid == "a" and outcomes[0].closed
+    assert isinstance(outcomes[1], SessionAlreadyClosed)
+    assert isinstance(outcomes[2], SessionNotFound)
+    assert isinstance(outcomes[3], SessionAlreadyClosed)
+    assert sorted(s.guid for s in store.active()) == ["c", "d"]
+
+def test_apply_batch_all_or_nothing_leaves_store_untouched(store):
+    store.add(make_session("a"))
+    outcomes, applied = store.apply_batch([make_session("c")], ["a", "missing"], now_epoch(), all_or_nothing=True)
+    assert not applied
+    assert isinstance(outcomes[1], SessionNotFound)
+    assert [s.guid for s in store.active()] == ["a"]
+    fresh = make_session("e")
+    store.add(fresh)
+    assert fresh.id == 2
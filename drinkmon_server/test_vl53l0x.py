@@ -0,0 +1,101 @@
+"""
+Unit tests for the device's VL53L0X register batching, run under CPython.
+Covers _compile, the ST tuning settings it sends and the driver's init on the
+simulated bus from i2c_bench.
+"""
+
+import sys
+import types
+
+# The driver only needs micropython.const at import
+_micropython = types.ModuleType("micropython")
+_micropython.const = lambda value: value
+sys.modules.setdefault("micropython", _micropython)
+
+import pytest
+from drinkmon.hardware import vl53l0x
+from drinkmon.hardware.i2c_bench import FakeSensorBus
+from drinkmon.hardware.vl53l0x import VL53L0X, _compile
+
+# "Load tuning settings" from the ST API, one write per register
+ST_TUNING = [
+    (0xFF, 0x01), (0x00, 0x00), (0xFF, 0x00), (0x09, 0x00), (0x10, 0x00), (0x11, 0x00),
+    (0x24, 0x01), (0x25, 0xFF), (0x75, 0x00), (0xFF, 0x01), (0x4E, 0x2C), (0x48, 0x00),
+    (0x30, 0x20), (0xFF, 0x00), (0x30, 0x09), (0x54, 0x00), (0x31, 0x04), (0x32, 0x03),
+    (0x40, 0x83), (0x46, 0x25), (0x60, 0x00), (0x27, 0x00), (0x50, 0x06), (0x51, 0x00),
+    (0x52, 0x96), (0x56, 0x08), (0x57, 0x30), (0x61, 0x00), (0x62, 0x00), (0x64, 0x00),
+    (0x65, 0x00), (0x66, 0xA0), (0xFF, 0x01), (0x22, 0x32), (0x47, 0x14), (0x49, 0xFF),
+    (0x4A, 0x00), (0xFF, 0x00), (0x7A, 0x0A), (0x7B, 0x00), (0x78, 0x21), (0xFF, 0x01),
+    (0x23, 0x34), (0x42, 0x00), (0x44, 0xFF), (0x45, 0x26), (0x46, 0x05), (0x40, 0x40),
+    (0x0E, 0x06), (0x20, 0x1A), (0x43, 0x40), (0xFF, 0x00), (0x34, 0x03), (0x35, 0x44),
+    (0xFF, 0x01), (0x31, 0x04), (0x4B, 0x09), (0x4C, 0x05), (0x4D, 0x04), (0xFF, 0x00),
+    (0x44, 0x00), (0x45, 0x20), (0x47, 0x08), (0x48, 0x28), (0x67, 0x00), (0x70, 0x04),
+    (0x71, 0x01), (0x72, 0xFE), (0x76, 0x00), (0x77, 0x00), (0xFF, 0x01), (0x0D, 0x01),
+    (0xFF, 0x00), (0x80, 0x01), (0x01, 0xF8), (0xFF, 0x01), (0x8E, 0x01), (0x00, 0x01),
+    (0xFF, 0x00), (0x80, 0x00),
+]
+
+def expand(blobs):
+    # The (register, value) writes an auto-incrementing sensor sees
+    return [(blob[0] + i, val) for blob in blobs for i, val in enumerate(blob[1:])]
+
+def assert_no_control_bursts(blobs):
+    for blob in blobs:
+        if len(blob) > 2:
+            registers = range(blob[0], blob[0] + len(blob) - 1)
+            assert not set(registers) & {0x00, 0x80, 0xFF}, blob.hex()
+
+class RecordingBus(FakeSensorBus):
+    """
+    FakeSensorBus that also records every register write, one per register.
+    """
+
+    def __init__(self):
+        self.writes = []
+        super().__init__()
+
+    def _write(self, data):
+        self.writes.extend((data[0] + i, val) for i, val in enumerate(data[1:]))
+        super()._write(data)
+
+class UnbatchedVL53L0X(VL53L0X):
+    # Sends compiled sequences one register per transaction, as before batching
+    def _write_seq(self, blobs):
+        for reg, val in expand(blobs):
+            self._i2c.writeto(self._address, bytes((reg, val)))
+
+@pytest.fixture(autouse=True)
+def ticks(monkeypatch):
+    # Calibration waits use the MicroPython tick functions
+    monkeypatch.setattr(vl53l0x, "time", types.SimpleNamespace(ticks_ms=lambda: 0, ticks_diff=lambda a, b: a - b))
+
+def test_compile_merges_consecutive_registers():
+    blobs = _compile(((0x30, 1), (0x31, 2), (0x32, 3), (0x40, 4), (0x41, 5), (0x30, 6)))
+    assert blobs == (bytes((0x30, 1, 2, 3)), bytes((0x40, 4, 5)), bytes((0x30, 6)))
+
+def test_compile_never_bursts_through_control_registers():
+    pairs = ((0xFE, 1), (0xFF, 2), (0x00, 3), (0x01, 4), (0x7F, 5), (0x80, 6), (0x81, 7), (0x82, 8))
+    blobs = _compile(pairs)
+    assert expand(blobs) == list(pairs)
+    assert blobs == (
+        bytes((0xFE, 1)), bytes((0xFF, 2)), bytes((0x00, 3)), bytes((0x01, 4)),
+        bytes((0x7F, 5)), bytes((0x80, 6)), bytes((0x81, 7, 8)),
+    )
+    for name in dir(vl53l0x):
+        value = getattr(vl53l0x, name)
+        if isinstance(value, tuple) and value and isinstance(value[0], bytes):
+            assert_no_control_bursts(value)
+    assert_no_control_bursts(VL53L0X(FakeSensorBus())._start_sequence)
+
+def test_tuning_settings_write_st_defaults():
+    assert expand(vl53l0x._TUNING_SETTINGS) == ST_TUNING
+    assert len(vl53l0x._TUNING_SETTINGS) < len(ST_TUNING)
+
+def test_init_writes_same_registers_in_fewer_transactions():
+    batched, unbatched = RecordingBus(), RecordingBus()
+    VL53L0X(batched)
+    UnbatchedVL53L0X(unbatched)
+    assert batched.writes == unbatched.writes
+    assert len(batched.writes) == 135
+    assert batched.regs == unbatched.regs
+    assert (batched.transactions, unbatched.transactions) == (128, 149)
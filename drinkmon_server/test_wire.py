@@ -0,0 +1,29 @@
+"""
+Unit tests for the binary friend feed encoding.
+Covers encoding, id stripping, and Accept negotiation.
+"""
+
+from drinkmon_server import wire
+from drinkmon_server.records import pack_rgb
+
+def test_encode_full_and_strip_ids():
+    entries = [(1, pack_rgb(1, 2, 3)), (70000, pack_rgb(255, 0, 128))]
+    body = wire.encode_friends(entries)
+    assert len(body) == wire.HEADER.size + 2 * wire.ID_RGB_SIZE
+    assert wire.decode(body) == (wire.FLAG_FULL | wire.FLAG_IDS, entries, [])
+    stripped = wire.strip_ids(body)
+    assert stripped == wire.encode_friends(entries, ids=False)
+    assert stripped[wire.HEADER.size:] == bytes([1, 2, 3, 255, 0, 128])
+    assert wire.decode(stripped) == (wire.FLAG_FULL, [(None, rgb) for _, rgb in entries], [])
+
+def test_encode_changes():
+    body = wire.encode_changes({5: pack_rgb(9, 9, 9)}, [2, 3])
+    assert wire.decode(body) == (wire.FLAG_IDS, [(5, pack_rgb(9, 9, 9))], [2, 3])
+
+def test_negotiate():
+    assert wire.negotiate("") == wire.FORMAT_JSON
+    assert wire.negotiate("*/*") == wire.FORMAT_JSON
+    assert wire.negotiate("application/json") == wire.FORMAT_JSON
+    assert wire.negotiate(wire.MEDIA_TYPE) == wire.FORMAT_BINARY
+    assert wire.negotiate(f"application/json;q=0.5, {wire.MEDIA_TYPE};ids=1") == wire.FORMAT_BINARY_IDS
+    assert wire.negotiate(f"{wire.MEDIA_TYPE};q=0") == wire.FORMAT_JSON
@@ -0,0 +1,47 @@
+"""
+Unit tests for the single session writer.
+Covers inline writes for the in-memory store and ordered writes on the writer thread.
+"""
+
+import asyncio
+import threading
+import pytest
+from drinkmon_server.records import SessionRecord, now_epoch, pack_rgb
+from drinkmon_server.session_store import SessionNotFound, SessionStore
+from drinkmon_server.sqlite_store import SQLiteSessionRepository
+from drinkmon_server.writer import SessionWriter
+
+def test_memory_store_writes_inline():
+    writer = SessionWriter(SessionStore())
+    assert writer.inline
+
+    async def go():
+        session = SessionRecord("a", pack_rgb(1, 2, 3), now_epoch())
+        await writer.submit(writer.store.add, session)
+        with pytest.raises(SessionNotFound):
+            await writer.submit(writer.store.close, "missing", now_epoch())
+        return session.id
+
+    assert asyncio.run(go()) == 1
+
+def test_blocking_store_writes_on_one_thread_in_order(tmp_path):
+    store = SQLiteSessionRepository(str(tmp_path / "s.db"))
+    writer = SessionWriter(store)
+    assert not writer.inline
+    threads = set()
+
+    def add(session):
+        threads.add(threading.get_ident())
+        store.add(session)
+
+    async def go():
+        sessions = [SessionRecord(f"g{i}", pack_rgb(i, 0, 0), now_epoch()) for i in range(20)]
+        await asyncio.gather(*(writer.submit(add, s) for s in sessions))
+        return [s.id for s in sessions]
+
+    try:
+        assert asyncio.run(go()) == list(range(1, 21))
+        assert len(threads) == 1 and threading.get_ident() not in threads
+    finally:
+        writer.close()
+        store.close_storage()
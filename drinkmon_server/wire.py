@@ -0,0 +1,100 @@
+"""
+Compact binary encoding of the friend feed for constrained clients.
+Served instead of JSON when the request's Accept header asks for MEDIA_TYPE.
+
+Layout (network byte order): a HEADER of wire version, flags, record count and
+removed count, then one record per friend (u32 id if FLAG_IDS is set, then
+r, g, b bytes), then one u32 id per removed friend. FLAG_FULL marks the records
+as the whole active set rather than changes; only deltas carry removed ids.
+"""
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MEDIA_TYPE = "application/vnd.drinkmon.friends"
+WIRE_VERSION = 1
+FLAG_IDS = 0x01
+FLAG_FULL = 0x02
+HEADER = struct.Struct("!BBII")      # version, flags, records, removed ids
+ID = struct.Struct("!I")
+RGB_SIZE = 3
+ID_RGB_SIZE = ID.size + RGB_SIZE
+
+# Representations of the friend feed, as requested by the client.
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"             # colours only
+FORMAT_BINARY_IDS = "binary+ids"     # public session id with each colour
+
+def negotiate(accept: str) -> str:
+    """
+    Pick the friend feed representation for an Accept header value.
+    Binary is only served when MEDIA_TYPE is listed explicitly (with a
+    non-zero q); an "ids=1" parameter on it asks for session ids as well.
+    Anything else, including */*, gets JSON.
+    """
+    if MEDIA_TYPE not in accept:
+        return FORMAT_JSON
+    for media_range in accept.split(","):
+        media_type, *params = [p.strip() for p in media_range.split(";")]
+        if media_type != MEDIA_TYPE:
+            continue
+        options = dict(p.partition("=")[::2] for p in params)
+        try:
+            if float(options.get("q", 1)) <= 0:
+                continue
+        except ValueError:
+            continue
+        return FORMAT_BINARY_IDS if options.get("ids") == "1" else FORMAT_BINARY
+    return FORMAT_JSON
+
+def encode_friends(entries: Iterable[Tuple[int, int]], ids: bool = True) -> bytes:
+    """
+    Encode the whole active set from (id, packed rgb) pairs.
+    """
+    if ids:
+        records = [ID.pack(sid) + rgb.to_bytes(3, "big") for sid, rgb in entries]
+    else:
+        records = [rgb.to_bytes(3, "big") for _, rgb in entries]
+    flags = FLAG_FULL | (FLAG_IDS if ids else 0)
+    return HEADER.pack(WIRE_VERSION, flags, len(records), 0) + b"".join(records)
+
+def encode_changes(added: Dict[int, int], removed: List[int]) -> bytes:
+    """
+    Encode a delta from id -> packed rgb for added friends and removed ids.
+    """
+    body = [HEADER.pack(WIRE_VERSION, FLAG_IDS, len(added), len(removed))]
+    body.extend(ID.pack(sid) + rgb.to_bytes(3, "big") for sid, rgb in added.items())
+    body.extend(ID.pack(sid) for sid in removed)
+    return b"".join(body)
+
+def strip_ids(body: bytes) -> bytes:
+    """
+    Re-encode a full FLAG_IDS body as colours only, without unpacking records.
+    """
+    _, flags, count, _ = HEADER.unpack_from(body)
+    records = memoryview(body)[HEADER.size:HEADER.size + count * ID_RGB_SIZE]
+    out = bytearray(HEADER.pack(WIRE_VERSION, flags & ~FLAG_IDS, count, 0))
+    rgb = bytearray(count * RGB_SIZE)
+    for i in range(RGB_SIZE):
+        rgb[i::RGB_SIZE] = records[ID.size + i::ID_RGB_SIZE]
+    out += rgb
+    return bytes(out)
+
+def decode(body: bytes) -> Tuple[int, List[Tuple[Optional[int], int]], List[int]]:
+    """
+    Decode a body into (flags, [(id or None, packed rgb)], removed ids).
+    The reference decoder; devices use their own allocation-free one.
+    """
+    version, flags, count, n_removed = HEADER.unpack_from(body)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported friend feed wire version {version}")
+    offset = HEADER.size
+    records = []
+    for _ in range(count):
+        sid = None
+        if flags & FLAG_IDS:
+            (sid,) = ID.unpack_from(body, offset)
+            offset += ID.size
+        records.append((sid, int.from_bytes(body[offset:offset + RGB_SIZE], "big")))
+        offset += RGB_SIZE
+    removed = [ID.unpack_from(body, offset + i * ID.size)[0] for i in range(n_removed)]
+    return flags, records, removed
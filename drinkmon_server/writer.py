@@ -0,0 +1,38 @@
+"""
+Single-writer access to the drinkmon session repository.
+Every mutation is applied by one writer: the event loop itself for the
+in-memory store, or one dedicated thread for repositories that do blocking
+I/O. Readers never touch the repository; they use the FriendFeed read model.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from drinkmon_server.session_store import SessionRepository, SessionStore
+
+class SessionWriter:
+    def __init__(self, store: SessionRepository):
+        self.store = store
+        # Dict operations on the in-memory store never block, so running them
+        # inline on the loop thread is both the cheapest and the only writer.
+        # Blocking backends get a one-thread executor that queues writes in order.
+        self._executor = None
+        if not isinstance(store, SessionStore):
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="drinkmon-writer")
+        self.writes = 0
+
+    @property
+    def inline(self) -> bool:
+        return self._executor is None
+
+    async def submit(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run fn(*args) on the writer and return its result (or raise its exception).
+        """
+        self.writes += 1
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
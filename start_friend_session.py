@@ -1,10 +1,17 @@
 """
 Script to manually start a friend session by calling the drinkmon FastAPI backend.
 Prompts for color input, calls /api/start_session, and prints the returned GUID.
+Pass a count (python start_friend_session.py 20) to start that many sessions
+with random colors in a single /api/batch_sessions request.
+
+The server closes a session nobody renews after its lease runs out (300s by
+default, DRINKMON_SESSION_LEASE), so sessions started here last about five
+minutes. Add --hold to keep them open: the script then renews them every
+RENEW_INTERVAL seconds until Ctrl-C, and closes them on the way out.
 """
 
-import requests, random
-from typing import Dict
+import requests, random, sys, time
+from typing import Dict, List
 
 COLORS_DICT = {
     # Primary colors for maximum brightness and clarity on RGB LEDs
@@ -31,6 +38,25 @@ COLORS_DICT = {
 }
 
 API_URL = "https://drinkmon.chrispatten.dev/api/start_session"
+BATCH_URL = "https://drinkmon.chrispatten.dev/api/batch_sessions"
+RENEW_URL = "https://drinkmon.chrispatten.dev/api/renew"
+# Seconds between renewals with --hold; well inside the server's 300s lease
+RENEW_INTERVAL = 60
+# Attempts per call when the server answers 429 Too Many Requests
+MAX_ATTEMPTS = 3
+
+def post(url: str, payload: dict, timeout: float) -> requests.Response:
+    """
+    POST JSON, waiting out the server's Retry-After and retrying when rate limited.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        response = requests.post(url, json=payload, timeout=timeout)
+        if response.status_code != 429 or attempt == MAX_ATTEMPTS - 1:
+            return response
+        delay = int(response.headers.get("Retry-After", "1"))
+        print(f"Rate limited; retrying in {delay}s")
+        time.sleep(delay)
+    return response
 
 def get_color_input() -> Dict[str, int]:
     """
@@ -65,7 +91,7 @@ def start_friend_session(color: Dict[str, int]) -> str:
     """
     payload = {"color": color}
     try:
-        response = requests.post(API_URL, json=payload, timeout=5)
+        response = post(API_URL, payload, timeout=5)
         response.raise_for_status()
         data = response.json()
         guid = data.get("guid")
@@ -76,18 +102,81 @@ def start_friend_session(color: Dict[str, int]) -> str:
         print(f"Error starting session: {e}")
         raise
 
+def start_friend_sessions(colors: List[Dict[str, int]]) -> List[str]:
+    """
+    Start several friend sessions in one call to the /api/batch_sessions endpoint.
+    Args:
+        colors (List[Dict[str, int]]): RGB color dictionaries, one per session.
+    Returns:
+        List[str]: GUIDs of the started sessions, in order.
+    Raises:
+        Exception: If the API call fails or response is invalid.
+    """
+    payload = {"start": [{"color": color} for color in colors]}
+    try:
+        response = post(BATCH_URL, payload, timeout=10)
+        response.raise_for_status()
+        return [item["guid"] for item in response.json()["started"]]
+    except Exception as e:
+        print(f"Error starting sessions: {e}")
+        raise
+
+def hold_sessions(guids: List[str]) -> None:
+    """
+    Renew the sessions' leases every RENEW_INTERVAL seconds until Ctrl-C,
+    then close them.
+    Args:
+        guids (List[str]): GUIDs of the sessions to keep open.
+    """
+    print(f"Keeping {len(guids)} session(s) open; Ctrl-C to close.")
+    try:
+        while True:
+            time.sleep(RENEW_INTERVAL)
+            try:
+                response = post(RENEW_URL, {"guids": guids}, timeout=5)
+                response.raise_for_status()
+                renewed = response.json()["renewed"]
+                if renewed < len(guids):
+                    print(f"{len(guids) - renewed} session(s) already expired or closed.")
+            except Exception as e:
+                print(f"Error renewing sessions: {e}")
+    except KeyboardInterrupt:
+        pass
+    try:
+        post(BATCH_URL, {"close": guids}, timeout=10).raise_for_status()
+        print(f"Closed {len(guids)} session(s).")
+    except Exception as e:
+        print(f"Error closing sessions: {e}")
+
 def main():
     """
     Main function to prompt for color and start a friend session.
     """
-    color_key = random.choice(list(COLORS_DICT.keys()))
-    print(f"Start a new friend session with color {color_key}:")
-    color = COLORS_DICT[color_key]
-    try:
-        guid = start_friend_session(color)
-        print(f"Session started! GUID: {guid}")
-    except Exception:
-        print("Failed to start session.")
+    args = [arg for arg in sys.argv[1:] if arg != "--hold"]
+    hold = len(args) < len(sys.argv) - 1
+    if args:
+        count = int(args[0])
+        colors = [COLORS_DICT[random.choice(list(COLORS_DICT.keys()))] for _ in range(count)]
+        try:
+            guids = start_friend_sessions(colors)
+            print(f"Started {len(guids)} sessions.")
+        except Exception:
+            print("Failed to start sessions.")
+            return
+    else:
+        color_key = random.choice(list(COLORS_DICT.keys()))
+        print(f"Start a new friend session with color {color_key}:")
+        color = COLORS_DICT[color_key]
+        try:
+            guids = [start_friend_session(color)]
+            print(f"Session started! GUID: {guids[0]}")
+        except Exception:
+            print("Failed to start session.")
+            return
+    if hold:
+        hold_sessions(guids)
+    else:
+        print("Sessions close after the server's lease (300s by default) unless renewed; use --hold to keep them open.")
 
 if __name__ == "__main__":
     main()